@@ -1 +1,5 @@
 # -** coding: utf-8 -*-
+
+# single source of the package version (read by setup.py, part of the
+# asm_stats result cache keys)
+__version__ = "0.1.0"
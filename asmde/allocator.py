@@ -1,7 +1,13 @@
+import bisect
+import heapq
+import contextlib
 import collections
 
+import asmde.lexer as lexer
+
 class Register:
     """ main class for Register objects """
+    __slots__ = ()
     class RegClass:
         """ class of registers """
         @classmethod
@@ -19,7 +25,9 @@ class Register:
         @classmethod
         def get_alias_phy_reg_repr(reg_class, alias_reg):
             """ build a string representation for a single alias register """
-            return reg_class.prefix + alias_reg.aliasSpec + str(alias_reg.aliasIndex)
+            # non-indexed aliases (e.g. RISC-V's sp) have no index
+            alias_index = "" if alias_reg.aliasIndex is None else str(alias_reg.aliasIndex)
+            return reg_class.prefix + alias_reg.aliasSpec + alias_index
         @classmethod
         def aliasResolution(cls, spec, index):
             """ return tuple (isAlias, physical_index) """
@@ -53,6 +61,7 @@ class Register:
 
 class MultiArchRegister:
     """ register formed by concatening multiple regsiters """
+    __slots__ = ("reg_list", "reg_class")
     def __init__(self, reg_list, reg_class):
         self.reg_list = reg_list
         self.reg_class = reg_class
@@ -66,6 +75,7 @@ class MultiArchRegister:
 
 class PhysicalRegister(Register):
     """ Physical register """
+    __slots__ = ("index", "reg_class", "const")
     def __init__(self, index, reg_class=None, const=False):
         self.index = index
         self.reg_class = reg_class
@@ -84,6 +94,7 @@ class PhysicalRegister(Register):
 
 class PhysicalRegisterAlias(PhysicalRegister):
     """ Alias / secundary name for a physical register """
+    __slots__ = ("physReg", "aliasIndex", "aliasSpec")
     def __init__(self, physReg, aliasIndex, aliasSpec, reg_class):
         PhysicalRegister.__init__(self, physReg.index, reg_class)
         self.physReg = physReg
@@ -100,6 +111,7 @@ class PhysicalRegisterAlias(PhysicalRegister):
 
 class SpecialRegister(Register):
     """ Physical register """
+    __slots__ = ("tag", "reg_class")
     def __init__(self, tag, reg_class=None):
         self.tag = tag
         self.reg_class = reg_class
@@ -129,8 +141,25 @@ def odd_indexed_register(index):
 def even_indexed_register(index):
     return (index % 2) == 0
 
+def color_mask(color_list):
+    """ convert an iterable of colors (register indexes) into a bitmask """
+    mask = 0
+    for color in color_list:
+        if color >= 0:
+            mask |= 1 << color
+    return mask
+
+def generate_mask_colors(mask):
+    """ generate the colors (register indexes) set in bitmask @p mask
+        by increasing order """
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
 class VirtualRegister(Register):
     """ Virtual register """
+    __slots__ = ("name", "reg_class", "constraint", "linked_registers")
     def __init__(self, name, reg_class=None, constraint=no_constraint, linked_registers=None):
         self.name = name
         self.reg_class = reg_class
@@ -148,6 +177,15 @@ class VirtualRegister(Register):
     def add_linked_register(self, reg, index_generator):
         self.linked_registers[reg] = index_generator
 
+    def get_linked_group(self):
+        """ return the tuple of this register and of its linked registers,
+            ordered by index (e.g. (lo, hi) for a dual register) """
+        # index offset of each linked register relative to self, derived from
+        # the index self must have once the linked register is assigned 0
+        offset_map = dict((reg, -self.linked_registers[reg]({reg: 0})[0]) for reg in self.linked_registers)
+        offset_map[self] = 0
+        return tuple(sorted(offset_map, key=lambda reg: offset_map[reg]))
+
     def is_virtual(self):
         return True
 
@@ -160,6 +198,7 @@ class VirtualRegister(Register):
 
 class ImmediateValue:
     """ Immediate (numerical) value """
+    __slots__ = ("value",)
     def __init__(self, value):
         self.value = value
 
@@ -171,6 +210,7 @@ class ImmediateValue:
 
 class DebugObject:
     """ Structure to store and forwared debug information """
+    __slots__ = ("src_file", "src_line")
     def __init__(self, src_line, src_file=None):
         self.src_file = src_file
         self.src_line = src_line
@@ -182,7 +222,12 @@ class DebugObject:
         return "line {}".format(self.src_line)
 
 class Instruction:
-    def __init__(self, insn_object, def_list=None, use_list=None, dbg_object=None, dump_pattern=None, is_nocond_jump=False, is_cond_jump=False, match_pattern=None, jump_label=None):
+    __slots__ = (
+        "insn_object", "def_list", "use_list", "dbg_object", "dump_pattern",
+        "is_nocond_jump", "is_cond_jump", "jump_label", "is_move", "match_pattern"
+    )
+
+    def __init__(self, insn_object, def_list=None, use_list=None, dbg_object=None, dump_pattern=None, is_nocond_jump=False, is_cond_jump=False, match_pattern=None, jump_label=None, is_move=False):
         self.insn_object = insn_object
         self.def_list = [] if def_list is None else def_list
         self.use_list = [] if use_list is None else use_list
@@ -192,6 +237,8 @@ class Instruction:
         self.is_nocond_jump = is_nocond_jump
         self.is_cond_jump = is_cond_jump
         self.jump_label = jump_label
+        # register copy (single def, single use), candidate for coalescing
+        self.is_move = is_move
         # information on pattern used to match the instruction in the input
         # (if any)
         self.match_pattern = match_pattern
@@ -200,10 +247,28 @@ class Instruction:
     def is_jump(self):
         return self.is_nocond_jump or self.is_cond_jump
 
+    def copy(self):
+        """ shallow copy (operand lists and match pattern are shared) """
+        return Instruction(self.insn_object, def_list=self.def_list, use_list=self.use_list,
+                           dbg_object=self.dbg_object, dump_pattern=self.dump_pattern,
+                           is_nocond_jump=self.is_nocond_jump, is_cond_jump=self.is_cond_jump,
+                           match_pattern=self.match_pattern, jump_label=self.jump_label,
+                           is_move=self.is_move)
+
+    def is_redundant_move(self, color_map):
+        """ predicate indicating if self is a move whose source and
+            destination have been assigned the same physical register """
+        if not self.is_move:
+            return False
+        dst = self.def_list[0].instanciate(color_map).baseReg
+        src = self.use_list[0].instanciate(color_map).baseReg
+        return dst.reg_class is src.reg_class and dst.index == src.index
+
     def __repr__(self):
         return self.insn_object
 
 class Bundle:
+    __slots__ = ("insn_list",)
     standard = True
     def __init__(self, insn_list=None):
         self.insn_list = [] if insn_list is None else insn_list
@@ -239,23 +304,29 @@ class RegFile:
         self.description = description
         self.physical_pool = dict((i, self.description.reg_ctor(i, description.reg_class)) for i in range(self.description.num_phys_reg))
         self.virtual_pool = {}
+        # (spec, index) -> register object (physical register or alias)
+        self.alias_pool = {}
         self.isAllocatable = description.isAllocatable
 
     def get_phys_index(self, index, spec=None):
         """ translate an index and a specifier into an actual physical index
             (e.g. RV32I "t, 0 -> (x)5"""
-        return index
+        return self.get_unique_phys_reg_object(index, spec=spec).index
 
     def get_unique_phys_reg_object(self, index, spec=None):
+        """ return the register object named by @p spec and @p index, alias
+            objects are built once and shared by all their uses """
+        if (spec, index) in self.alias_pool:
+            return self.alias_pool[(spec, index)]
         isAlias, phys_index = self.description.reg_class.aliasResolution(spec, index)
         if phys_index > self.description.num_phys_reg:
             print("regfile for class {} contains only {} register(s), request for index: {}".format(self.description.reg_class.name, self.description.num_phys_reg, index))
             raise Exception()
         physReg = self.physical_pool[phys_index]
         if isAlias:
-            return PhysicalRegisterAlias(physReg, index, spec, self.description.reg_class)
-        else:
-            return physReg
+            physReg = PhysicalRegisterAlias(physReg, index, spec, self.description.reg_class)
+        self.alias_pool[(spec, index)] = physReg
+        return physReg
 
     def get_unique_virt_reg_object(self, var_name, reg_constraint=no_constraint):
         if not var_name in self.virtual_pool:
@@ -274,6 +345,8 @@ class SpecialRegFile(RegFile):
     def __init__(self, description):
         self.description = description
         self.special_pool = {}
+        # no virtual register, kept for uniformity with RegFile
+        self.virtual_pool = {}
     def get_special_reg_object(self, tag):
         if not tag in self.special_pool:
             self.special_pool[tag] = PhysicalRegister(tag, self.description.reg_class)
@@ -291,14 +364,57 @@ class RegFileDescription:
 
 class Architecture:
     """ Base class for architecture description """
-    def __init__(self, reg_file_description_set, insn_patterns):
-        self.reg_pool = dict((reg_desc.reg_class, reg_desc.reg_file_class(reg_desc)) for reg_desc in reg_file_description_set)
+    # reg_class -> (store format, load format, slot size in bytes) used to
+    # generate spill code, formats are assembly lines with {reg} (virtual
+    # register name) and {offset} (stack offset) fields.
+    # Tuples of linked registers are described under (reg_class, register
+    # number), {reg} being the comma separated list of their names
+    SPILL_DESCRIPTION_MAP = {}
+    # maximal number of register spellings memorized by each physical
+    # register name table
+    PHYS_REG_NAME_TABLE_SIZE = 1024
+
+    def __init__(self, reg_file_description_list, insn_patterns):
+        # register classes are allocated (and dumped) in the order of
+        # reg_file_description_list
+        self.reg_pool = dict((reg_desc.reg_class, reg_desc.reg_file_class(reg_desc)) for reg_desc in reg_file_description_list)
+        # physical register pattern class -> {register name -> tuple of
+        # physical registers (None if the name does not match the pattern)}
+        # kept in least recently used order
+        self.phys_reg_name_tables = {}
         # table (insn pattern) -> Pattern
         self.insn_patterns = insn_patterns
+        # table (insn pattern) -> matcher function compiled from Pattern
+        # (patterns shared between mnemonics are only compiled once)
+        compiled_map = {}
+        self.insn_matchers = {}
+        for mnemonic, pattern in insn_patterns.items():
+            if not pattern in compiled_map:
+                compiled_map[pattern] = pattern.compile(self)
+            self.insn_matchers[mnemonic] = compiled_map[pattern]
+
+    def get_phys_reg_name_table(self, pattern_class):
+        """ return the register name resolution table of @p pattern_class """
+        if not pattern_class in self.phys_reg_name_tables:
+            self.phys_reg_name_tables[pattern_class] = collections.OrderedDict()
+        return self.phys_reg_name_tables[pattern_class]
+
+    def add_phys_reg_name(self, name_table, reg_name, register_tuple):
+        """ memorize the resolution of @p reg_name in @p name_table, evicting
+            the least recently used name once the table is full """
+        name_table[reg_name] = register_tuple
+        if len(name_table) > self.PHYS_REG_NAME_TABLE_SIZE:
+            name_table.popitem(last=False)
 
     def get_max_register_index_by_class(self, reg_class):
         return self.reg_pool[reg_class].get_max_phys_register_index()
 
+    def get_spill_description(self, reg_class, reg_num=1):
+        """ return the spill code description of @p reg_class registers
+            (of tuples of @p reg_num linked registers if reg_num > 1)
+            or None if they can not be spilled """
+        return self.SPILL_DESCRIPTION_MAP.get(reg_class if reg_num == 1 else (reg_class, reg_num))
+
     def get_unique_phys_reg_object(self, index, reg_class, spec=None):
         return self.reg_pool[reg_class].get_unique_phys_reg_object(index, spec=spec)
 
@@ -309,6 +425,27 @@ class Architecture:
     def get_unique_virt_reg_object(self, var_name, reg_class, reg_constraint=no_constraint):
         return self.reg_pool[reg_class].get_unique_virt_reg_object(var_name, reg_constraint=reg_constraint)
 
+    @contextlib.contextmanager
+    def private_virtual_registers(self):
+        """ context in which virtual registers are looked up (and created) in
+            empty name tables: they are distinct from the program's virtual
+            registers, whatever their names """
+        program_pool_map = dict((reg_class, reg_file.virtual_pool) for reg_class, reg_file in self.reg_pool.items())
+        for reg_file in self.reg_pool.values():
+            reg_file.virtual_pool = {}
+        try:
+            yield
+        finally:
+            for reg_class, reg_file in self.reg_pool.items():
+                reg_file.virtual_pool = program_pool_map[reg_class]
+
+    def reset_virtual_registers(self):
+        """ forget the virtual registers of previous programs so that this
+            architecture object can be reused for a new program (virtual
+            registers carry per-program constraints and links) """
+        for reg_file in self.reg_pool.values():
+            reg_file.virtual_pool = {}
+
     def get_empty_liverange_map(self):
         return LiveRangeMap(self.reg_pool.keys())
 
@@ -319,25 +456,18 @@ class Architecture:
         return False
 
 class BasicBlock:
-    index_count = 0
-    per_index_map = {}
-
-    def __init__(self, label="undef", realLabel=False):
+    def __init__(self, label="undef", realLabel=False, index=None):
         # list of predecessors
         self.preds = []
         # list of successors
         self.succs = []
-        # index in program order
-        self.index = BasicBlock.get_new_index()
+        # index in program order (unique within the Program the block
+        # belongs to, see Program.add_bb)
+        self.index = index
 
         self.label = label
         self.realLabel = realLabel
 
-        # ensuring index unicity
-        assert (not self.index in BasicBlock.per_index_map)
-        # registering block into class map
-        BasicBlock.per_index_map[self.index] = self
-
         self.bundle_list = []
         self.label_list = []
         self.directive_list = []
@@ -346,13 +476,6 @@ class BasicBlock:
     def __repr__(self):
         return "BB {}".format(self.label)
 
-    @staticmethod
-    def get_new_index():
-        """ Create a new (unique) index for a BB """
-        new_index = BasicBlock.index_count
-        BasicBlock.index_count += 1
-        return new_index
-
     @property
     def empty(self):
         return len(self.bundle_list) == 0
@@ -397,7 +520,11 @@ class BasicBlock:
         if self.realLabel:
             s += ("{}:\n".format(self.label))
         for bundle in self.bundle_list:
-            for insn in bundle.insn_list:
+            insn_list = [insn for insn in bundle.insn_list if not insn.is_redundant_move(color_map)]
+            if len(bundle.insn_list) and not len(insn_list):
+                # bundle only contained coalesced moves
+                continue
+            for insn in insn_list:
                 if not insn.dump_pattern is None:
                     # use_list = [reg.instanciate(color_map) for reg in insn.use_list]
                     # def_list = [reg.instanciate(color_map) for reg in insn.def_list]
@@ -456,7 +583,8 @@ class Program:
 
     def add_bb(self, label="undef", realLabel=False, program_insert=True):
         """ add a new BasicBlock without modifying self.current_bb reference """
-        new_bb = BasicBlock(label, realLabel=realLabel)
+        # blocks are numbered per program: programs do not share any state
+        new_bb = BasicBlock(label, realLabel=realLabel, index=len(self.bb_list))
         self.bb_list.append(new_bb)
         if program_insert: self.program_seq.append(new_bb)
         return new_bb
@@ -470,6 +598,12 @@ class Program:
         if self.current_bb != self.sink_bb and self.current_bb.fallback:
             self.current_bb.connect_to(self.sink_bb)
 
+    def add_jump(self, insn):
+        """ connect the current BB to the BB labelled by the target of jump @p insn """
+        succ = self.get_bb_by_label(insn.jump_label)
+        self.current_bb.add_successor(succ)
+        succ.add_predecessor(self.current_bb)
+
     def get_bb_by_label(self, label):
         """ search if label is already linked to a BasicBlock,
             if so returns it, else create one """
@@ -547,6 +681,8 @@ class LiveRangeMap:
             self.declare_post_used_reg(reg)
 
 class VarUseDef:
+    __slots__ = ("loc", "var", "dbg_object")
+
     def __init__(self, loc, var, dbg_object=None):
         self.loc = loc
         self.var = var
@@ -554,12 +690,14 @@ class VarUseDef:
 
 class VarDef(VarUseDef):
     """ Variable definition """
-    pass
+    __slots__ = ()
 class VarUse(VarUseDef):
     """ Variable use """
-    pass
+    __slots__ = ()
 
 class LiveRange:
+    __slots__ = ("start", "stop", "start_dbg_object", "stop_dbg_object")
+
     def __init__(self, start=None, stop=None, start_dbg_object=None, stop_dbg_object=None):
         self.start = start
         self.stop = stop
@@ -602,6 +740,140 @@ class LiveRange:
         return False
 
 
+class IntervalSet:
+    """ Set of disjoint (non empty) [start; stop) intervals sorted by start,
+        used to store the liveranges already assigned to a color """
+    def __init__(self):
+        self.start_list = []
+        self.stop_list = []
+
+    def intersect(self, start, stop):
+        """ test if [@p start; @p stop) intersects any interval of the set """
+        # first interval which ends after start
+        index = bisect.bisect_right(self.stop_list, start)
+        return index < len(self.start_list) and self.start_list[index] < stop
+
+    def add(self, start, stop):
+        """ insert [@p start; @p stop), merging it with the intervals it intersects """
+        index = bisect.bisect_right(self.stop_list, start)
+        end_index = index
+        while end_index < len(self.start_list) and self.start_list[end_index] < stop:
+            start = min(start, self.start_list[end_index])
+            stop = max(stop, self.stop_list[end_index])
+            end_index += 1
+        self.start_list[index:end_index] = [start]
+        self.stop_list[index:end_index] = [stop]
+
+
+class AllocationFailure(Exception):
+    """ no valid color could be assigned to a register (and its linked
+        registers) """
+    def __init__(self, reg_class, reg, reason=None):
+        Exception.__init__(self, "no feasible allocation for {} (class {}){}".format(reg, reg_class.name, "" if reason is None else ", " + reason))
+        self.reg_class = reg_class
+        self.reg = reg
+
+
+# list of node selection policies supported by RegisterAssignator.create_color_map
+COLORING_ORDER_LIST = ["max-degree", "smallest-last", "dsatur"]
+
+class ColoringOrder:
+    """ Incremental selection of the next register to color in a conflict
+        graph, according to @p policy:
+        - max-degree: uncolored node with the most uncolored neighbours
+        - smallest-last: reverse of the order in which nodes of minimal
+          degree are removed from the uncolored sub-graph
+        - dsatur: uncolored node whose neighbours use the most distinct colors
+          (ties broken by uncolored degree)
+        remaining ties are broken by the node order in @p graph.
+        Candidates are kept in a heap whose stale entries are discarded
+        lazily when popped """
+    def __init__(self, graph, color_map, forbidden_mask_map, policy="max-degree"):
+        if not policy in COLORING_ORDER_LIST:
+            print("unknown coloring order {}, expecting one of {}".format(policy, COLORING_ORDER_LIST))
+            raise Exception()
+        self.graph = graph
+        self.color_map = color_map
+        self.forbidden_mask_map = forbidden_mask_map
+        self.policy = policy
+        # nodes left uncolored (e.g. spill candidates)
+        self.discarded = set()
+        uncolored_list = [reg for reg in graph if not reg in color_map]
+        self.order_index = dict((reg, index) for index, reg in enumerate(uncolored_list))
+        # number of uncolored neighbours of each uncolored node
+        self.degree_map = dict((reg, sum(1 for neighbour in graph[reg] if not neighbour in color_map)) for reg in uncolored_list)
+        if policy == "smallest-last":
+            self.order_list = self.get_smallest_last_order(uncolored_list)
+            self.heap = None
+        else:
+            # heap entries are flat tuples key + (reg,), order_index is unique
+            # so reg objects are never compared
+            self.heap = [self.get_key(reg) + (reg,) for reg in uncolored_list]
+            heapq.heapify(self.heap)
+
+    def get_key(self, reg):
+        """ heap key of uncolored node @p reg (smallest key is selected first) """
+        if self.policy == "dsatur":
+            saturation = bin(self.forbidden_mask_map[reg]).count("1")
+            return (-saturation, -self.degree_map[reg], self.order_index[reg])
+        return (-self.degree_map[reg], self.order_index[reg])
+
+    def get_smallest_last_order(self, uncolored_list):
+        """ build smallest-last coloring order of the uncolored nodes """
+        degree_map = dict(self.degree_map)
+        heap = [(degree_map[reg], self.order_index[reg], reg) for reg in uncolored_list]
+        heapq.heapify(heap)
+        removed = set()
+        removal_list = []
+        while heap:
+            degree, _, reg = heapq.heappop(heap)
+            if reg in removed or degree != degree_map[reg]:
+                # stale entry
+                continue
+            removed.add(reg)
+            removal_list.append(reg)
+            for neighbour in self.graph[reg]:
+                if neighbour in degree_map and not neighbour in removed:
+                    degree_map[neighbour] -= 1
+                    heapq.heappush(heap, (degree_map[neighbour], self.order_index[neighbour], neighbour))
+        # the order list is consumed from its end
+        return removal_list
+
+    def select(self):
+        """ return the next register to color, or None if every node of
+            the graph is colored """
+        if self.heap is None:
+            while self.order_list:
+                reg = self.order_list.pop()
+                if not reg in self.color_map and not reg in self.discarded:
+                    return reg
+            return None
+        while self.heap:
+            entry = self.heap[0]
+            reg = entry[-1]
+            if reg in self.color_map or reg in self.discarded or entry[:-1] != self.get_key(reg):
+                # stale entry
+                heapq.heappop(self.heap)
+                continue
+            return reg
+        return None
+
+    def discard(self, reg_list):
+        """ registers in @p reg_list will be left uncolored and must no
+            longer be selected """
+        self.discarded.update(reg_list)
+
+    def commit(self, reg_list):
+        """ update node priorities once registers in @p reg_list have been
+            colored (forbidden masks must have been updated beforehand) """
+        for reg in reg_list:
+            for neighbour in self.graph.get(reg, ()):
+                if neighbour in self.degree_map and not neighbour in self.color_map:
+                    self.degree_map[neighbour] -= 1
+                    if not self.heap is None:
+                        heapq.heappush(self.heap, self.get_key(neighbour) + (neighbour,))
+
+
 def liverange_bound_compare_gt(lhs, rhs):
     if isinstance(lhs, PostProgram):
         # PostProgram > all
@@ -638,20 +910,39 @@ class PostProgram:
         return "PostProgram"
 
 class RegisterAssignator:
-    def __init__(self, arch):
+    def __init__(self, arch, spill_offset=0):
         self.arch = arch
+        # offset (from the stack pointer) of the spill area
+        self.spill_offset = spill_offset
+        # current size (in bytes) of the spill area
+        self.spill_area_size = 0
+        # temporary registers introduced by spill code
+        self.spill_temp_set = set()
 
     def process_program(self, bundle_list):
         pass
 
     def generate_use_def_lists(self, program, verbose=False):
-        """ List variable use and defs in program """
+        """ List variable use and defs in program and solve liveness
+            return the pair of dict (var_ins, var_out) BasicBlock -> set of
+            registers alive at BB's entry (resp. exit) """
         use_list, def_list = {}, {}
-        var_gens = collections.defaultdict(set)
-        var_kills = collections.defaultdict(set)
+        # dense register numbering: register sets are stored as python
+        # ints used as bitvectors, bit i representing reg_list[i]
+        reg_list = []
+        reg_bit_map = {}
+        def get_reg_bit(reg):
+            if not reg in reg_bit_map:
+                reg_bit_map[reg] = 1 << len(reg_list)
+                reg_list.append(reg)
+            return reg_bit_map[reg]
+
+        var_gens = {}
+        var_kills = {}
         for bb in program.bb_list:
+            gen_mask = 0
             # set of already defined variables
-            already_def_set = set()
+            kill_mask = 0
             for index, bundle in enumerate(bb.bundle_list):
                 for regObj in bundle.use_list:
                     # discard non register element (e.g. ImmediateValue)
@@ -660,10 +951,11 @@ class RegisterAssignator:
                     reg = regObj.baseReg
                     if not reg in use_list: use_list[reg] = []
                     use_list[reg].append(VarUse((bb, index), reg, ))
-                    if not reg in already_def_set:
+                    reg_bit = get_reg_bit(reg)
+                    if not kill_mask & reg_bit:
                         # variable is used without being previously
                         # defined in the BB, it must be alive at BB entry
-                        var_gens[bb].add(reg)
+                        gen_mask |= reg_bit
 
                 for regObj in bundle.def_list:
                     # discard non register element (e.g. ImmediateValue)
@@ -673,12 +965,9 @@ class RegisterAssignator:
                     if not reg in def_list: def_list[reg] = []
                     var_def = VarDef((bb, index), reg)
                     def_list[reg].append(var_def)
-                    var_kills[bb].add(reg)
-                    already_def_set.add(reg)
-
-
-        var_ins = collections.defaultdict(set)
-        var_out = collections.defaultdict(set)
+                    kill_mask |= get_reg_bit(reg)
+            var_gens[bb] = gen_mask
+            var_kills[bb] = kill_mask
 
         if verbose:
             for reg in use_list:
@@ -686,40 +975,88 @@ class RegisterAssignator:
             for reg in def_list:
                 print("def_list {}: {}".format(reg, def_list[reg]))
             print("post_used_list: {}".format(program.post_used_list))
+
+        mask_ins = dict((bb, 0) for bb in program.bb_list)
+        mask_out = dict((bb, 0) for bb in program.bb_list)
         # adding post used list into sink BB
+        post_used_mask = 0
         for regObj in program.post_used_list:
             # register alias disambiguation
-            reg = regObj.baseReg
-            var_ins[program.sink_bb].add(reg)
-            var_out[program.sink_bb].add(reg)
-
-        # TODO(OPT): topological order for worklist (starting from sink)
-        worklist = [bb for bb in program.sink_bb.preds] + [bb for bb in program.bb_list] + [program.source_bb]
-        while worklist != []:
-            bb = worklist.pop(0)
+            post_used_mask |= get_reg_bit(regObj.baseReg)
+        mask_ins[program.sink_bb] = post_used_mask
+        mask_out[program.sink_bb] = post_used_mask
+
+        # backward problem: processing BBs in post-order (reverse post-order
+        # of the reverse CFG) makes most successors processed before their
+        # predecessors
+        worklist = collections.deque(self.get_bb_post_order(program))
+        queued = set(worklist)
+        while worklist:
+            bb = worklist.popleft()
+            queued.discard(bb)
             if verbose: print("processing bb: {}, succs: {}".format(bb, bb.succs))
             if bb is program.sink_bb:
                 # discard sink_bb which has no successor
                 continue
             # out leaving variables is the union of leaving variable
             # at the entry of all successors
-            var_out[bb] = set().union(*tuple(var_ins[succ] for succ in bb.succs))
-            ins_bb = var_out[bb].difference(var_kills[bb]).union(var_gens[bb])
-            if len(ins_bb.difference(var_ins[bb])) != 0:
-                # var_ins[bb] is modified by current iteration
+            out_mask = 0
+            for succ in bb.succs:
+                out_mask |= mask_ins[succ]
+            mask_out[bb] = out_mask
+            in_mask = (out_mask & ~var_kills[bb]) | var_gens[bb]
+            if in_mask != mask_ins[bb]:
+                # mask_ins[bb] is modified by current iteration
+                mask_ins[bb] = in_mask
                 for pred in bb.preds:
-                    worklist.append(pred)
-            var_ins[bb] = ins_bb
+                    if not pred in queued:
+                        worklist.append(pred)
+                        queued.add(pred)
+
+        def mask_to_set(mask):
+            """ convert bitvector @p mask to a set of registers """
+            reg_set = set()
+            while mask:
+                low_bit = mask & -mask
+                reg_set.add(reg_list[low_bit.bit_length() - 1])
+                mask ^= low_bit
+            return reg_set
+
+        var_ins = collections.defaultdict(set)
+        var_out = collections.defaultdict(set)
+        for bb in program.bb_list:
+            var_ins[bb] = mask_to_set(mask_ins[bb])
+            var_out[bb] = mask_to_set(mask_out[bb])
         if verbose:
-            for bb in var_gens:
-                print("var_gens for {}: ".format(bb, var_gens[bb]))
+            for bb in program.bb_list:
+                print("var_gens for {}: {}".format(bb, mask_to_set(var_gens[bb])))
             for bb in var_ins:
-                print("var_ins for {}: ".format(bb, var_ins[bb]))
+                print("var_ins for {}: {}".format(bb, var_ins[bb]))
             for bb in var_out:
-                print("var_out for {}: ".format(bb, var_out[bb]))
+                print("var_out for {}: {}".format(bb, var_out[bb]))
 
         return var_ins, var_out
 
+    def get_bb_post_order(self, program):
+        """ return the list of program's BasicBlock in post-order of a depth
+            first traversal of the CFG from source_bb, BasicBlocks
+            not reachable from source_bb are appended at the end """
+        post_order = []
+        visited = set([program.source_bb])
+        # iterative DFS: stack of (bb, iterator on bb's successors)
+        stack = [(program.source_bb, iter(program.source_bb.succs))]
+        while stack:
+            bb, succ_iter = stack[-1]
+            for succ in succ_iter:
+                if not succ in visited:
+                    visited.add(succ)
+                    stack.append((succ, iter(succ.succs)))
+                    break
+            else:
+                stack.pop()
+                post_order.append(bb)
+        post_order += [bb for bb in program.bb_list if not bb in visited]
+        return post_order
 
     def generate_liverange_map(self, program, liverange_map, var_ins, var_out):
         """ generate a dict key -> list of disjoint live-ranges
@@ -789,19 +1126,36 @@ class RegisterAssignator:
                         print("sub liverange for reg {} contains undefined bound(s) ({})".format(reg, sub_liverange_map[reg]))
                         raise Exception()
 
-            # building actual conflict map
+            # building actual conflict map by sweeping liveranges sorted by start
+            class_conflict_map = conflict_map[reg_class]
+            interval_list = []
             for reg in sub_liverange_map:
-                conflict_map[reg_class][reg] = set()
-                for reg2 in sub_liverange_map:
-                    if reg2 != reg and LiveRange.intersect_list(sub_liverange_map[reg], sub_liverange_map[reg2]):
-                        conflict_map[reg_class][reg].add(reg2)
+                class_conflict_map[reg] = set()
+                for liverange in sub_liverange_map[reg]:
+                    interval_list.append((liverange.start, liverange.stop, reg))
+            interval_list.sort(key=lambda interval: interval[0])
+            # heap of (stop, sweep index, start, reg) for the liveranges
+            # already swept which may still intersect the current one
+            active_list = []
+            for sweep_index, (start, stop, reg) in enumerate(interval_list):
+                # discarding liveranges which end before the current one starts
+                while active_list and active_list[0][0] <= start:
+                    heapq.heappop(active_list)
+                for _, _, active_start, active_reg in active_list:
+                    # active_start <= start < active_stop
+                    if active_reg is not reg and active_start < stop:
+                        class_conflict_map[reg].add(active_reg)
+                        class_conflict_map[active_reg].add(reg)
+                heapq.heappush(active_list, (stop, sweep_index, start, reg))
         return conflict_map
 
-    def create_color_map(self, conflict_map, verbose=False):
-        max_color_num = 0
-        max_degree = 0
-        max_degree_node = None
-
+    def create_color_map(self, conflict_map, verbose=False, coloring_order="max-degree", spill_list=None):
+        """ assign a color (physical register index) to each virtual register
+            of conflict_map, selecting the next register to color according
+            to @p coloring_order (one of COLORING_ORDER_LIST).
+            If @p spill_list is None, AllocationFailure is raised when a register
+            can not be colored, else the register is left uncolored and
+            appended to spill_list """
         general_color_map = {}
 
         # start by pre-assigning colors to corresponding physical registers
@@ -812,76 +1166,425 @@ class RegisterAssignator:
             for reg in graph:
                 if isinstance(reg, PhysicalRegister):
                     color_map[reg] = reg.index
+            if len(color_map) == len(graph):
+                # nothing to allocate
+                continue
+
+            allocatable_mask = color_mask(self.arch.reg_pool[reg_class].get_allocatable_range())
+            # per register mask of valid colors (allocatable and verifying reg's constraint)
+            valid_mask_map = {}
+            def get_valid_mask(reg):
+                if not reg in valid_mask_map:
+                    valid_mask_map[reg] = color_mask(color for color in generate_mask_colors(allocatable_mask) if reg.constraint(color))
+                return valid_mask_map[reg]
+            # per node mask of colors already assigned to one of its neighbours,
+            # updated each time a register allocation is committed
+            forbidden_mask_map = dict((reg, color_mask(color_map[neighbour] for neighbour in graph[reg] if neighbour in color_map)) for reg in graph if not reg in color_map)
+
+            # list of registers tentatively assigned during the current search
+            trail = []
+            def allocate_reg_list(reg_list, index):
+                """ Allocate (in place in color_map) each register in
+                    reg_list[index:] assuming dependencies are stored in graph.
+                    Return True if a valid allocation was found, else
+                    color_map is left unmodified and False is returned """
+                if index == len(reg_list):
+                    return True
+                head_reg = reg_list[index]
+                available_mask = get_valid_mask(head_reg) & ~forbidden_mask_map.get(head_reg, 0)
+                # colors of neighbours tentatively assigned by the current search
+                neighbours = graph.get(head_reg, ())
+                for tentative_reg in trail:
+                    if tentative_reg in neighbours:
+                        available_mask &= ~(1 << color_map[tentative_reg])
+
+                # enforcing link constraints
+                linked_map = head_reg.get_linked_map()
+                for linked_reg in linked_map:
+                    if linked_reg in color_map:
+                        available_mask &= color_mask(linked_map[linked_reg](color_map))
+
+                for possible_color in generate_mask_colors(available_mask):
+                    color_map[head_reg] = possible_color
+                    trail.append(head_reg)
+                    if allocate_reg_list(reg_list, index + 1):
+                        return True
+                    # undoing tentative assignment
+                    trail.pop()
+                    del color_map[head_reg]
+                return False
+
+            max_reg_index = self.arch.get_max_register_index_by_class(reg_class)
+            node_order = ColoringOrder(graph, color_map, forbidden_mask_map, policy=coloring_order)
+            while True:
+                # looking for next node to color (e.g. node with max degree)
+                max_reg = node_order.select()
+                if max_reg is None:
+                    break
 
-            while len(color_map) != len(graph):
-                # looking for node with max degree
-                max_reg = max([node for node in graph if not node in color_map], key=(lambda reg: len(list(node for node in graph[reg] if not node in color_map))))
-
-                def allocate_reg_list(reg_list, graph, color_map):
-                    """ Allocate each register in reg_list assuming dependencies
-                        are stored in graph and color_map indicates previously performed
-                        allocation """
-                    if len(reg_list) == 0:
-                        # empty list returns empty allocation (valid)
-                        return {}
-                    else:
-                        # select head of list as current register for allocation
-                        head_reg = reg_list[0]
-                        remaining_reg_list = reg_list[1:]
-                        unavailable_color_set = set([color_map[neighbour] for neighbour in graph[head_reg] if neighbour in color_map])
-
-                        valid_color_set = [color for color in self.arch.reg_pool[reg_class].get_allocatable_range() if head_reg.constraint(color)]
-                        if not len(valid_color_set):
-                            # no color available in valid set
-                            return None
-                        available_color_set = set(valid_color_set).difference(set(unavailable_color_set))
-
-                        if not len(available_color_set):
-                            # no color available in available color set
-                            return None
-
-                        # enforcing link constraints
-                        linked_map = head_reg.get_linked_map()
-                        for linked_reg in linked_map:
-                            if not linked_reg in color_map:
-                                # discard linked registers which have not been allocated yet
-                                continue
-                            else:
-                                available_color_set.intersection_update(set(linked_map[linked_reg](color_map)))
-                        for possible_color in available_color_set:
-                            # FIXME: bad performance: copying full local dict each time
-                            local_color_map = {head_reg: possible_color}
-                            local_color_map.update(color_map)
-                            sub_allocation = allocate_reg_list(remaining_reg_list, graph, local_color_map)
-                            if sub_allocation != None:
-                                # valid sub allocation
-                                sub_allocation.update({head_reg: possible_color})
-                                # return first valid sub-alloc
-                                return sub_allocation
-
-                        return None
                 # FIXME/TODO: build full set of linked registers (recursively)
 
                 # if selected register is linked, we must allocated all the
                 # register at once to ensure link constraints are met
-                linked_allocation = allocate_reg_list([max_reg] + list(max_reg.get_linked_map().keys()), graph, color_map)
-                if linked_allocation is None:
-                    print("no feasible allocation for {} and linked map {}".format(max_reg, max_reg.get_linked_map()))
-                    raise Exception()
-
-                num_reg_in_class = self.arch.get_max_register_index_by_class(reg_class)
-                for linked_reg in linked_allocation:
-                    linked_color =  linked_allocation[linked_reg]
+                reg_list = [max_reg] + [linked_reg for linked_reg in max_reg.get_linked_map() if not linked_reg in color_map]
+                if not allocate_reg_list(reg_list, 0):
+                    if spill_list is None:
+                        raise AllocationFailure(reg_class, max_reg)
+                    if verbose: print("register {} of class {} could not be colored".format(max_reg, reg_class.name))
+                    spill_list.append(max_reg)
+                    node_order.discard(reg_list)
+                    continue
+                # committing allocation
+                del trail[:]
+
+                for linked_reg in reversed(reg_list):
+                    # re-inserting the registers last to first to keep the
+                    # (dumped) order of the recursive allocation
+                    linked_color = color_map.pop(linked_reg)
                     color_map[linked_reg] = linked_color
                     # check on colour bound
-                    if linked_color >= num_reg_in_class:
-                        print("Error while assigning register of class {}, requesting index {}, only {} register(s) available".format(reg_class.name, linked_color, num_reg_in_class))
+                    if linked_color > max_reg_index:
+                        print("Error while assigning register of class {}, requesting index {}, only {} register(s) available".format(reg_class.name, linked_color, max_reg_index + 1))
                         raise Exception()
+                    for neighbour in graph.get(linked_reg, ()):
+                        if neighbour in forbidden_mask_map:
+                            forbidden_mask_map[neighbour] |= 1 << linked_color
 
                     if verbose: print("register {} of class {} has been assigned color {}".format(linked_reg, reg_class.name, linked_color))
+                node_order.commit(reg_list)
+
+        return general_color_map
+
+    def create_linear_scan_color_map(self, liverange_map, verbose=False, spill_list=None):
+        """ Assign a color to each register of @p liverange_map without
+            building the conflict graph: virtual registers are scanned by
+            increasing liverange start and receive the first allocatable
+            color whose already assigned liveranges do not intersect theirs.
+            @p spill_list has the same meaning as in create_color_map """
+        general_color_map = {}
+        for reg_class in liverange_map.get_class_list():
+            sub_liverange_map = liverange_map.get_class_map(reg_class)
+            color_map = {}
+            general_color_map[reg_class] = color_map
+            # color -> IntervalSet of liveranges assigned to this color
+            color_occupancy = collections.defaultdict(IntervalSet)
+            for reg in sub_liverange_map:
+                for liverange in sub_liverange_map[reg]:
+                    if liverange.start is None or liverange.stop is None:
+                        print("sub liverange for reg {} contains undefined bound(s) ({})".format(reg, sub_liverange_map[reg]))
+                        raise Exception()
+            # start by pre-assigning colors to corresponding physical registers
+            for reg in sub_liverange_map:
+                if isinstance(reg, PhysicalRegister):
+                    color_map[reg] = reg.index
+                    for liverange in sub_liverange_map[reg]:
+                        color_occupancy[reg.index].add(liverange.start, liverange.stop)
 
+            allocatable_colors = list(self.arch.reg_pool[reg_class].get_allocatable_range())
+
+            def is_free(reg, color):
+                occupancy = color_occupancy[color]
+                return not any(occupancy.intersect(liverange.start, liverange.stop) for liverange in sub_liverange_map[reg])
+
+            def allocate_reg_list(reg_list, local_color_map):
+                """ allocate each register of reg_list (in place in
+                    local_color_map), return True if a valid allocation was found """
+                if len(reg_list) == 0:
+                    return True
+                head_reg = reg_list[0]
+                candidate_colors = [color for color in allocatable_colors if head_reg.constraint(color)]
+                # enforcing link constraints
+                linked_map = head_reg.get_linked_map()
+                for linked_reg in linked_map:
+                    if linked_reg in local_color_map:
+                        linked_colors = linked_map[linked_reg](local_color_map)
+                        candidate_colors = [color for color in candidate_colors if color in linked_colors]
+                for color in candidate_colors:
+                    if head_reg in sub_liverange_map and not is_free(head_reg, color):
+                        continue
+                    local_color_map[head_reg] = color
+                    if allocate_reg_list(reg_list[1:], local_color_map):
+                        return True
+                    del local_color_map[head_reg]
+                return False
+
+            virtual_reg_list = [reg for reg in sub_liverange_map if not reg in color_map]
+            virtual_reg_list.sort(key=lambda reg: min(liverange.start for liverange in sub_liverange_map[reg]))
+            max_reg_index = self.arch.get_max_register_index_by_class(reg_class)
+            for reg in virtual_reg_list:
+                if reg in color_map:
+                    # already allocated as a linked register
+                    continue
+                # linked registers are allocated at once to ensure link constraints are met
+                reg_list = [reg] + [linked_reg for linked_reg in reg.get_linked_map() if not linked_reg in color_map]
+                # tentative assignments are stored in the front map
+                local_color_map = collections.ChainMap({}, color_map)
+                if not allocate_reg_list(reg_list, local_color_map):
+                    if spill_list is None:
+                        raise AllocationFailure(reg_class, reg)
+                    if verbose: print("register {} of class {} could not be colored".format(reg, reg_class.name))
+                    spill_list.append(reg)
+                    continue
+                for linked_reg in reg_list:
+                    linked_color = local_color_map[linked_reg]
+                    # check on colour bound
+                    if linked_color > max_reg_index:
+                        print("Error while assigning register of class {}, requesting index {}, only {} register(s) available".format(reg_class.name, linked_color, max_reg_index + 1))
+                        raise Exception()
+                    color_map[linked_reg] = linked_color
+                    for liverange in sub_liverange_map.get(linked_reg, []):
+                        color_occupancy[linked_color].add(liverange.start, liverange.stop)
+                    if verbose: print("register {} of class {} has been assigned color {}".format(linked_reg, reg_class.name, linked_color))
         return general_color_map
 
+    def coalesce_moves(self, program, conflict_map, verbose=False):
+        """ coalesce the source and destination of move instructions which do
+            not interfere, as long as coalescing is conservative: Briggs test
+            (the merged node has less significant neighbours than available
+            colors) between virtual registers, George test (each neighbour of
+            the virtual register already interferes with the physical register
+            or is not significant) between a virtual and a physical register.
+            Return the pair (coalesced conflict map, alias map) where alias
+            map associates each coalesced register with the register which
+            represents it in the coalesced conflict map """
+        coalesced_map = dict((reg_class, dict((reg, set(conflict_map[reg_class][reg])) for reg in conflict_map[reg_class])) for reg_class in conflict_map)
+        alias_map = {}
+        def get_alias(reg):
+            while reg in alias_map:
+                reg = alias_map[reg]
+            return reg
+        def is_coalescable(reg):
+            # constrained and linked registers are never coalesced
+            return not reg.is_virtual() or (reg.constraint is no_constraint and not reg.get_linked_map())
+
+        move_list = [insn for bb in program.bb_list for bundle in bb.bundle_list for insn in bundle.insn_list if insn.is_move]
+        allocatable_map = {}
+        coalesced = True
+        while coalesced:
+            coalesced = False
+            for insn in move_list:
+                dst = get_alias(insn.def_list[0].baseReg)
+                src = get_alias(insn.use_list[0].baseReg)
+                if dst is src or not dst.reg_class is src.reg_class or not (dst.is_virtual() or src.is_virtual()):
+                    continue
+                graph = coalesced_map.get(dst.reg_class, {})
+                if not dst in graph or not src in graph or src in graph[dst]:
+                    # interfering registers can not be coalesced
+                    continue
+                if not is_coalescable(dst) or not is_coalescable(src):
+                    continue
+                if not dst.reg_class in allocatable_map:
+                    allocatable_map[dst.reg_class] = set(self.arch.reg_pool[dst.reg_class].get_allocatable_range())
+                allocatable_set = allocatable_map[dst.reg_class]
+                color_num = len(allocatable_set)
+                if dst.is_virtual() and src.is_virtual():
+                    # Briggs test
+                    kept_reg, merged_reg = dst, src
+                    if sum(1 for neighbour in graph[dst] | graph[src] if len(graph[neighbour]) >= color_num) >= color_num:
+                        continue
+                else:
+                    # George test
+                    kept_reg, merged_reg = (src, dst) if dst.is_virtual() else (dst, src)
+                    if not kept_reg.index in allocatable_set:
+                        continue
+                    if not all(neighbour in graph[kept_reg] or len(graph[neighbour]) < color_num for neighbour in graph[merged_reg]):
+                        continue
+                for neighbour in graph.pop(merged_reg):
+                    graph[neighbour].discard(merged_reg)
+                    graph[neighbour].add(kept_reg)
+                    graph[kept_reg].add(neighbour)
+                alias_map[merged_reg] = kept_reg
+                coalesced = True
+                if verbose: print("coalescing {} into {}".format(merged_reg, kept_reg))
+        return coalesced_map, dict((reg, get_alias(reg)) for reg in alias_map)
+
+    def expand_coalesced_color_map(self, color_map, alias_map):
+        """ assign to each coalesced register of @p alias_map the color of
+            the register representing it """
+        for reg in alias_map:
+            color_map[reg.reg_class][reg] = color_map[reg.reg_class][alias_map[reg]]
+        return color_map
+
+    def select_spilled_registers(self, program, liverange_map, failure_list, conflict_map=None):
+        """ select the registers to spill so that the registers of
+            @p failure_list (which could not be colored) can be allocated:
+            for each failed register, the register with the lowest spill cost
+            (number of uses and defs divided by the number of interfering
+            registers) is selected among itself and the registers it interferes
+            with (read from @p conflict_map if available, else from
+            @p liverange_map) """
+        occurrence_count = collections.Counter()
+        unspillable_set = set(program.pre_defined_list + program.post_used_list) | self.spill_temp_set
+        for bb in program.bb_list:
+            for bundle in bb.bundle_list:
+                for insn in bundle.insn_list:
+                    for reg in insn.use_list + insn.def_list:
+                        occurrence_count[reg] += 1
+                    if bundle.has_nocond_jump or bundle.has_cond_jump:
+                        # no store can be inserted after a jump
+                        unspillable_set.update(insn.def_list)
+
+        def is_spillable(reg):
+            """ linked registers are spilled with their whole group (register tuple) """
+            if not reg.is_virtual():
+                return False
+            reg_group = reg.get_linked_group()
+            return not any(group_reg in unspillable_set for group_reg in reg_group) and not self.arch.get_spill_description(reg.reg_class, len(reg_group)) is None
+
+        neighbour_map = {}
+        def get_neighbours(reg):
+            if not conflict_map is None:
+                return conflict_map[reg.reg_class].get(reg, set())
+            if not reg in neighbour_map:
+                sub_liverange_map = liverange_map.get_class_map(reg.reg_class)
+                neighbour_map[reg] = set(other for other in sub_liverange_map if not other is reg and LiveRange.intersect_list(sub_liverange_map[reg], sub_liverange_map[other]))
+            return neighbour_map[reg]
+
+        spill_list = []
+        for failed_reg in failure_list:
+            # program order of the registers of failed_reg's class (tie-breaker)
+            order_index = dict((reg, index) for index, reg in enumerate(liverange_map.get_class_map(failed_reg.reg_class)))
+            neighbours = get_neighbours(failed_reg)
+            if failed_reg in spill_list or any(reg in spill_list for reg in neighbours):
+                # already relieved by a previous spill
+                continue
+            candidate_list = [reg for reg in [failed_reg] + list(neighbours) if is_spillable(reg)]
+            if not len(candidate_list):
+                raise AllocationFailure(failed_reg.reg_class, failed_reg, "no register can be spilled")
+            def get_spill_cost(reg):
+                group_occurrence_count = sum(occurrence_count[group_reg] for group_reg in reg.get_linked_group())
+                return (group_occurrence_count / max(1, len(get_neighbours(reg))), order_index.get(reg, -1))
+            spilled_reg = min(candidate_list, key=get_spill_cost)
+            spill_list.extend(reg for reg in spilled_reg.get_linked_group() if not reg in spill_list)
+        return spill_list
+
+    def generate_spill_insn(self, program, insn_format, reg_name_list, offset, dbg_object=None):
+        """ build the spill instruction described by assembly line
+            @p insn_format for the virtual registers named @p reg_name_list
+            and stack offset @p offset using the architecture's instruction
+            patterns """
+        lexem_list = lexer.generate_line_lexems(insn_format.format(reg=",".join(reg_name_list), offset=offset))
+        insn_match = self.arch.insn_matchers[lexem_list[0].value](self.arch, lexem_list)
+        if insn_match is None:
+            print("failed to match spill instruction {}".format(lexem_list))
+            raise Exception()
+        insn, _ = insn_match
+        insn.dbg_object = dbg_object
+        # the spill area base register is alive before program starts
+        for base_reg in insn.use_list:
+            if isinstance(base_reg, PhysicalRegister) and not base_reg.baseReg in program.pre_defined_list:
+                program.pre_defined_list.append(base_reg.baseReg)
+        return insn
+
+    def allocate_spill_slots(self, spill_group_list, liverange_map=None):
+        """ return a dict spilled register group -> stack offset of its slot,
+            groups whose liveranges (read from @p liverange_map) do not
+            intersect share a slot. The spill area grows by the slots which
+            could not be shared """
+        def interfere(reg_group, other_group):
+            if liverange_map is None:
+                return True
+            return any(LiveRange.intersect_list(liverange_map[reg], liverange_map[other_reg]) for reg in reg_group for other_reg in other_group)
+
+        slot_map = {}
+        # slot size -> list of (slot offset, list of groups sharing the slot)
+        slot_list_map = collections.defaultdict(list)
+        for reg_group in spill_group_list:
+            _, _, slot_size = self.arch.get_spill_description(reg_group[0].reg_class, len(reg_group))
+            for slot_offset, slot_group_list in slot_list_map[slot_size]:
+                if not any(interfere(reg_group, other_group) for other_group in slot_group_list):
+                    slot_group_list.append(reg_group)
+                    slot_map[reg_group] = slot_offset
+                    break
+            else:
+                # slots are aligned on their size
+                slot_offset = -(-self.spill_area_size // slot_size) * slot_size
+                slot_map[reg_group] = self.spill_offset + slot_offset
+                slot_list_map[slot_size].append((slot_map[reg_group], [reg_group]))
+                self.spill_area_size = slot_offset + slot_size
+        return slot_map
+
+    def insert_spill_code(self, program, spill_list, liverange_map=None):
+        """ spill each register of @p spill_list (linked registers with their
+            whole group) to a stack slot: in each instruction, the registers
+            of a spilled group are renamed into new temporary registers
+            loaded from the slot in a new bundle just before the instruction
+            bundle (if the instruction uses them or only defines part of the
+            group) and stored to the slot in a new bundle just after it (if
+            it defines them). Slots are shared between registers whose
+            liveranges in @p liverange_map do not intersect """
+        spill_group_map = {}
+        for reg in spill_list:
+            if not reg in spill_group_map:
+                reg_group = reg.get_linked_group()
+                for group_reg in reg_group:
+                    spill_group_map[group_reg] = reg_group
+        spill_group_list = list(collections.OrderedDict.fromkeys(spill_group_map.values()))
+        slot_map = self.allocate_spill_slots(spill_group_list, liverange_map)
+
+        def generate_spill_code(reg_group, load, store, dbg_object):
+            """ return the list of temporary registers replacing @p reg_group
+                and its load (resp. store) instruction if @p load (resp.
+                @p store) is set, else None """
+            reg_class = reg_group[0].reg_class
+            store_format, load_format, _ = self.arch.get_spill_description(reg_class, len(reg_group))
+            temp_name_list = ["{}_spill{}".format(reg.name, len(self.spill_temp_set)) for reg in reg_group]
+            # temporaries can not be mixed up with program registers
+            # (even if the program uses their names)
+            with self.arch.private_virtual_registers():
+                load_insn = self.generate_spill_insn(program, load_format, temp_name_list, slot_map[reg_group], dbg_object) if load else None
+                store_insn = self.generate_spill_insn(program, store_format, temp_name_list, slot_map[reg_group], dbg_object) if store else None
+                temp_list = [self.arch.get_unique_virt_reg_object(name, reg_class) for name in temp_name_list]
+            self.spill_temp_set.update(temp_list)
+            return temp_list, load_insn, store_insn
+
+        for bb in program.bb_list:
+            bundle_list = []
+            for bundle in bb.bundle_list:
+                load_list, store_list = [], []
+                for insn in bundle.insn_list:
+                    used_group_list = [spill_group_map[reg] for reg in insn.use_list if reg in spill_group_map]
+                    defined_group_list = [spill_group_map[reg] for reg in insn.def_list if reg in spill_group_map]
+                    temp_map = {}
+                    for reg_group in collections.OrderedDict.fromkeys(used_group_list + defined_group_list):
+                        # a partially defined group must be loaded to store its other registers back
+                        load = reg_group in used_group_list or not all(reg in insn.def_list for reg in reg_group)
+                        temp_list, load_insn, store_insn = generate_spill_code(reg_group, load, reg_group in defined_group_list, insn.dbg_object)
+                        temp_map.update(zip(reg_group, temp_list))
+                        if not load_insn is None:
+                            load_list.append(load_insn)
+                        if not store_insn is None:
+                            store_list.append(store_insn)
+                    insn.use_list = [temp_map.get(reg, reg) for reg in insn.use_list]
+                    insn.def_list = [temp_map.get(reg, reg) for reg in insn.def_list]
+                # each spill instruction gets its own bundle
+                bundle_list += [Bundle([insn]) for insn in load_list]
+                bundle_list.append(bundle)
+                bundle_list += [Bundle([insn]) for insn in store_list]
+            bb.bundle_list = bundle_list
+
+    def check_liverange_color_map(self, liverange_map, general_color_map):
+        """ check that registers sharing a color do not have intersecting
+            liveranges (without building the conflict graph) """
+        for reg_class in liverange_map.get_class_list():
+            sub_liverange_map = liverange_map.get_class_map(reg_class)
+            color_map = general_color_map[reg_class]
+            per_color_intervals = collections.defaultdict(list)
+            for reg in sub_liverange_map:
+                for liverange in sub_liverange_map[reg]:
+                    per_color_intervals[color_map[reg]].append((liverange.start, liverange.stop, reg))
+            for color in per_color_intervals:
+                interval_list = sorted(per_color_intervals[color], key=lambda interval: interval[0])
+                # interval with the largest stop among the already checked ones
+                max_stop, max_reg = None, None
+                for start, stop, reg in interval_list:
+                    if not max_reg is None and reg is not max_reg and start < max_stop:
+                        print("color conflict for {}({}) vs {}({})".format(reg, color, max_reg, color))
+                        return False
+                    if max_reg is None or stop > max_stop:
+                        max_stop, max_reg = stop, reg
+        return True
+
     def check_color_map(self, conflict_graph, color_map):
         for reg in conflict_graph:
             reg_color = color_map[reg]
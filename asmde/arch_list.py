@@ -1,13 +1,38 @@
-from asmde_arch.dummy import DummyArchitecture
-from asmde_arch.kv3 import KV3Architecture
-from asmde_arch.riscv import (RV32, RV64)
-
-ARCH_CTOR_MAP = {
-    "dummy": DummyArchitecture,
-    "kv3": KV3Architecture,
-    "rv32": RV32,
-    "rv64": RV64,
+import importlib
+import collections.abc
+
+
+# architecture name -> (module, class name), modules are only imported
+# when their architecture is selected: building their instruction patterns
+# is a large part of the start-up time
+ARCH_MODULE_MAP = {
+    "dummy": ("asmde_arch.dummy", "DummyArchitecture"),
+    "kv3": ("asmde_arch.kv3", "KV3Architecture"),
+    "rv32": ("asmde_arch.riscv", "RV32"),
+    "rv64": ("asmde_arch.riscv", "RV64"),
 }
 
+
+class LazyArchMap(collections.abc.Mapping):
+    """ architecture name -> architecture class, importing the module of an
+        architecture on first access """
+    def __init__(self, module_map):
+        self.module_map = module_map
+        self.ctor_map = {}
+
+    def __getitem__(self, arch_name):
+        if not arch_name in self.ctor_map:
+            module_name, class_name = self.module_map[arch_name]
+            self.ctor_map[arch_name] = getattr(importlib.import_module(module_name), class_name)
+        return self.ctor_map[arch_name]
+
+    def __iter__(self):
+        return iter(self.module_map)
+
+    def __len__(self):
+        return len(self.module_map)
+
+ARCH_CTOR_MAP = LazyArchMap(ARCH_MODULE_MAP)
+
 def parse_architecture(arch_str_desc):
     return ARCH_CTOR_MAP[arch_str_desc]
@@ -1,11 +1,14 @@
+import sys
 import argparse
 import collections
+import multiprocessing
 
-from asmde.allocator import Program, DebugObject
+from asmde.allocator import DebugObject, Bundle
 from asmde.parser import AsmParser
-from asmde_arch.dummy import DummyArchitecture
 from asmde.arch_list import parse_architecture
-import asmde.lexer as lexer
+import asmde.reader as reader
+import asmde.line_cache as line_cache
+import asmde.result_cache as result_cache
 
 
 class ProgramStatistics:
@@ -15,14 +18,17 @@ class ProgramStatistics:
         self.program_name = program_name
 
 
+    def count_insn(self, insn, verbose=False):
+        insn_tag = insn.insn_object
+        if not insn.match_pattern is None:
+            insn_tag = insn_tag + "-" + insn.match_pattern.dump(verbose)
+        self.opc_map[insn_tag] += 1
+
     def analyse_program(self, program, verbose=False):
         for bb in program.bb_list:
             for bundle in bb.bundle_list:
                 for insn in bundle.insn_list:
-                    insn_tag = insn.insn_object
-                    if not insn.match_pattern is None:
-                        insn_tag = insn_tag + "-" + insn.match_pattern.dump(verbose)
-                    self.opc_map[insn_tag] += 1
+                    self.count_insn(insn, verbose)
 
     def dump(self, print_callback=print, exhaustive_display=True, csv_format=False):
         """ if <exhaustive_display> is set we display all architecture instructions (even
@@ -48,76 +54,305 @@ class ProgramStatistics:
         for opc in opc_map:
             global_map[opc][self.program_name] = self.opc_map[opc]
 
+class StreamingProgramStatistics(ProgramStatistics):
+    """ Program statistics built while parsing: can be used as the program
+        of an AsmParser, instructions are counted when their bundle is
+        committed and no basic block (nor label, jump or directive) is
+        recorded """
+    def __init__(self, arch, program_name, verbose=False):
+        ProgramStatistics.__init__(self, arch, program_name)
+        self.verbose = verbose
+        # filled by REQUIRE/PREDEFINED macros
+        self.pre_defined_list = []
+        self.post_used_list = []
 
+    def add_bundle(self, bundle):
+        for insn in bundle.insn_list:
+            self.count_insn(insn, self.verbose)
 
-if __name__ == "__main__":
-    # command line options
-    parser = argparse.ArgumentParser()
+    def add_label(self, label, offset=None):
+        pass
+
+    def add_directive(self, directive):
+        pass
+
+    def add_jump(self, insn):
+        pass
+
+    def end_program(self):
+        pass
+
+
+def parse_lines(args, line_iterable, asm_parser, insn_line_cache=None, error_count=0, first_line_no=0):
+    """ parse the lines of <line_iterable> (whose first line is line
+        <first_line_no> of the input) into asm_parser's program, returns the
+        updated error count (an exception is raised once it exceeds
+        args.allow_error) """
+    # skipped line defining file format
+    if insn_line_cache is None:
+        lexed_lines = ((line_no, line, lexem_list, None) for line_no, line, lexem_list in
+                       reader.generate_lexed_lines(line_iterable,
+                                                   verbose=args.verbose_lexing,
+                                                   skip_line=lambda line: "file format" in line))
+    else:
+        lexed_lines = line_cache.generate_cached_lexed_lines(line_iterable, insn_line_cache, args.mode,
+                                                             verbose=args.verbose_lexing,
+                                                             skip_line=lambda line: "file format" in line)
+    for line_no, line, lexem_list, cache_entry in lexed_lines:
+        line_no += first_line_no
+        if args.lexer_verbose:
+            print(lexem_list)
+        dbg_object = DebugObject(line_no + 1)
+        if args.allow_error:
+            try:
+                if args.mode == "objdump":
+                    asm_parser.parse_objdump_line(lexem_list, dbg_object=dbg_object, cache_entry=cache_entry)
+                elif args.mode == "trace":
+                    asm_parser.parse_trace_line(lexem_list, dbg_object=dbg_object, cache_entry=cache_entry)
+                else:
+                    asm_parser.parse_asm_line(lexem_list, dbg_object=dbg_object, cache_entry=cache_entry)
+            except:
+                print("error @line {}, {}".format(line_no, line))
+                print(lexem_list)
+                error_count += 1
+                if error_count > args.allow_error:
+                    raise
+        else:
+            # if no error is allowed, we do not try/except to
+            # be sure to catch the first error where it's raised
+            # which simplify debug (e.g. through pdb)
+            if args.mode == "objdump":
+                asm_parser.parse_objdump_line(lexem_list, dbg_object=dbg_object, cache_entry=cache_entry)
+            elif args.mode == "trace":
+                asm_parser.parse_trace_line(lexem_list, dbg_object=dbg_object, cache_entry=cache_entry)
+            else:
+                asm_parser.parse_asm_line(lexem_list, dbg_object=dbg_object, cache_entry=cache_entry)
+    return error_count
+
+def parse_input(args, input_name, asm_parser, insn_line_cache=None, error_count=0):
+    """ parse file <input_name> into asm_parser's program, returns the updated
+        error count """
+    with reader.open_input(input_name) as input_stream:
+        error_count = parse_lines(args, reader.generate_lines(input_stream), asm_parser, insn_line_cache, error_count)
+    # finish program (e.g. connecting last BB to sink)
+    asm_parser.program.end_program()
+    return error_count
+
+def parse_input_chunk(args, input_name, chunk, asm_parser, insn_line_cache=None, error_count=0):
+    """ parse the chunk (start offset, end offset, first line index, last
+        chunk flag) of file <input_name> into asm_parser's program, returns
+        the updated error count """
+    start, end, first_line_no, last_chunk = chunk
+    error_count = parse_lines(args, reader.generate_chunk_lines(input_name, start, end), asm_parser,
+                              insn_line_cache, error_count, first_line_no)
+    if not last_chunk:
+        # the bundle still open at the end of a chunk is either closed by the
+        # first line of the next chunk or continued by it: its instructions must
+        # be counted in both cases (only the bundle still open at the end of the
+        # file is dropped by the sequential parsing)
+        asm_parser.program.add_bundle(asm_parser.ongoing_bundle)
+        asm_parser.ongoing_bundle = Bundle()
+    asm_parser.program.end_program()
+    return error_count
+
+def analyse_input(args, input_name, insn_line_cache=None, error_count=0, chunk=None, arch=None):
+    """ parse and analyse file <input_name> (or only <chunk> of it, see
+        parse_input_chunk) for architecture instance <arch> (a new instance
+        of args.arch by default), returns its ProgramStatistics and the
+        updated error count """
+    if arch is None:
+        arch = args.arch()
+    # instructions are counted while parsing, without building the program
+    program_stats = StreamingProgramStatistics(arch, input_name, args.verbose_pattern)
+    asm_parser = AsmParser(arch, program_stats)
+    if chunk is None:
+        error_count = parse_input(args, input_name, asm_parser, insn_line_cache, error_count)
+    else:
+        error_count = parse_input_chunk(args, input_name, chunk, asm_parser, insn_line_cache, error_count)
+    return program_stats, error_count
+
+def load_cached_result(args, stats_cache, input_name):
+    """ return the pair (cache key, cached opcode histogram) of <input_name>,
+        the histogram being None if it is not in <stats_cache> """
+    # every option the histogram depends on is part of the key
+    cache_key = stats_cache.get_key(input_name, args.arch.__name__, args.mode, args.verbose_pattern)
+    cached_result = stats_cache.load(cache_key)
+    if cached_result is None:
+        return cache_key, None
+    print("loading cached statistics of input program {}".format(input_name))
+    return cache_key, cached_result["opc_map"]
+
+def store_result(stats_cache, cache_key, program_stats):
+    stats_cache.store(cache_key, {"input": program_stats.program_name, "opc_map": dict(program_stats.opc_map)})
+
+def analyse_inputs(args, input_list, insn_line_cache=None, stats_cache=None, arch=None):
+    """ sequentially analyse every file of <input_list>, returns the fused
+        statistics (opc -> input name -> count) and the error count, the
+        histograms of unchanged inputs are loaded from <stats_cache> if set """
+    error_count = 0
+    stats = collections.defaultdict(lambda: collections.defaultdict(lambda: 0))
+    if arch is None:
+        arch = args.arch()
+    for input_name in input_list:
+        if not stats_cache is None:
+            cache_key, cached_opc_map = load_cached_result(args, stats_cache, input_name)
+            if not cached_opc_map is None:
+                program_stats = ProgramStatistics(arch, input_name)
+                program_stats.opc_map.update(cached_opc_map)
+                program_stats.fuse_in(stats, exhaustive_opc=args.display_all_opcodes)
+                continue
+        print("parsing input program {}".format(input_name))
+        input_error_count = error_count
+        program_stats, error_count = analyse_input(args, input_name, insn_line_cache, error_count, arch=arch)
+        # results of inputs with (allowed) errors are not cached
+        if not stats_cache is None and error_count == input_error_count:
+            store_result(stats_cache, cache_key, program_stats)
+        program_stats.fuse_in(stats, exhaustive_opc=args.display_all_opcodes)
+    return stats, error_count
+
+
+# state of --jobs worker processes, set by init_worker
+WORKER_ARGS = None
+WORKER_LINE_CACHE = None
+
+def init_worker(args):
+    global WORKER_ARGS, WORKER_LINE_CACHE
+    WORKER_ARGS = args
+    WORKER_LINE_CACHE = line_cache.LineCache(args.line_cache) if args.line_cache > 0 else None
+
+def get_input_tasks(args, input_list):
+    """ generate the tasks (input name, chunk) of --jobs workers, uncompressed
+        inputs are split into chunks of about args.chunk_size bytes if set,
+        other inputs are processed in a single task (with chunk None) """
+    for input_name in input_list:
+        compression_name, _ = reader.get_compression_format(input_name)
+        if args.chunk_size <= 0 or not compression_name is None:
+            yield input_name, None
+        else:
+            chunk_list = reader.split_line_chunks(input_name, args.chunk_size)
+            for chunk_index, (start, end, first_line_no) in enumerate(chunk_list):
+                yield input_name, (start, end, first_line_no, chunk_index == len(chunk_list) - 1)
+
+def analyse_input_in_worker(task):
+    """ analyse task (input name, chunk) in a worker process, returns a
+        picklable summary (input name, opcode histogram, error count,
+        (cache hits, cache misses), exit status) of the result """
+    input_name, chunk = task
+    hit_count, miss_count = 0, 0
+    if not WORKER_LINE_CACHE is None:
+        hit_count, miss_count = WORKER_LINE_CACHE.hit_count, WORKER_LINE_CACHE.miss_count
+    # the error budget is checked per worker and then globally, on the sum of the
+    # per-input error counts
+    try:
+        program_stats, error_count = analyse_input(WORKER_ARGS, input_name, WORKER_LINE_CACHE, chunk=chunk)
+    except SystemExit as exit_exception:
+        # the parser exits on unrecoverable errors: SystemExit would kill the
+        # worker (and leave the parent waiting for its result forever), it is
+        # returned as an exit status instead
+        return input_name, {}, 0, (0, 0), 0 if exit_exception.code in [None, 0] else 1
+    if not WORKER_LINE_CACHE is None:
+        hit_count = WORKER_LINE_CACHE.hit_count - hit_count
+        miss_count = WORKER_LINE_CACHE.miss_count - miss_count
+    return input_name, dict(program_stats.opc_map), error_count, (hit_count, miss_count), 0
+
+
+def build_arg_parser():
+    """ return the argparse parser of asm_stats options """
+    parser = argparse.ArgumentParser(prog="asm_stats.py")
     parser.add_argument("--lexer-verbose", action="store_const", default=False, const=True, help="enable lexer verbosity")
 
     parser.add_argument("--output", action="store", default=None, help="select output file (default stdout)")
     parser.add_argument("--allow-error", action="store", default=0, type=int, help="set the number of accepted errors before stopping")
     parser.add_argument("input", action="store", nargs="+", help="list of input files")
     parser.add_argument("--mode", action="store", default="objdump", choices=["objdump", "trace", "asm"], help="indicate assembly parsing mode")
-    parser.add_argument("--arch", action="store", default=DummyArchitecture(), type=parse_architecture, help="select target architecture")
+    parser.add_argument("--arch", action="store", default="dummy", type=parse_architecture, help="select target architecture")
     parser.add_argument("--verbose-lexing", action="store_const", default=False, const=True, help="enable verbose lexing (more debug/info/warning messages)")
     parser.add_argument("--verbose-pattern", action="store_const", default=False, const=True, help="indicate that verbose match pattern must be use to distinguish insn")
     parser.add_argument("--display-all-opcodes", action="store_const", default=False, const=True, help="also display zero value count for absent opcodes")
     parser.add_argument("--csv", action="store_const", default=False, const=True, help="output in csv format")
+    parser.add_argument("--line-cache", action="store", default=0, type=int,
+                        help="memorize lexing and matching of up to <N> distinct lines (0 disables the cache)")
+    parser.add_argument("--jobs", action="store", default=1, type=int,
+                        help="number of worker processes input files are spread over")
+    parser.add_argument("--chunk-size", action="store", default=0, type=int,
+                        help="split uncompressed inputs into chunks of about <N> bytes parsed by separate workers (0 disables splitting)")
+    parser.add_argument("--cache-dir", action="store", default=None,
+                        help="directory of the persistent cache of per-input statistics (disabled by default)")
+    parser.add_argument("--cache-size", action="store", default=100, type=int,
+                        help="maximal size of the persistent cache directory (in MiB)")
+    return parser
 
-    args = parser.parse_args()
 
+def main(argv=None):
+    """ run asm_stats on command line <argv> (default sys.argv) """
+    run(build_arg_parser().parse_args(argv))
 
-    error_count = 0
 
-    stats = collections.defaultdict(lambda: collections.defaultdict(lambda: 0))
+def run(args, arch=None):
+    """ compute and dump the opcode statistics of args.input, <arch> is the
+        architecture instance used by sequential parsing (a new instance of
+        args.arch by default) """
+    stats_cache = None
+    if not args.cache_dir is None:
+        stats_cache = result_cache.ResultCache(args.cache_dir, args.cache_size * 2**20)
 
-    for input_name in args.input:
-        print("parsing input program {}".format(input_name))
-        program = Program()
-        arch = args.arch()
-        asm_parser = AsmParser(arch, program)
-        with open(input_name, "r") as input_stream:
-            # TODO/FIXME: optimize file reading (line by line rather than full file at once)
-            full_input_file = input_stream.read()
-            for line_no, line in enumerate(full_input_file.split("\n")):
-                if "file format" in line:
-                    # skipped line defining file format
-                    continue
-                lexem_list = lexer.generate_line_lexems(line, verbose=args.verbose_lexing)
-                if args.lexer_verbose:
-                    print(lexem_list)
-                dbg_object = DebugObject(line_no + 1)
-                if args.allow_error:
-                    try:
-                        if args.mode == "objdump":
-                            asm_parser.parse_objdump_line(lexem_list, dbg_object=dbg_object)
-                        elif args.mode == "trace":
-                            asm_parser.parse_trace_line(lexem_list, dbg_object=dbg_object)
-                        else:
-                            asm_parser.parse_asm_line(lexem_list, dbg_object=dbg_object)
-                    except:
-                        print("error @line {}, {}".format(line_no, line))
-                        print(lexem_list)
-                        error_count += 1
-                        if error_count > args.allow_error:
-                            raise
+    if args.jobs > 1 or args.chunk_size > 0:
+        # each worker process has its own line cache
+        if arch is None:
+            arch = args.arch()
+        stats = collections.defaultdict(lambda: collections.defaultdict(lambda: 0))
+        error_count, hit_count, miss_count = 0, 0, 0
+        # list of (input name, cache key, cached opcode histogram)
+        input_list = []
+        for input_name in args.input:
+            cache_key, cached_opc_map = None, None
+            if not stats_cache is None:
+                cache_key, cached_opc_map = load_cached_result(args, stats_cache, input_name)
+            input_list.append((input_name, cache_key, cached_opc_map))
+        with multiprocessing.Pool(args.jobs, initializer=init_worker, initargs=(args,)) as pool:
+            # imap returns results in task order, the merge does not depend
+            # on which worker finishes first
+            task_list = list(get_input_tasks(args, [input_name for input_name, _, cached_opc_map in input_list if cached_opc_map is None]))
+            task_results = zip(task_list, pool.imap(analyse_input_in_worker, task_list))
+            for input_name, cache_key, cached_opc_map in input_list:
+                program_stats = ProgramStatistics(arch, input_name)
+                if not cached_opc_map is None:
+                    program_stats.opc_map.update(cached_opc_map)
                 else:
-                    # if no error is allowed, we do not try/except to
-                    # be sure to catch the first error where it's raised
-                    # which simplify debug (e.g. through pdb)
-                    if args.mode == "objdump":
-                        asm_parser.parse_objdump_line(lexem_list, dbg_object=dbg_object)
-                    elif args.mode == "trace":
-                        asm_parser.parse_trace_line(lexem_list, dbg_object=dbg_object)
-                    else:
-                        asm_parser.parse_asm_line(lexem_list, dbg_object=dbg_object)
-            # finish program (e.g. connecting last BB to sink)
-            asm_parser.program.end_program()
-
-        program_stats = ProgramStatistics(arch, input_name)
-        program_stats.analyse_program(program, args.verbose_pattern)
-        program_stats.fuse_in(stats, exhaustive_opc=args.display_all_opcodes)
+                    print("parsing input program {}".format(input_name))
+                    # merging the results of all the chunks of the input
+                    input_error_count = 0
+                    for (_, chunk), result in task_results:
+                        _, opc_map, chunk_error_count, cache_counts, exit_status = result
+                        if exit_status != 0:
+                            print("parsing input program {} failed".format(input_name))
+                            sys.exit(exit_status)
+                        for opc in opc_map:
+                            program_stats.opc_map[opc] += opc_map[opc]
+                        input_error_count += chunk_error_count
+                        hit_count += cache_counts[0]
+                        miss_count += cache_counts[1]
+                        if chunk is None or chunk[3]:
+                            break
+                    error_count += input_error_count
+                    if not stats_cache is None and input_error_count == 0:
+                        store_result(stats_cache, cache_key, program_stats)
+                program_stats.fuse_in(stats, exhaustive_opc=args.display_all_opcodes)
+        if error_count > args.allow_error:
+            print("{} error(s) found, exceeding --allow-error {}".format(error_count, args.allow_error))
+            raise Exception()
+        if args.line_cache > 0:
+            print("line cache: {} hit(s), {} miss(es) over {} worker(s)".format(hit_count, miss_count, args.jobs))
+    else:
+        # shared by all input programs (cached instructions are only used for their
+        # opcode and match pattern)
+        insn_line_cache = line_cache.LineCache(args.line_cache) if args.line_cache > 0 else None
+        stats, _ = analyse_inputs(args, args.input, insn_line_cache, stats_cache, arch=arch)
+        if not insn_line_cache is None:
+            print(insn_line_cache.get_summary())
+
+    if not stats_cache is None:
+        stats_cache.evict()
 
     def display_title(print_callback):
         print_callback("# " + ", ".join(args.input))
@@ -136,3 +371,6 @@ if __name__ == "__main__":
         dump_stats(print)
         #stats.dump(exhaustive_display=args.display_all_opcodes, csv_format=args.csv)
 
+
+if __name__ == "__main__":
+    main()
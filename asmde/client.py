@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+""" Client side of the asmde server mode: forward a command line to a
+    server started by "asmde.py serve" and replay its output. Only standard
+    library modules are imported so that forwarding a request does not pay
+    for loading the allocator and architectures """
+import os
+import sys
+import json
+import socket
+
+
+def extract_server_option(argv):
+    """ return the pair (socket path given by --server or None, @p argv
+        without the --server option) """
+    socket_path = None
+    remaining_argv = []
+    index = 0
+    while index < len(argv):
+        if argv[index] == "--server" and index + 1 < len(argv):
+            socket_path = argv[index + 1]
+            index += 2
+            continue
+        elif argv[index].startswith("--server="):
+            socket_path = argv[index][len("--server="):]
+        else:
+            remaining_argv.append(argv[index])
+        index += 1
+    return socket_path, remaining_argv
+
+def send_request(socket_path, request):
+    """ send @p request to the server listening on @p socket_path and return
+        its response (one JSON object each way) """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client_socket:
+        client_socket.connect(socket_path)
+        client_socket.sendall((json.dumps(request) + "\n").encode())
+        client_socket.shutdown(socket.SHUT_WR)
+        with client_socket.makefile("r") as response_stream:
+            return json.loads(response_stream.read())
+
+def forward_command(socket_path, command, argv):
+    """ run @p command ("allocate" or "stats") with options @p argv on the
+        server, replay its output and return its exit status """
+    try:
+        response = send_request(socket_path, {"command": command, "argv": argv, "cwd": os.getcwd()})
+    except (OSError, ValueError) as error:
+        print("unable to reach asmde server on {}: {}".format(socket_path, error), file=sys.stderr)
+        return 1
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["status"]
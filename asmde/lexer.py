@@ -3,6 +3,9 @@
 import re
 
 class ParentLexem:
+    # one lexem object is built per token: no per-instance __dict__
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -14,67 +17,84 @@ class ParentLexem:
         return "{}({})".format(self.__class__.__name__, self.value)
 
 class Lexem(ParentLexem):
+    __slots__ = ()
     PATTERN = "[\w\d_]+"
 
 
 class Separator(ParentLexem):
-    pass
+    __slots__ = ()
 
 class RegisterLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = "\$([ar][0-9]+){1,4}"
 
     def __repr__(self):
         return "RegisterLexem({})".format(self.value)
 
 class SpecialRegisterLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = "\$([\w\d]+)"
 
     def __repr__(self):
         return "SpecialRegisterLexem({})".format(self.value)
 
 class ImmediateLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = "([+-]|)[0-9]+"
 
 class HexImmediateLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = "(\(|)([+-]|)0x[0-9a-fA-F_]+(\)|)"
 
 class OperatorLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = "[()\[\]\.<>]"
 
 class LabelEndLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = ":"
 
 class BundleSeparatorLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = ";;"
 
 class FunctionStartLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = "{{{"
 class FunctionEndLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = "}}}"
 
 class MacroLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = "\/\/#"
 
 class CommentHeadLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = "\/\/(?!#)"
 
 class TraceCommentHeadLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = "#"
 
 class ObjdumpMacro(ParentLexem):
+    __slots__ = ()
     PATTERN = "([\.]{3}|\*\*\*)"
 
 class ObjdumpLabel(ParentLexem):
+    __slots__ = ()
     PATTERN = "<[\w\d._+-]+>"
 
 class DiscardedSymbol(ParentLexem):
+    __slots__ = ()
     PATTERN = "[,]"
 
 class UnmatchedLexem(ParentLexem):
     """ class for unmatched lexem """
-    pass
+    __slots__ = ()
 
 class SymbolLexem(ParentLexem):
+    __slots__ = ()
     PATTERN = "%(hi|lo)\([.\w\d]+\)"
 
 
@@ -85,38 +105,55 @@ SEP_PATTERN = "([ \t,=\?])+"
 # DUMMY SEPARATOR (to be discarded during lexing)
 DUMMY_SEP_PATTERN = "[ \t,=]+"
 
+# lexem classes, by decreasing matching priority
+LEXEM_CLASS_LIST = [
+    ObjdumpMacro, ObjdumpLabel, FunctionStartLexem, FunctionEndLexem,
+    CommentHeadLexem, TraceCommentHeadLexem, LabelEndLexem, MacroLexem,
+    HexImmediateLexem, ImmediateLexem, RegisterLexem, OperatorLexem,
+    BundleSeparatorLexem, Lexem, SpecialRegisterLexem, SymbolLexem
+]
+LEXEM_CLASS_MAP = dict((lexem_class.__name__, lexem_class) for lexem_class in LEXEM_CLASS_LIST)
+
+# master scanner: ordered alternation of one named group per lexem class,
+# the first alternative which matches is selected (same priority as LEXEM_CLASS_LIST)
+SCANNER_REGEX = re.compile("|".join("(?P<{}>{})".format(lexem_class.__name__, lexem_class.PATTERN) for lexem_class in LEXEM_CLASS_LIST))
+SEP_REGEX = re.compile(SEP_PATTERN)
+# sub-word which could not be matched by any lexem class
+UNMATCHED_REGEX = re.compile("[^ \t,=\?]+")
+
 def generate_line_lexems(s, verbose=False):
     """ generate the list of lexems found in line @p s """
     lexem_list = []
-    for sub_word in re.split(SEP_PATTERN, s):
-        if sub_word in ['', ' ', '\t']: continue
-        lexem_match = None
-        for lexem_class in [ObjdumpMacro, ObjdumpLabel, FunctionStartLexem, FunctionEndLexem,
-                            CommentHeadLexem, TraceCommentHeadLexem, LabelEndLexem, MacroLexem,
-                            HexImmediateLexem, ImmediateLexem, RegisterLexem, OperatorLexem,
-                            BundleSeparatorLexem, Lexem, SpecialRegisterLexem, SymbolLexem]:
-            lexem_match = lexem_class.match(sub_word)
-            if lexem_match is None:
+    scanner_match = SCANNER_REGEX.match
+    sep_match = SEP_REGEX.match
+    pos = 0
+    length = len(s)
+    while pos < length:
+        sep = sep_match(s, pos)
+        if not sep is None:
+            pos = sep.end()
+            # only the last character of a separator sequence is
+            # considered as a potential lexem
+            sep_char = sep.group(1)
+            if sep_char in " \t":
                 continue
-            else:
-                lexem_match_string = lexem_match.group(0)
-                if not re.match(DUMMY_SEP_PATTERN, lexem_match_string) and lexem_match_string != "":
-                    # only add lexem if it is a valid string (not empty nor a dont care seperator)
-                    lexem_list.append(lexem_class(lexem_match_string))
-                remainder = sub_word[lexem_match.end(0):]
-                if remainder != "":
-                    lexem_list = lexem_list + generate_line_lexems(remainder, verbose=verbose)
-                break
-        if lexem_match is None:
-            if DiscardedSymbol.match(sub_word):
-                # discard
+            elif DiscardedSymbol.match(sep_char):
                 if verbose:
-                    print("discarding '{}' ".format(sub_word))
-                pass
+                    print("discarding '{}' ".format(sep_char))
             else:
-                lexem_list.append(UnmatchedLexem(sub_word))
+                lexem_list.append(UnmatchedLexem(sep_char))
                 if verbose:
-                    print("could not match lexically '{}' ".format(sub_word))
+                    print("could not match lexically '{}' ".format(sep_char))
+            continue
+        lexem_match = scanner_match(s, pos)
+        if lexem_match is None:
+            # the remainder of the sub-word is unmatched
+            lexem_match = UNMATCHED_REGEX.match(s, pos)
+            lexem_list.append(UnmatchedLexem(lexem_match.group(0)))
+            if verbose:
+                print("could not match lexically '{}' ".format(lexem_match.group(0)))
+        else:
+            lexem_list.append(LEXEM_CLASS_MAP[lexem_match.lastgroup](lexem_match.group(0)))
+        pos = lexem_match.end()
 
     return lexem_list
-
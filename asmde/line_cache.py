@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+""" Opt-in memoization of line lexing and instruction matching for
+    repetitive inputs (unrolled loops in objdump files, execution traces).
+
+    Lines are keyed on their text, stripped of the trace timestamp and PC
+    fields and of the trailing register value dump. An entry keeps the lexem
+    list of the key text and, once the line has been matched, the
+    Instruction built by the matcher: later occurrences skip both lexing and
+    matching and get a shallow copy of this Instruction.
+    Copies share their operand lists and match pattern with the cached
+    instruction, which is fine for statistics (asm_stats) but not for
+    register allocation. """
+
+import collections
+import re
+
+import asmde.lexer as lexer
+
+
+# "<timestamp>: <PC>:" fields starting each line of an assembly trace
+# (fields do not contain lexer separators)
+TRACE_PREFIX_REGEX = re.compile(r"\s*(?P<timestamp>[^\s:,=?]+):\s*(?P<pc>[^\s:,=?]+):")
+# trailing hex fields of an assembly trace line (register value dump), they
+# are lexed as HexImmediateLexem which the trace parser discards
+TRACE_VALUE_DUMP_REGEX = re.compile(r"(?:[ \t,=]+\(?[+-]?0x[0-9a-fA-F_]+\)?)+[ \t,=]*$")
+
+
+class LineCacheEntry:
+    """ lexems of a line key and the instruction (with the number of lexems
+        left unmatched after it) it has been matched into, if any """
+    __slots__ = ("lexem_list", "insn", "remaining_lexem_num")
+
+    def __init__(self, lexem_list):
+        self.lexem_list = lexem_list
+        self.insn = None
+        self.remaining_lexem_num = 0
+
+
+class LineCache:
+    """ LRU cache: line key -> LineCacheEntry, holding at most @p capacity
+        entries """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entry_map = collections.OrderedDict()
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def __len__(self):
+        return len(self.entry_map)
+
+    def get_entry(self, key, verbose=False):
+        """ return the entry of @p key, lexing @p key into a new entry
+            (evicting the least recently used one if needed) on a miss """
+        entry = self.entry_map.get(key)
+        if entry is None:
+            self.miss_count += 1
+            entry = LineCacheEntry(lexer.generate_line_lexems(key, verbose=verbose))
+            self.entry_map[key] = entry
+            if len(self.entry_map) > self.capacity:
+                self.entry_map.popitem(last=False)
+        else:
+            self.hit_count += 1
+            self.entry_map.move_to_end(key)
+        return entry
+
+    def get_summary(self):
+        lookup_count = self.hit_count + self.miss_count
+        return "line cache: {} hit(s), {} miss(es) ({:.1f}% hit rate), {} entries".format(
+            self.hit_count, self.miss_count,
+            100.0 * self.hit_count / max(1, lookup_count), len(self))
+
+
+def lex_field(field):
+    """ return the lexem of @p field if the lexer would scan it as a single
+        lexem, else None """
+    lexem_match = lexer.SCANNER_REGEX.match(field)
+    if lexem_match is None or lexem_match.end() != len(field):
+        return None
+    return lexer.LEXEM_CLASS_MAP[lexem_match.lastgroup](field)
+
+def lex_prefix(prefix_match, verbose=False):
+    """ lex the trace prefix matched by @p prefix_match, which is equivalent
+        to (but much cheaper than) lexer.generate_line_lexems(prefix) """
+    timestamp = lex_field(prefix_match.group("timestamp"))
+    program_counter = lex_field(prefix_match.group("pc"))
+    if timestamp is None or program_counter is None:
+        return lexer.generate_line_lexems(prefix_match.group(0), verbose=verbose)
+    return [timestamp, lexer.LabelEndLexem(":"), program_counter, lexer.LabelEndLexem(":")]
+
+def generate_cached_lexed_lines(line_iterable, line_cache, mode, verbose=False, skip_line=None):
+    """ generate a tuple (line index, line, lexem list, cache entry) for each
+        line of @p line_iterable (similar to reader.generate_lexed_lines) """
+    for line_no, line in enumerate(line_iterable):
+        if not skip_line is None and skip_line(line):
+            continue
+        # in traces, lines are keyed without their timestamp and PC fields
+        # and without their register value dump
+        prefix_match = TRACE_PREFIX_REGEX.match(line) if mode == "trace" else None
+        if prefix_match is None:
+            entry = line_cache.get_entry(line, verbose=verbose)
+            lexem_list = entry.lexem_list
+        else:
+            key = line[prefix_match.end():]
+            if "0x" in key:
+                key = TRACE_VALUE_DUMP_REGEX.sub("", key)
+            entry = line_cache.get_entry(key, verbose=verbose)
+            lexem_list = lex_prefix(prefix_match, verbose=verbose) + entry.lexem_list
+        yield line_no, line, lexem_list, entry
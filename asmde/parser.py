@@ -29,27 +29,27 @@ from asmde.allocator import (
 
 
 def NextLexem_OperatorPredicate(op_value):
-    """ construct a predicate: lexem_list -> boolean
-        which checks if the next lexem is an operator whose value macthes
+    """ construct a predicate: lexem_list, index -> boolean
+        which checks if the lexem at @p index is an operator whose value macthes
         @p op_value (do not consume it) """
-    def predicate(lexem_list):
-        if len(lexem_list) == 0:
+    def predicate(lexem_list, index=0):
+        if index >= len(lexem_list):
             return False
-        head_lexem = lexem_list[0]
+        head_lexem = lexem_list[index]
         return isinstance(head_lexem, OperatorLexem) and head_lexem.value == op_value
     return predicate
 
 def MetaPopOperatorPredicate(op_value):
-    """ construct a predicate: lexem_list -> boolean / lexem_list
-        which checks if the next lexem is an operator whose value macthes
-        @p op_value, consumes it if it macth and return the remaining lexem list,
-        if it does not, the functions returns False (no lexem list) """
-    def predicate(lexem_list):
-        lexem = lexem_list[0]
+    """ construct a predicate: lexem_list, index -> None / index
+        which checks if the lexem at @p index is an operator whose value macthes
+        @p op_value, consumes it if it macth and return the index of the next lexem,
+        if it does not, the functions returns None (no index) """
+    def predicate(lexem_list, index=0):
+        lexem = lexem_list[index]
         if not isinstance(lexem, OperatorLexem) or lexem.value != op_value:
             # raise Exception(" expecting operator {}, got {}".format(op_value, lexem))
             return None
-        return lexem_list[1:]
+        return index + 1
     return predicate
 
 
@@ -58,12 +58,27 @@ class Pattern:
         # pattern identifier used to distinguish between pattern instances
         self.tag = tag
 
-    def parse(self, arch, lexem_list):
-        """ parse @p lexem_list assuming it must match pattern.
+    def parse(self, arch, lexem_list, index=0):
+        """ parse @p lexem_list, starting at lexem @p index, assuming it must
+            match pattern.
             If it does not, returns None,
-            Else return a tuple (match result, remaining lexems list) """
+            Else return a tuple (match result, index of the next lexem).
+            The lexem list is never copied: patterns only move the index """
         raise NotImplementedError
 
+    def compile(self, arch):
+        """ return a matcher function equivalent to self.parse:
+            (arch, lexem_list, index) -> None / (match result, next index)
+            specialized once for architecture @p arch (patterns
+            overloading parse should overload compile too) """
+        return self.parse
+
+    def get_first_lexem_classes(self, arch):
+        """ return the tuple of lexem classes this pattern can start with:
+            the pattern fails (returns None, without raising) on any other
+            lexem. None means that any lexem may start the pattern """
+        return None
+
 class VirtualRegisterPattern(Pattern):
     VIRT_REG_DESCRIPTOR = "RDQOABCD"
     VIRT_REG_CLASS = {
@@ -71,16 +86,17 @@ class VirtualRegisterPattern(Pattern):
             "A": Register.Acc
     }
     @classmethod
-    def parse(VRP_Class, arch, lexem_list):
+    def parse(VRP_Class, arch, lexem_list, index=0):
         """ Try to parse a virtual register description for @p lexem_list
+            (starting at @p index)
             return a pair with:
             - the list (most likely a single element) of virtual register
               encoded in lexem
-            - a list of remaining lexems """
-        if len(lexem_list) == 0:
+            - the index of the next lexem """
+        if index >= len(lexem_list):
             return None
-        virtual_register_type_lexem = lexem_list[0]
-        lexem_list = lexem_list[1:]
+        virtual_register_type_lexem = lexem_list[index]
+        index += 1
         reg_type = virtual_register_type_lexem.value
         REG_CLASS_PATTERN_MAP = arch.getVirtualRegClassPatternMap()
 
@@ -88,17 +104,43 @@ class VirtualRegisterPattern(Pattern):
             # fail to match
             return None
 
-        lexem_list = MetaPopOperatorPredicate("(")(lexem_list)
+        index = MetaPopOperatorPredicate("(")(lexem_list, index)
 
         reg_name_list = []
-        while isinstance(lexem_list[0], Lexem) and lexem_list[0].value != ")":
-            reg_name_list.append(lexem_list[0].value)
-            lexem_list = lexem_list[1:]
+        while isinstance(lexem_list[index], Lexem) and lexem_list[index].value != ")":
+            reg_name_list.append(lexem_list[index].value)
+            index += 1
 
-        lexem_list = MetaPopOperatorPredicate(")")(lexem_list)
+        index = MetaPopOperatorPredicate(")")(lexem_list, index)
 
         reg_list = VRP_Class.get_reg_list_from_names(arch, reg_name_list, reg_type)
-        return reg_list, lexem_list
+        return reg_list, index
+
+    @classmethod
+    def compile(VRP_Class, arch):
+        REG_CLASS_PATTERN_MAP = arch.getVirtualRegClassPatternMap()
+        get_reg_list_from_names = VRP_Class.get_reg_list_from_names
+        pop_open = MetaPopOperatorPredicate("(")
+        pop_close = MetaPopOperatorPredicate(")")
+        def matcher(arch, lexem_list, index=0):
+            if index >= len(lexem_list):
+                return None
+            virtual_register_type_lexem = lexem_list[index]
+            reg_type = virtual_register_type_lexem.value
+            if not isinstance(virtual_register_type_lexem, Lexem) or not reg_type in REG_CLASS_PATTERN_MAP:
+                return None
+            index = pop_open(lexem_list, index + 1)
+            reg_name_list = []
+            while isinstance(lexem_list[index], Lexem) and lexem_list[index].value != ")":
+                reg_name_list.append(lexem_list[index].value)
+                index += 1
+            index = pop_close(lexem_list, index)
+            return get_reg_list_from_names(arch, reg_name_list, reg_type), index
+        return matcher
+
+    @classmethod
+    def get_first_lexem_classes(VRP_Class, arch):
+        return (Lexem,)
 
     @classmethod
     def get_reg_list_from_names(VRP_Class, arch, reg_name_list, reg_type):
@@ -147,6 +189,9 @@ class VirtualRegisterPattern_DualStd(VirtualRegisterPattern_DualReg):
     VIRT_REG_CLASS = Register.Std
     VIRT_REG_DESCRIPTOR = "D"
 
+# generic register specifier / index split (e.g. "r12" -> ("r", 12))
+SPEC_INDEX_REGEX = re.compile("(?P<spec>\D+)(?P<index>\d+)")
+
 class PhysicalRegisterPattern(Pattern):
     """ pattern for physical register """
     REG_PATTERN = None
@@ -162,7 +207,7 @@ class PhysicalRegisterPattern(Pattern):
         """ split string @p s into specifier and index
             return a 3-uple (isAlias, spec, index) """
         try:
-            match = re.match("(?P<spec>\D+)(?P<index>\d+)", s)
+            match = SPEC_INDEX_REGEX.match(s)
             spec = match.group("spec")
             index = int(match.group("index"))
         except:
@@ -171,48 +216,104 @@ class PhysicalRegisterPattern(Pattern):
         return spec, index
 
     @classmethod
-    def parse(PRP_Class, arch, lexem_list):
-        if not len(lexem_list):
-            return None
-        elif isinstance(lexem_list[0], PRP_Class.REG_LEXEM):
-            #raise Exception("RegisterLexem was expected, got: {}".format(lexem))
-            reg_lexem = lexem_list[0]
-
-            # STD_REG_PATTERN = "\$([r][0-9]+){1,4}"
-            #ACC_REG_PATTERN = "\$([a][0-9]+){1,4}"
-
-
-            if re.fullmatch(PRP_Class.REG_PATTERN, reg_lexem.value):
+    def resolve_register_list(PRP_Class, arch, reg_name):
+        """ return the list of physical registers spelled @p reg_name
+            (e.g. "$r0r1" or "a0") or None if @p reg_name does not match
+            the pattern. Results (including failures) are memorized in the
+            architecture's register name table for PRP_Class """
+        name_table = arch.get_phys_reg_name_table(PRP_Class)
+        if reg_name in name_table:
+            register_tuple = name_table[reg_name]
+            name_table.move_to_end(reg_name)
+        else:
+            if re.fullmatch(PRP_Class.REG_PATTERN, reg_name):
                 # extracting specifier and index
-                spec_index_list = [PRP_Class.splitSpecIndex(subreg) for subreg in re.findall(PRP_Class.SUB_REG_PATTERN, reg_lexem.value)]
-                register_list = [PRP_Class.get_unique_reg_obj(arch, index, spec) for (spec, index) in spec_index_list]
-            #if re.fullmatch(STD_REG_PATTERN, reg_lexem.value):
-            #    register_list = [arch.get_unique_phys_reg_object(index, PhysicalRegister.Std) for index in index_range]
-            #elif re.fullmatch(ACC_REG_PATTERN, reg_lexem.value):
-            #    register_list = [arch.get_unique_phys_reg_object(index, PhysicalRegister.Acc) for index in index_range]
+                spec_index_list = [PRP_Class.splitSpecIndex(subreg) for subreg in re.findall(PRP_Class.SUB_REG_PATTERN, reg_name)]
+                register_tuple = tuple(PRP_Class.get_unique_reg_obj(arch, index, spec) for (spec, index) in spec_index_list)
             else:
-                return None
-                raise NotImplementedError
+                register_tuple = None
+            arch.add_phys_reg_name(name_table, reg_name, register_tuple)
+        # a new list is returned as instructions may modify their operand lists
+        return None if register_tuple is None else list(register_tuple)
 
-            return register_list, lexem_list[1:]
+    @classmethod
+    def parse(PRP_Class, arch, lexem_list, index=0):
+        if index >= len(lexem_list):
+            return None
+        elif isinstance(lexem_list[index], PRP_Class.REG_LEXEM):
+            register_list = PRP_Class.resolve_register_list(arch, lexem_list[index].value)
+            if register_list is None:
+                return None
+            return register_list, index + 1
         else:
             # trying to parse a virtual register
             return None
 
+    @classmethod
+    def compile(PRP_Class, arch):
+        if not hasattr(PRP_Class, "SUB_REG_PATTERN"):
+            # no sub-register decomposition (e.g. special registers)
+            return PRP_Class.parse
+        reg_lexem_class = PRP_Class.REG_LEXEM
+        name_table = arch.get_phys_reg_name_table(PRP_Class)
+        resolve_register_list = PRP_Class.resolve_register_list
+        def matcher(arch, lexem_list, index=0):
+            if index >= len(lexem_list):
+                return None
+            reg_lexem = lexem_list[index]
+            if not isinstance(reg_lexem, reg_lexem_class):
+                return None
+            register_tuple = name_table.get(reg_lexem.value, False)
+            if register_tuple is False:
+                register_list = resolve_register_list(arch, reg_lexem.value)
+            else:
+                name_table.move_to_end(reg_lexem.value)
+                register_list = None if register_tuple is None else list(register_tuple)
+            if register_list is None:
+                return None
+            return register_list, index + 1
+        return matcher
+
+    @classmethod
+    def get_first_lexem_classes(PRP_Class, arch):
+        return (PRP_Class.REG_LEXEM,)
+
+
+def merge_first_lexem_classes(first_classes_list):
+    """ union of the first lexem classes of several patterns """
+    if any(first_classes is None for first_classes in first_classes_list):
+        return None
+    return tuple(set(sum(first_classes_list, ())))
+
 
 class PhysicalRegisterPattern_Any(Pattern):
     """ pattern for physical register """
     REG_PATTERN = None
 
     @classmethod
-    def parse(PRP_Class, arch, lexem_list):
+    def parse(PRP_Class, arch, lexem_list, index=0):
         for RegPatternClass in arch.getPhyRegPatternList():
-            result = RegPatternClass.parse(arch, lexem_list)
+            result = RegPatternClass.parse(arch, lexem_list, index)
             if result is not None:
-                register_list, new_lexem_list = result
-                return register_list, new_lexem_list
+                register_list, next_index = result
+                return register_list, next_index
         return None
 
+    @classmethod
+    def compile(PRP_Class, arch):
+        matcher_list = tuple(RegPatternClass.compile(arch) for RegPatternClass in arch.getPhyRegPatternList())
+        def matcher(arch, lexem_list, index=0):
+            for reg_matcher in matcher_list:
+                result = reg_matcher(arch, lexem_list, index)
+                if result is not None:
+                    return result
+            return None
+        return matcher
+
+    @classmethod
+    def get_first_lexem_classes(PRP_Class, arch):
+        return merge_first_lexem_classes([RegPatternClass.get_first_lexem_classes(arch) for RegPatternClass in arch.getPhyRegPatternList()])
+
 class PhysicalRegisterPattern_Std(PhysicalRegisterPattern):
     REG_PATTERN = "\$([r][0-9]+)"
     SUB_REG_PATTERN = "([r][0-9]+)"
@@ -237,18 +338,34 @@ class RegisterPattern(Pattern):
     PHYSICAL_PATTERN_CLASS = None
 
     @classmethod
-    def parse(RP_Class, arch, lexem_list):
-        virtual_match = RP_Class.VIRTUAL_PATTERN_CLASS.parse(arch, lexem_list)
+    def parse(RP_Class, arch, lexem_list, index=0):
+        virtual_match = RP_Class.VIRTUAL_PATTERN_CLASS.parse(arch, lexem_list, index)
         if not virtual_match is None:
-            # pair (register_list, remaining lexem list)
+            # pair (register_list, next lexem index)
             return virtual_match
-        physical_match = RP_Class.PHYSICAL_PATTERN_CLASS.parse(arch, lexem_list)
+        physical_match = RP_Class.PHYSICAL_PATTERN_CLASS.parse(arch, lexem_list, index)
         if not physical_match is None:
-            # pair (register_list, remaining lexem list)
+            # pair (register_list, next lexem index)
             return physical_match
         # no match
         return None
 
+    @classmethod
+    def compile(RP_Class, arch):
+        virtual_matcher = RP_Class.VIRTUAL_PATTERN_CLASS.compile(arch)
+        physical_matcher = RP_Class.PHYSICAL_PATTERN_CLASS.compile(arch)
+        def matcher(arch, lexem_list, index=0):
+            virtual_match = virtual_matcher(arch, lexem_list, index)
+            if not virtual_match is None:
+                return virtual_match
+            return physical_matcher(arch, lexem_list, index)
+        return matcher
+
+    @classmethod
+    def get_first_lexem_classes(RP_Class, arch):
+        return merge_first_lexem_classes([RP_Class.VIRTUAL_PATTERN_CLASS.get_first_lexem_classes(arch),
+                                          RP_Class.PHYSICAL_PATTERN_CLASS.get_first_lexem_classes(arch)])
+
 class RegisterPattern_Std(RegisterPattern):
     VIRTUAL_PATTERN_CLASS = VirtualRegisterPattern_Std
     PHYSICAL_PATTERN_CLASS = PhysicalRegisterPattern_Std
@@ -264,20 +381,20 @@ class RegisterPattern_Acc(RegisterPattern):
 
 class ImmediatePattern(Pattern):
     @staticmethod
-    def parse(arch, lexem_list):
-        imm_lexem = lexem_list[0]
+    def parse(arch, lexem_list, index=0):
+        imm_lexem = lexem_list[index]
         if isinstance(imm_lexem, ImmediateLexem):
             value = ImmediateValue(int(imm_lexem.value))
             # if there is a post-fix HexImmediateLexem (as in objdump file
             # we consume it also
-            if len(lexem_list) > 1 and isinstance(lexem_list[1], HexImmediateLexem):
-                lexem_list = lexem_list[2:]
+            if len(lexem_list) > index + 1 and isinstance(lexem_list[index + 1], HexImmediateLexem):
+                index += 2
             else:
-                lexem_list = lexem_list[1:]
-            return value, lexem_list
+                index += 1
+            return value, index
         elif re.match("%.*\(.*\)", imm_lexem.value):
             # immediate symbol
-            return ImmediateValue(imm_lexem.value), lexem_list[1:]
+            return ImmediateValue(imm_lexem.value), index + 1
         else:
             print(f"unrecognized lexem {imm_lexem} while parsing for immediate")
             raise NotImplementedError
@@ -287,21 +404,42 @@ class GenericOffsetPattern(Pattern):
     OffsetVirtuallRegisterClass = None
 
     @classmethod
-    def parse(cls, arch, lexem_list):
-        offset_lexem = lexem_list[0]
+    def parse(cls, arch, lexem_list, index=0):
+        offset_lexem = lexem_list[index]
         if isinstance(offset_lexem, ImmediateLexem):
-            offset_imm, lexem_list = ImmediatePattern.parse(arch, lexem_list)
+            offset_imm, index = ImmediatePattern.parse(arch, lexem_list, index)
             offset = [offset_imm]
         elif isinstance(offset_lexem, RegisterLexem):
-            offset, lexem_list = cls.OffsetPhysicalRegisterClass.parse(arch, lexem_list)
+            offset, index = cls.OffsetPhysicalRegisterClass.parse(arch, lexem_list, index)
         elif isinstance(offset_lexem, Lexem):
-            offset, lexem_list = cls.OffsetVirtuallRegisterClass.parse(arch, lexem_list)
+            offset, index = cls.OffsetVirtuallRegisterClass.parse(arch, lexem_list, index)
         elif isinstance(offset_lexem, SymbolLexem):
-            offset, lexem_list = [ImmediateValue(offset_lexem.value)], lexem_list[1:]
+            offset, index = [ImmediateValue(offset_lexem.value)], index + 1
         else:
             print("unrecognized lexem {} while parsing for offset".format(offset_lexem))
             raise NotImplementedError
-        return offset, lexem_list
+        return offset, index
+
+    @classmethod
+    def compile(cls, arch):
+        physical_matcher = cls.OffsetPhysicalRegisterClass.compile(arch)
+        virtual_matcher = cls.OffsetVirtuallRegisterClass.compile(arch)
+        def matcher(arch, lexem_list, index=0):
+            offset_lexem = lexem_list[index]
+            if isinstance(offset_lexem, ImmediateLexem):
+                offset_imm, index = ImmediatePattern.parse(arch, lexem_list, index)
+                offset = [offset_imm]
+            elif isinstance(offset_lexem, RegisterLexem):
+                offset, index = physical_matcher(arch, lexem_list, index)
+            elif isinstance(offset_lexem, Lexem):
+                offset, index = virtual_matcher(arch, lexem_list, index)
+            elif isinstance(offset_lexem, SymbolLexem):
+                offset, index = [ImmediateValue(offset_lexem.value)], index + 1
+            else:
+                print("unrecognized lexem {} while parsing for offset".format(offset_lexem))
+                raise NotImplementedError
+            return offset, index
+        return matcher
 
 
 class OffsetPattern_Std(GenericOffsetPattern):
@@ -310,78 +448,118 @@ class OffsetPattern_Std(GenericOffsetPattern):
     OffsetVirtuallRegisterClass = VirtualRegisterPattern_Std
 
 class AddrValue:
+    __slots__ = ("base", "offset")
+
     def __init__(self, base=None, offset=None):
         self.base = base
         self.offset = offset
 
 class AddressPattern_Std(Pattern):
     @staticmethod
-    def parse(arch, lexem_list):
-        offset_match = OffsetPattern_Std.parse(arch, lexem_list)
+    def parse(arch, lexem_list, index=0):
+        offset_match = OffsetPattern_Std.parse(arch, lexem_list, index)
         if offset_match is None: return None
-        offset_value, lexem_list = offset_match
-        lexem_list = MetaPopOperatorPredicate("[")(lexem_list)
-        if lexem_list is None:
+        offset_value, index = offset_match
+        index = MetaPopOperatorPredicate("[")(lexem_list, index)
+        if index is None:
             # match failed
             return None
-        base_match = RegisterPattern_Std.parse(arch, lexem_list)
+        base_match = RegisterPattern_Std.parse(arch, lexem_list, index)
         if base_match is None: return None
-        base_value, lexem_list = base_match
-        lexem_list = MetaPopOperatorPredicate("]")(lexem_list)
-        if lexem_list is None:
+        base_value, index = base_match
+        index = MetaPopOperatorPredicate("]")(lexem_list, index)
+        if index is None:
             # match failed
             return None
-        return AddrValue(base=base_value, offset=offset_value), lexem_list
+        return AddrValue(base=base_value, offset=offset_value), index
+
+    def compile(self, arch):
+        return compile_address_matcher(arch, OffsetPattern_Std, RegisterPattern_Std, "[", "]")
+
+def compile_address_matcher(arch, OffsetPatternClass, BasePatternClass, open_op, close_op):
+    """ build the matcher of an address "<offset> <open_op> <base> <close_op>" """
+    offset_matcher = OffsetPatternClass.compile(arch)
+    base_matcher = BasePatternClass.compile(arch)
+    pop_open = MetaPopOperatorPredicate(open_op)
+    pop_close = MetaPopOperatorPredicate(close_op)
+    def matcher(arch, lexem_list, index=0):
+        offset_match = offset_matcher(arch, lexem_list, index)
+        if offset_match is None: return None
+        offset_value, index = offset_match
+        index = pop_open(lexem_list, index)
+        if index is None: return None
+        base_match = base_matcher(arch, lexem_list, index)
+        if base_match is None: return None
+        base_value, index = base_match
+        index = pop_close(lexem_list, index)
+        if index is None: return None
+        return AddrValue(base=base_value, offset=offset_value), index
+    return matcher
 
 class OpcodePattern(Pattern):
     def __init__(self, tag="opcode", match_predicate=False):
         Pattern.__init__(self, tag)
         self.match_predicate = match_predicate
 
-    def parse(self, arch, lexem_list):
-        if len(lexem_list) == 0:
+    def parse(self, arch, lexem_list, index=0):
+        if index >= len(lexem_list):
             return None
         else:
-            head, lexem_list = lexem_list[0], lexem_list[1:]
+            head, index = lexem_list[index], index + 1
             if (not isinstance(head, Lexem)):
                 return None
             opcode = head.value
-            while self.match_predicate and isinstance(lexem_list[0], OperatorLexem) and lexem_list[0].value == ".":
-                assert isinstance(lexem_list[1], Lexem)
-                predicate = lexem_list[1].value
+            while self.match_predicate and isinstance(lexem_list[index], OperatorLexem) and lexem_list[index].value == ".":
+                assert isinstance(lexem_list[index + 1], Lexem)
+                predicate = lexem_list[index + 1].value
                 opcode = "{}.{}".format(opcode, predicate)
-                lexem_list = lexem_list[2:]
+                index += 2
 
-            return opcode, lexem_list
+            return opcode, index
+
+    def compile(self, arch):
+        if self.match_predicate:
+            return self.parse
+        def matcher(arch, lexem_list, index=0):
+            if index >= len(lexem_list):
+                return None
+            head = lexem_list[index]
+            if not isinstance(head, Lexem):
+                return None
+            return head.value, index + 1
+        return matcher
+
+    def get_first_lexem_classes(self, arch):
+        return (Lexem,)
 
 class LabelPattern(Pattern):
     def __init__(self, tag="label"):
         Pattern.__init__(self, tag)
 
-    def parse(self, arch, lexem_list):
-        if len(lexem_list) == 0:
+    def parse(self, arch, lexem_list, index=0):
+        if index >= len(lexem_list):
             return None
         else:
-            head, lexem_list = lexem_list[0], lexem_list[1:]
+            head, index = lexem_list[index], index + 1
             if (not isinstance(head, (Lexem, ObjdumpLabel))) and (isinstance(head, OperatorLexem) and head.value != "<"):
                 if head.value == ".":
                     # label starting with "."
-                    label = head.value + lexem_list[0].value
-                    return label, lexem_list[1:]
+                    label = head.value + lexem_list[index].value
+                    return label, index + 1
                 else:
                     return None
             if isinstance(head, OperatorLexem) and head.value == "<":
                 label = head.value
-                head, lexem_list = lexem_list[0], lexem_list[1:]
+                head, index = lexem_list[index], index + 1
                 while not isinstance(head, OperatorLexem) or head.value != ">":
                     label = label + head.value
-                    if not len(lexem_list):
+                    if index >= len(lexem_list):
                         # no match
                         return None
-                    head, lexem_list = lexem_list[0], lexem_list[1:]
+                    head, index = lexem_list[index], index + 1
                 # adding final ">"
                 label = label + head.value
-            return head.value, lexem_list
+            return head.value, index
 
 
 class SequentialPattern:
@@ -391,37 +569,75 @@ class SequentialPattern:
         self.result_builder = result_builder
         self.tag = tag
 
-    def match(self, arch, lexem_list):
+    def match(self, arch, lexem_list, index=0):
+        """ match @p lexem_list from lexem @p index, return None if it does
+            not match, else a tuple (result, index of the next lexem) """
         match_result = {}
         for pattern in self.elt_pattern_list:
-            result = pattern.parse(arch, lexem_list)
+            result = pattern.parse(arch, lexem_list, index)
             if result is None:
                 return None
-            # retieving parse result and updating remaining list of lexems
-            value, lexem_list = result
+            # retieving parse result and updating the next lexem index
+            value, index = result
             if not value is None:
                 match_result[pattern.tag] = value
 
-        return self.result_builder(match_result), lexem_list
+        return self.result_builder(match_result), index
+
+    def compile(self, arch):
+        """ return a matcher function equivalent to self.match specialized
+            for architecture @p arch """
+        tagged_matcher_list = tuple((pattern.tag, pattern.compile(arch)) for pattern in self.elt_pattern_list)
+        result_builder = self.result_builder
+        def matcher(arch, lexem_list, index=0):
+            match_result = {}
+            for tag, elt_matcher in tagged_matcher_list:
+                result = elt_matcher(arch, lexem_list, index)
+                if result is None:
+                    return None
+                value, index = result
+                if not value is None:
+                    match_result[tag] = value
+            return result_builder(match_result), index
+        return matcher
+
+    def get_first_lexem_classes(self, arch):
+        """ see Pattern.get_first_lexem_classes """
+        if not len(self.elt_pattern_list):
+            return None
+        return self.elt_pattern_list[0].get_first_lexem_classes(arch)
 
 class OptionalPattern:
     """ Optional pattern, does not return an error
         if the lexem_list is not matched, rather
-        returns None, lexem_list (unmodified) """
+        returns None, index (unmodified) """
     def __init__(self, opt_pattern):
         self.opt_pattern = opt_pattern
 
-    def parse(self, arch, lexem_list):
-        result = self.opt_pattern.parse(arch, lexem_list)
+    def parse(self, arch, lexem_list, index=0):
+        result = self.opt_pattern.parse(arch, lexem_list, index)
         if result is None:
-            return None, lexem_list
-        value, lexem_list = result
-        return value, lexem_list
+            return None, index
+        value, index = result
+        return value, index
+
+    def compile(self, arch):
+        opt_matcher = self.opt_pattern.compile(arch)
+        def matcher(arch, lexem_list, index=0):
+            result = opt_matcher(arch, lexem_list, index)
+            if result is None:
+                return None, index
+            return result
+        return matcher
 
     @property
     def tag(self):
         return self.opt_pattern.tag
 
+    def get_first_lexem_classes(self, arch):
+        # an optional pattern matches (empty) before any lexem
+        return None
+
 
 class DisjonctivePattern:
     """ match one of the element in the list """
@@ -429,14 +645,99 @@ class DisjonctivePattern:
         self.elt_pattern_list = elt_pattern_list
         self.tag_list = tag_list if not tag_list is None else []
 
-    def match(self, arch, lexem_list):
+    def match(self, arch, lexem_list, index=0):
         for pattern in self.elt_pattern_list:
-            result = pattern.match(arch, lexem_list)
+            result = pattern.match(arch, lexem_list, index)
             if not result is None:
-                # should be tuple Result, lexem_list
+                # should be tuple Result, next lexem index
                 return result
         return None
 
+    def get_first_lexem_classes(self, arch):
+        """ see Pattern.get_first_lexem_classes, alternatives are not
+            inspected """
+        return None
+
+    def compile(self, arch):
+        """ return a matcher function equivalent to self.match.
+            When every alternative is a SequentialPattern, the element
+            patterns shared by all alternatives (same pattern up to its tag)
+            are matched only once, then the alternatives which can match
+            the next lexem (see Pattern.get_first_lexem_classes) are selected
+            from its class: the other ones are not tried """
+        if not all(isinstance(pattern, SequentialPattern) for pattern in self.elt_pattern_list):
+            matcher_list = tuple(pattern.compile(arch) for pattern in self.elt_pattern_list)
+            def matcher(arch, lexem_list, index=0):
+                for elt_matcher in matcher_list:
+                    result = elt_matcher(arch, lexem_list, index)
+                    if not result is None:
+                        return result
+                return None
+            return matcher
+
+        elt_pattern_lists = [pattern.elt_pattern_list for pattern in self.elt_pattern_list]
+        prefix_len = 0
+        while all(prefix_len < len(elt_list) and equivalent_patterns(elt_list[prefix_len], elt_pattern_lists[0][prefix_len]) for elt_list in elt_pattern_lists):
+            prefix_len += 1
+        prefix_matcher_list = tuple(elt.compile(arch) for elt in elt_pattern_lists[0][:prefix_len])
+
+        # list of (prefix tags, tagged matchers of the remaining elements,
+        # result builder, first lexem classes of the remaining elements)
+        alternative_list = []
+        for pattern, elt_list in zip(self.elt_pattern_list, elt_pattern_lists):
+            prefix_tags = tuple(elt.tag for elt in elt_list[:prefix_len])
+            suffix_matcher_list = tuple((elt.tag, elt.compile(arch)) for elt in elt_list[prefix_len:])
+            first_classes = elt_list[prefix_len].get_first_lexem_classes(arch) if len(elt_list) > prefix_len else None
+            alternative_list.append((prefix_tags, suffix_matcher_list, pattern.result_builder, first_classes))
+        all_alternatives = tuple(alt[:3] for alt in alternative_list)
+
+        # lexem class -> alternatives (in declaration order) which may match it
+        dispatch_map = {}
+        def get_alternatives(lexem_class):
+            if not lexem_class in dispatch_map:
+                dispatch_map[lexem_class] = tuple(alt[:3] for alt in alternative_list if alt[3] is None or issubclass(lexem_class, alt[3]))
+            return dispatch_map[lexem_class]
+
+        def matcher(arch, lexem_list, index=0):
+            prefix_value_list = []
+            for elt_matcher in prefix_matcher_list:
+                result = elt_matcher(arch, lexem_list, index)
+                if result is None:
+                    return None
+                value, index = result
+                prefix_value_list.append(value)
+            if index < len(lexem_list):
+                candidate_list = dispatch_map.get(type(lexem_list[index]))
+                if candidate_list is None:
+                    candidate_list = get_alternatives(type(lexem_list[index]))
+            else:
+                candidate_list = all_alternatives
+            prefix_index = index
+            for prefix_tags, suffix_matcher_list, result_builder in candidate_list:
+                match_result = {tag: value for tag, value in zip(prefix_tags, prefix_value_list) if not value is None}
+                index = prefix_index
+                for tag, elt_matcher in suffix_matcher_list:
+                    result = elt_matcher(arch, lexem_list, index)
+                    if result is None:
+                        break
+                    value, index = result
+                    if not value is None:
+                        match_result[tag] = value
+                else:
+                    return result_builder(match_result), index
+            return None
+        return matcher
+
+
+def equivalent_patterns(lhs, rhs):
+    """ test if patterns @p lhs and @p rhs match the same lexems (they may
+        only differ by their tags) """
+    if type(lhs) != type(rhs):
+        return False
+    lhs_attributes = dict(vars(lhs), tag=None)
+    rhs_attributes = dict(vars(rhs), tag=None)
+    return lhs_attributes == rhs_attributes
+
 
 class AsmParser:
     def __init__(self, arch, program, verbose=False):
@@ -450,7 +751,22 @@ class AsmParser:
         # enable debug/info messages
         self.verbose = verbose
 
-    def parse_asm_line(self, lexem_list, dbg_object, src_line=""):
+    def match_insn(self, insn_matcher, lexem_list, cache_entry=None):
+        """ match @p lexem_list with @p insn_matcher, if @p cache_entry
+            (asmde.line_cache.LineCacheEntry) is set, the match is memorized
+            in it and a copy of its instruction is returned (without matching)
+            once it has been matched """
+        if cache_entry is None:
+            return insn_matcher(self.arch, lexem_list)
+        if cache_entry.insn is None:
+            insn_match = insn_matcher(self.arch, lexem_list)
+            if insn_match is None:
+                return None
+            cache_entry.insn, index = insn_match
+            cache_entry.remaining_lexem_num = len(lexem_list) - index
+        return cache_entry.insn.copy(), len(lexem_list) - cache_entry.remaining_lexem_num
+
+    def parse_asm_line(self, lexem_list, dbg_object, src_line="", cache_entry=None):
         if not len(lexem_list): return
         head = lexem_list[0]
         if isinstance(head, BundleSeparatorLexem):
@@ -458,7 +774,7 @@ class AsmParser:
             self.program.add_bundle(self.ongoing_bundle)
             self.ongoing_bundle = Bundle()
         elif isinstance(head, MacroLexem):
-            self.parse_macro(lexem_list[1:], dbg_object)
+            self.parse_macro(lexem_list, dbg_object, index=1)
         elif isinstance(head, (CommentHeadLexem, TraceCommentHeadLexem)):
             pass
         elif isinstance(head, OperatorLexem) and head.value == ".":
@@ -477,44 +793,39 @@ class AsmParser:
 
             else:
                 mnemonic = head.value
-                if mnemonic in self.arch.insn_patterns:
-                    insn_pattern = self.arch.insn_patterns[mnemonic]
+                if mnemonic in self.arch.insn_matchers:
+                    insn_matcher = self.arch.insn_matchers[mnemonic]
                 else:
                     # looking for compound instruction with specifier
                     # by assembling <lexem0> "." <lexem1> "." (...) <lexemN>
                     # into "<lexem0>.<lexem1>.(...)<lexemN>"
-                    sub_lexem_list = lexem_list[1:]
-                    while isinstance(sub_lexem_list[0], OperatorLexem) and sub_lexem_list[0].value == ".":
-                        assert isinstance(sub_lexem_list[1], Lexem)
-                        predicate = sub_lexem_list[1].value
+                    index = 1
+                    while isinstance(lexem_list[index], OperatorLexem) and lexem_list[index].value == ".":
+                        assert isinstance(lexem_list[index + 1], Lexem)
+                        predicate = lexem_list[index + 1].value
                         mnemonic = "{}.{}".format(mnemonic, predicate)
-                        sub_lexem_list = sub_lexem_list[2:]
+                        index += 2
 
-                    if mnemonic in self.arch.insn_patterns:
-                        insn_pattern = self.arch.insn_patterns[mnemonic]
+                    if mnemonic in self.arch.insn_matchers:
+                        insn_matcher = self.arch.insn_matchers[mnemonic]
                     else:
                         print("unable to parse {} @ {}".format(lexem_list, dbg_object))
                         raise NotImplementedError
 
-                insn_match = insn_pattern.match(self.arch, lexem_list)
+                insn_match = self.match_insn(insn_matcher, lexem_list, cache_entry)
                 if insn_match is None:
                     print("failed to match mnemonic {} in {}".format(mnemonic, lexem_list))
                     import pdb; pdb.set_trace()
                     sys.exit(1)
                 else:
-                    insn_object, lexem_list = insn_match
+                    insn_object, _ = insn_match
 
                 # adding meta information
                 insn_object.dbg_object = dbg_object
                 # registering instruction
                 self.ongoing_bundle.add_insn(insn_object)
                 if insn_object.is_jump:
-                    # succ = self.program.bb_label_map[insn_object.use_list[0]]
-                    # TODO/FIXME jump bb label should be extracted with method
-                    #            and not directly from index 0 of use_list
-                    succ = self.program.get_bb_by_label(insn_object.jump_label)
-                    self.program.current_bb.add_successor(succ)
-                    succ.add_predecessor(self.program.current_bb)
+                    self.program.add_jump(insn_object)
                 if not self.arch.hasBundle():
                     # if the architecture does not bundle multiple instructions
                     # (e.g. VLIW), we only emit one instruction per bundle
@@ -525,7 +836,7 @@ class AsmParser:
             print(f"unable to parse line {src_line}\n{lexem_list}")
             raise NotImplementedError
 
-    def parse_objdump_line(self, lexem_list, dbg_object):
+    def parse_objdump_line(self, lexem_list, dbg_object, cache_entry=None):
         if not len(lexem_list): return
         head = lexem_list[0]
         if isinstance(head, BundleSeparatorLexem):
@@ -533,17 +844,15 @@ class AsmParser:
             self.program.add_bundle(self.ongoing_bundle)
             self.ongoing_bundle = Bundle()
         elif isinstance(head, MacroLexem):
-            self.parse_macro(lexem_list[1:], dbg_object)
+            self.parse_macro(lexem_list, dbg_object, index=1)
         elif isinstance(head, CommentHeadLexem):
             pass
         elif isinstance(head, ObjdumpMacro):
             pass
         elif isinstance(head, OperatorLexem) and head.value == "<":
             # label
-            label = head.value
-            while not isinstance(lexem_list[0], OperatorLexem) or lexem_list[0].value != ">":
-                label = label + lexem_list.pop(0).value
-            assert isinstance(lexem_list[1], LabelEndLexem)
+            label, index = self.parse_bracket_label(head, lexem_list)
+            assert isinstance(lexem_list[index + 1], LabelEndLexem)
             self.program.add_label(label)
 
         elif isinstance(head, ObjdumpLabel):
@@ -565,14 +874,13 @@ class AsmParser:
                 self.program.add_label(head.value)
 
             else:
-                if head.value in self.arch.insn_patterns:
-                    insn_pattern = self.arch.insn_patterns[head.value]
-                    insn_match = insn_pattern.match(self.arch, lexem_list)
+                if head.value in self.arch.insn_matchers:
+                    insn_match = self.match_insn(self.arch.insn_matchers[head.value], lexem_list, cache_entry)
                     if insn_match is None:
                         print("failed to match {} in {}".format(head.value, lexem_list))
                         sys.exit(1)
                     else:
-                        insn_object, lexem_list = insn_match
+                        insn_object, index = insn_match
 
                 else:
                     print("unable to parse {} @ {}, head={}".format(lexem_list, dbg_object, head))
@@ -582,15 +890,10 @@ class AsmParser:
                 # registering instruction
                 self.ongoing_bundle.add_insn(insn_object)
                 if insn_object.is_jump:
-                    # succ = self.program.bb_label_map[insn_object.use_list[0]]
-                    # TODO/FIXME jump bb label should be extract with method
-                    #            and not directly from index 0 of use_list
-                    succ = self.program.get_bb_by_label(insn_object.jump_label)
-                    self.program.current_bb.add_successor(succ)
-                    succ.add_predecessor(self.program.current_bb)
+                    self.program.add_jump(insn_object)
                 # in objdump file, a instruction line may be ended by a bundle separator
                 #   goto label;;
-                if len(lexem_list) and isinstance(lexem_list[-1], BundleSeparatorLexem) or \
+                if index < len(lexem_list) and isinstance(lexem_list[-1], BundleSeparatorLexem) or \
                         not self.arch.hasBundle():
                     self.program.add_bundle(self.ongoing_bundle)
                     self.ongoing_bundle = Bundle()
@@ -599,20 +902,32 @@ class AsmParser:
             print(head, lexem_list, dbg_object)
             raise NotImplementedError
 
-    def parse_macro(self, lexem_list, dbg_object):
-        """ parse macro line once '//#' has been consumed """
-        macro_name = lexem_list[0]
-        lexem_list = lexem_list[1:]
+    def parse_bracket_label(self, head, lexem_list):
+        """ assemble the lexems of a "<label>" label (as found in objdump
+            files and traces) and return it with the index of its
+            closing '>' lexem """
+        label = head.value
+        index = 0
+        while not isinstance(lexem_list[index], OperatorLexem) or lexem_list[index].value != ">":
+            label = label + lexem_list[index].value
+            index += 1
+        return label, index
+
+    def parse_macro(self, lexem_list, dbg_object, index=0):
+        """ parse macro line once '//#' has been consumed (@p index is the
+            index of the macro name in @p lexem_list) """
+        macro_name = lexem_list[index]
+        index += 1
 
         # consuming "("
-        lexem_list = MetaPopOperatorPredicate("(")(lexem_list)
+        index = MetaPopOperatorPredicate("(")(lexem_list, index)
 
         register_list = []
-        while len(lexem_list) and not NextLexem_OperatorPredicate(")")(lexem_list):
-            sub_reg_list, lexem_list = self.parse_register_from_list(lexem_list)
+        while index < len(lexem_list) and not NextLexem_OperatorPredicate(")")(lexem_list, index):
+            sub_reg_list, index = self.parse_register_from_list(lexem_list, index)
             register_list = register_list + sub_reg_list
 
-        lexem_list = MetaPopOperatorPredicate(")")(lexem_list)
+        index = MetaPopOperatorPredicate(")")(lexem_list, index)
 
         # register alias disambiguation
         register_list = [reg.baseReg for reg in register_list]
@@ -630,7 +945,7 @@ class AsmParser:
             #Error
             sys.exit(1)
 
-    def parse_trace_line(self, lexem_list, dbg_object):
+    def parse_trace_line(self, lexem_list, dbg_object, cache_entry=None):
         """ parse assembly trace """
         if not len(lexem_list): return
 
@@ -639,28 +954,28 @@ class AsmParser:
         if isinstance(head, asmde.lexer.TraceCommentHeadLexem):
             return
         elif isinstance(head, MacroLexem):
-            self.parse_macro(lexem_list[1:], dbg_object)
+            self.parse_macro(lexem_list, dbg_object, index=1)
             return
         elif isinstance(head, (asmde.lexer.FunctionStartLexem, asmde.lexer.FunctionEndLexem)):
             # ignoring function start and end
             return
 
 
-        def match_field_sep(lexem_list):
+        def match_field_sep(lexem_list, index):
             """ in ASM trace timestamp and PC field ends with ':' """
-            head = lexem_list[0]
+            head = lexem_list[index]
             if isinstance(head, LabelEndLexem):
-                return lexem_list[1:]
+                return index + 1
             return None
 
         # trace is
         # <timestamp>':' <PC as hex>':'  <operation>
         timestamp = lexem_list[0]
-        lexem_list = match_field_sep(lexem_list[1:])
-        assert not lexem_list is None
-        program_counter = lexem_list[0]
-        lexem_list = match_field_sep(lexem_list[1:])
-        assert not lexem_list is None
+        index = match_field_sep(lexem_list, 1)
+        assert not index is None
+        program_counter = lexem_list[index]
+        index = match_field_sep(lexem_list, index + 1)
+        assert not index is None
 
         # if the timestamp has changed (should be increase)
         # we commit the previous bundle and open a new one
@@ -673,15 +988,13 @@ class AsmParser:
 
         # strip HexImmediateLexem from lexem_list as they corresponds to register value dump
         # in traces
-        lexem_list = list(filter(lambda v: not isinstance(v, HexImmediateLexem), lexem_list))
+        lexem_list = [lexem for lexem in lexem_list[index:] if not isinstance(lexem, HexImmediateLexem)]
         head = lexem_list[0]
 
         if isinstance(head, OperatorLexem) and head.value == "<":
             # label
-            label = head.value
-            while not isinstance(lexem_list[0], OperatorLexem) or lexem_list[0].value != ">":
-                label = label + lexem_list.pop(0).value
-            assert isinstance(lexem_list[1], LabelEndLexem)
+            label, index = self.parse_bracket_label(head, lexem_list)
+            assert isinstance(lexem_list[index + 1], LabelEndLexem)
             self.program.add_label(label)
 
         elif isinstance(head, ObjdumpLabel):
@@ -693,14 +1006,13 @@ class AsmParser:
                 self.program.add_label(head.value)
 
         elif isinstance(head, Lexem):
-            if head.value in self.arch.insn_patterns:
-                insn_pattern = self.arch.insn_patterns[head.value]
-                insn_match = insn_pattern.match(self.arch, lexem_list)
+            if head.value in self.arch.insn_matchers:
+                insn_match = self.match_insn(self.arch.insn_matchers[head.value], lexem_list, cache_entry)
                 if insn_match is None:
                     print("failed to match {} in {}".format(head.value, lexem_list))
                     sys.exit(1)
                 else:
-                    insn_object, lexem_list = insn_match
+                    insn_object, index = insn_match
 
             else:
                 print("unable to parse {} @ {}, head={}".format(lexem_list, dbg_object, head))
@@ -710,57 +1022,52 @@ class AsmParser:
             # registering instruction
             self.ongoing_bundle.add_insn(insn_object)
             if insn_object.is_jump:
-                # succ = self.program.bb_label_map[insn_object.use_list[0]]
-                # TODO/FIXME jump bb label should be extract with method
-                #            and not directly from index 0 of use_list
-                succ = self.program.get_bb_by_label(insn_object.jump_label)
-                self.program.current_bb.add_successor(succ)
-                succ.add_predecessor(self.program.current_bb)
+                self.program.add_jump(insn_object)
             # in objdump file, a instruction line may be ended by a bundle separator
             #   goto label;;
-            if len(lexem_list) and isinstance(lexem_list[-1], BundleSeparatorLexem):
+            if index < len(lexem_list) and isinstance(lexem_list[-1], BundleSeparatorLexem):
                 self.program.add_bundle(self.ongoing_bundle)
                 self.ongoing_bundle = Bundle()
         else:
             print(head, lexem_list, dbg_object)
             raise NotImplementedError
 
-    def parse_insn_from_list(self, lexem_list):
-        insn = lexem_list[0]
-        lexem_list = lexem_list[1:]
-        return insn, lexem_list
+    def parse_insn_from_list(self, lexem_list, index=0):
+        insn = lexem_list[index]
+        return insn, index + 1
 
-    def parse_register_from_list(self, lexem_list):
-        return self.parse_register(lexem_list)
+    def parse_register_from_list(self, lexem_list, index=0):
+        return self.parse_register(lexem_list, index)
 
-    def parse_virtual_register(self, lexem_list):
+    def parse_virtual_register(self, lexem_list, index=0):
         """ Try to parse a virtual register description for @p lexem_list
+            (starting at @p index)
             return a pair with:
             - the list (most likely a single element) of virtual register
               encoded in lexem
-            - a list of remaining lexems """
-        match = VirtualRegisterPattern_Any.parse(self.arch, lexem_list)
+            - the index of the next lexem """
+        match = VirtualRegisterPattern_Any.parse(self.arch, lexem_list, index)
         if match is None:
             return match
-        reg_list, lexem_list = match
-        return reg_list, lexem_list
+        reg_list, index = match
+        return reg_list, index
 
-    def parse_register(self, lexem_list):
+    def parse_register(self, lexem_list, index=0):
         """ extract the lexem register representing a list of registers
-            return the list of register object and the remaining
-            list of lexems """
-        register_match = PhysicalRegisterPattern_Any.parse(self.arch, lexem_list)
+            return the list of register object and the index of
+            the next lexem """
+        register_match = PhysicalRegisterPattern_Any.parse(self.arch, lexem_list, index)
         if not register_match is None:
-            reg_list, lexem_list = register_match
-            return reg_list, lexem_list
+            reg_list, index = register_match
+            return reg_list, index
         else:
             # trying to parse a virtual register
-            register_match = self.parse_virtual_register(lexem_list)
+            register_match = self.parse_virtual_register(lexem_list, index)
             if register_match is None:
-                print("unable to parse register from {}".format(lexem_list))
+                print("unable to parse register from {}".format(lexem_list[index:]))
                 sys.exit(1)
-            reg_list, lexem_list = register_match
-            return reg_list, lexem_list
+            reg_list, index = register_match
+            return reg_list, index
 
 
 
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+""" Instrumentation of the asmde pipeline: per-pass wall time, call count
+    and peak memory (--time-passes), and whole run profiling (--profile) """
+
+import atexit
+import contextlib
+import time
+
+# tracemalloc and cProfile are imported when instrumentation is enabled:
+# they are not needed by (and would slow down the start-up of) regular runs
+
+
+class PassRecord:
+    """ cumulated measures of every call to a pass """
+    __slots__ = ("name", "time", "call_count", "peak_memory")
+
+    def __init__(self, name):
+        self.name = name
+        self.time = 0.0
+        self.call_count = 0
+        # maximal memory (in bytes) allocated over the memory in use at
+        # the start of the call, None if memory is not traced
+        self.peak_memory = None
+
+
+class TimedPass:
+    """ context manager measuring one call to a pass """
+    def __init__(self, record, trace_memory):
+        self.record = record
+        self.trace_memory = trace_memory
+
+    def __enter__(self):
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.reset_peak()
+            self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.record.time += time.perf_counter() - self.start_time
+        self.record.call_count += 1
+        if self.trace_memory:
+            import tracemalloc
+            peak_memory = tracemalloc.get_traced_memory()[1] - self.start_memory
+            if self.record.peak_memory is None or peak_memory > self.record.peak_memory:
+                self.record.peak_memory = peak_memory
+        return False
+
+
+class PassTimer:
+    """ collect PassRecord for each named pass, passes must not be nested.
+        A disabled timer does not measure anything (timed_pass returns
+        a no-op context manager) """
+    def __init__(self, enabled=True, trace_memory=True):
+        self.enabled = enabled
+        self.trace_memory = False
+        # True if memory tracing has been started by (and must be stopped
+        # with) this timer
+        self.started_tracing = False
+        # pass name -> PassRecord, in order of first call
+        self.record_map = {}
+        if enabled and trace_memory:
+            import tracemalloc
+            # per-pass peaks rely on tracemalloc.reset_peak (python >= 3.9),
+            # peak memory is reported as "-" with older versions
+            self.trace_memory = hasattr(tracemalloc, "reset_peak")
+            if self.trace_memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+
+    def close(self):
+        """ stop memory tracing if it has been started by this timer (it
+            slows down everything run after it) """
+        if self.started_tracing:
+            import tracemalloc
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def get_record(self, pass_name):
+        if not pass_name in self.record_map:
+            self.record_map[pass_name] = PassRecord(pass_name)
+        return self.record_map[pass_name]
+
+    def timed_pass(self, pass_name):
+        """ return a context manager measuring a call to pass @p pass_name """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return TimedPass(self.get_record(pass_name), self.trace_memory)
+
+    def timed_iterator(self, pass_name, iterable):
+        """ iterate over @p iterable, each element generation being measured
+            as a call to pass @p pass_name (e.g. lexing) """
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        timed_call = TimedPass(self.get_record(pass_name), self.trace_memory)
+        while True:
+            with timed_call:
+                try:
+                    element = next(iterator)
+                except StopIteration:
+                    element = timed_call
+            if element is timed_call:
+                # the final call did not generate any element
+                timed_call.record.call_count -= 1
+                return
+            yield element
+
+    def report(self, print_callback=print):
+        print_callback("{:30} {:>10} {:>8} {:>15}".format("pass", "time (s)", "calls", "peak mem (KiB)"))
+        for record in self.record_map.values():
+            peak_memory = "-" if record.peak_memory is None else "{:.1f}".format(record.peak_memory / 1024)
+            print_callback("{:30} {:10.4f} {:8} {:>15}".format(record.name, record.time, record.call_count, peak_memory))
+        total_time = sum(record.time for record in self.record_map.values())
+        print_callback("{:30} {:10.4f}".format("total", total_time))
+        if self.trace_memory:
+            print_callback("(timings include memory tracing overhead)")
+
+
+PROFILE_MODE_LIST = ["cprofile", "tracemalloc"]
+
+def start_profiling(filename, mode="cprofile"):
+    """ start profiling the rest of the run, the result is written to
+        @p filename at exit: cProfile statistics (readable with pstats) or
+        a tracemalloc snapshot (readable with tracemalloc.Snapshot.load) """
+    if mode == "cprofile":
+        import cProfile
+        profile = cProfile.Profile()
+        def stop_profiling():
+            profile.disable()
+            profile.dump_stats(filename)
+        profile.enable()
+    elif mode == "tracemalloc":
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        def stop_profiling():
+            tracemalloc.take_snapshot().dump(filename)
+    else:
+        print("unknown profiling mode {}".format(mode))
+        raise Exception()
+    # registered at exit so that runs ended by sys.exit are also profiled
+    atexit.register(stop_profiling)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+""" Streaming input pipeline: reader -> lexer, line by line, so that
+    arbitrarily large (possibly compressed) inputs are processed
+    in bounded memory """
+
+import bz2
+import gzip
+import locale
+import lzma
+
+try:
+    # zstd support is only available in the standard library from python 3.14
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+import asmde.lexer as lexer
+
+
+# list of (magic number, compression name, open function)
+COMPRESSION_FORMAT_LIST = [
+    (b"\x1f\x8b", "gzip", gzip.open),
+    (b"\xfd7zXZ\x00", "xz", lzma.open),
+    (b"BZh", "bzip2", bz2.open),
+    (b"\x28\xb5\x2f\xfd", "zstd", None if zstd is None else zstd.open),
+]
+MAX_MAGIC_LENGTH = max(len(magic) for magic, _, _ in COMPRESSION_FORMAT_LIST)
+
+def get_compression_format(filename):
+    """ return the pair (compression name, open function) matching the
+        magic number of file @p filename, or (None, open) if the file
+        is not compressed """
+    with open(filename, "rb") as raw_stream:
+        header = raw_stream.read(MAX_MAGIC_LENGTH)
+    for magic, compression_name, open_function in COMPRESSION_FORMAT_LIST:
+        if header.startswith(magic):
+            return compression_name, open_function
+    return None, open
+
+def open_input(filename):
+    """ open @p filename as a text stream, transparently decompressing
+        gzip, xz, bzip2 and zstd (if supported by the python version) inputs """
+    compression_name, open_function = get_compression_format(filename)
+    if open_function is None:
+        print("{} is {}-compressed but {} compression is not supported by this python version".format(filename, compression_name, compression_name))
+        raise Exception()
+    if compression_name is None:
+        return open(filename, "r")
+    return open_function(filename, "rt")
+
+def generate_lines(input_stream):
+    """ generate the lines of @p input_stream (without end of line character)
+        one at a time """
+    for line in input_stream:
+        if line.endswith("\n"):
+            line = line[:-1]
+        yield line
+
+def generate_lexed_lines(line_iterable, verbose=False, skip_line=None):
+    """ generate a tuple (line index, line, lexem list) for each line of
+        @p line_iterable, lines verifying the optional predicate @p skip_line
+        are not lexed nor generated (but still counted in the line index) """
+    for line_no, line in enumerate(line_iterable):
+        if not skip_line is None and skip_line(line):
+            continue
+        yield line_no, line, lexer.generate_line_lexems(line, verbose=verbose)
+
+# size of the blocks read when scanning a file for chunk boundaries
+SCAN_BLOCK_SIZE = 1 << 20
+
+def split_line_chunks(filename, chunk_size):
+    """ split uncompressed file @p filename into byte ranges of about
+        @p chunk_size bytes, aligned on line boundaries. Returns a list of
+        tuples (start offset, end offset, index of the first line) """
+    boundary_list = [0]
+    with open(filename, "rb") as raw_stream:
+        raw_stream.seek(0, 2)
+        file_size = raw_stream.tell()
+        while boundary_list[-1] + chunk_size < file_size:
+            # moving the boundary to the start of the line following the target offset
+            raw_stream.seek(boundary_list[-1] + chunk_size - 1)
+            raw_stream.readline()
+            if raw_stream.tell() >= file_size:
+                break
+            boundary_list.append(raw_stream.tell())
+        boundary_list.append(file_size)
+        # counting lines before each boundary
+        raw_stream.seek(0)
+        line_index_list = [0]
+        line_count = 0
+        for start, end in zip(boundary_list[:-2], boundary_list[1:-1]):
+            remaining_size = end - start
+            while remaining_size > 0:
+                block = raw_stream.read(min(SCAN_BLOCK_SIZE, remaining_size))
+                line_count += block.count(b"\n")
+                remaining_size -= len(block)
+            line_index_list.append(line_count)
+    return list(zip(boundary_list[:-1], boundary_list[1:], line_index_list))
+
+def generate_chunk_lines(filename, start, end):
+    """ generate the lines (without end of line character) of the byte range
+        [@p start, @p end[ of uncompressed file @p filename, @p start and
+        @p end must be line boundaries (see split_line_chunks) """
+    encoding = locale.getpreferredencoding(False)
+    with open(filename, "rb") as raw_stream:
+        raw_stream.seek(start)
+        remaining_size = end - start
+        while remaining_size > 0:
+            line = raw_stream.readline(remaining_size)
+            remaining_size -= len(line)
+            # same end of line translation as text mode open
+            line = line.decode(encoding)
+            if line.endswith("\n"):
+                line = line[:-1]
+            if line.endswith("\r"):
+                line = line[:-1]
+            yield line
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+""" Register allocation driver: command line options of asmde.py and the
+    parse -> liveness -> allocation -> dump pipeline, shared by the command
+    line and by the server (asmde.py serve) """
+import os
+import sys
+import copy
+import argparse
+import traceback
+import multiprocessing
+
+from asmde.allocator import Program, RegisterAssignator, DebugObject, AllocationFailure, COLORING_ORDER_LIST
+from asmde.parser import AsmParser
+from asmde.arch_list import parse_architecture
+import asmde.reader as reader
+from asmde.pass_timer import PassTimer, start_profiling, PROFILE_MODE_LIST
+
+
+def build_arg_parser():
+    """ return the argparse parser of asmde.py allocation options """
+    parser = argparse.ArgumentParser(prog="asmde.py")
+    parser.add_argument("--lexer-verbose", action="store_const", default=False, const=True, help="enable lexer info/debug message display")
+    parser.add_argument("--usedef-verbose", action="store_const", default=False, const=True, help="enable use-def evaluation info/message display")
+    parser.add_argument("--parser-verbose", action="store_const", default=False, const=True, help="enable parser debug/info message display")
+    parser.add_argument("--verbose", action="store_const", default=False, const=True, help="enable general debug/info message display")
+
+    parser.add_argument("--output", action="store", default=None, help="select output file (default stdout)")
+    parser.add_argument("-S", dest='asm_dump', action="store_const", default=False, const=True,
+                        help="select assigned assembly output")
+    parser.add_argument("input", nargs="+", help="input file(s), several inputs require --output-dir")
+    parser.add_argument("--output-dir", action="store", default=None,
+                        help="allocate each input separately and write its output into this directory "
+                             "(input file name, with a .h suffix unless -S is set)")
+    parser.add_argument("--jobs", action="store", default=1, type=int,
+                        help="number of worker processes inputs are spread over (with --output-dir)")
+    parser.add_argument("--arch", action="store", default="dummy",
+                                  type=parse_architecture, help="select target architecture")
+    parser.add_argument("--allocator", action="store", default="graph-coloring", choices=["graph-coloring", "linear-scan"],
+                        help="select register allocation algorithm (linear-scan does not build the conflict graph)")
+    parser.add_argument("--coloring-order", action="store", default="max-degree", choices=COLORING_ORDER_LIST,
+                        help="select the order in which graph-coloring assigns registers")
+    parser.add_argument("--no-coalesce", dest="coalesce", action="store_const", default=True, const=False,
+                        help="disable move coalescing (graph-coloring only)")
+    parser.add_argument("--no-spill", dest="spill", action="store_const", default=True, const=False,
+                        help="disable register spilling (fail if registers can not be allocated)")
+    parser.add_argument("--spill-offset", action="store", default=0, type=int,
+                        help="offset (in bytes) of the spill area from the stack pointer, the area grows with the number of spilled registers whose liveranges intersect")
+
+    parser.add_argument("--time-passes", action="store_const", default=False, const=True,
+                        help="report wall time, call count and peak memory of each pass (on stderr)")
+    parser.add_argument("--profile", action="store", default=None,
+                        help="profile the run and write the result to the given file")
+    parser.add_argument("--profile-mode", action="store", default="cprofile", choices=PROFILE_MODE_LIST,
+                        help="select profiler: cprofile statistics (pstats) or tracemalloc snapshot")
+    # handled by asmde.py before parsing (see asmde.client)
+    parser.add_argument("--server", action="store", default=None,
+                        help="forward the request to the server (asmde.py serve) listening on the given socket")
+    return parser
+
+
+def main(argv=None):
+    """ run asmde.py allocation on command line @p argv (default sys.argv) """
+    args = build_arg_parser().parse_args(argv)
+    if not args.profile is None:
+        start_profiling(args.profile, args.profile_mode)
+    run(args)
+
+
+def get_input_args(args, input_name, output):
+    """ return a copy of @p args allocating the single input @p input_name
+        into @p output """
+    input_args = copy.copy(args)
+    input_args.input = input_name
+    input_args.output = output
+    return input_args
+
+def get_output_path(args, input_name):
+    """ return the path of the output of @p input_name in args.output_dir """
+    suffix = "" if args.asm_dump else ".h"
+    return os.path.join(args.output_dir, os.path.basename(input_name) + suffix)
+
+def run(args, arch=None):
+    """ allocate the registers of every program of args.input, @p arch is
+        the architecture instance used when inputs are processed by the
+        current process (a new instance of args.arch by default) """
+    if args.output_dir is None:
+        if len(args.input) > 1:
+            print("allocating several inputs requires --output-dir")
+            sys.exit(1)
+        allocate(get_input_args(args, args.input[0], args.output), arch)
+        return
+    if not args.output is None:
+        print("--output can not be used with --output-dir")
+        sys.exit(1)
+    # list of (input name, output path)
+    task_list = [(input_name, get_output_path(args, input_name)) for input_name in args.input]
+    output_set = set(output for _, output in task_list)
+    if len(output_set) != len(task_list):
+        print("inputs with the same file name would be written to the same output in {}".format(args.output_dir))
+        sys.exit(1)
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.jobs > 1:
+        with multiprocessing.Pool(args.jobs, initializer=init_worker, initargs=(args,)) as pool:
+            status_list = pool.map(allocate_in_worker, task_list)
+    else:
+        init_worker(args, arch)
+        status_list = [allocate_in_worker(task) for task in task_list]
+    failure_list = [input_name for (input_name, _), status in zip(task_list, status_list) if status != 0]
+    if len(failure_list):
+        print("allocation failed for {} input(s): {}".format(len(failure_list), ", ".join(failure_list)))
+        sys.exit(1)
+
+
+# state of the process allocating inputs in batch mode, set by init_worker
+WORKER_ARGS = None
+WORKER_ARCH = None
+
+def init_worker(args, arch=None):
+    global WORKER_ARGS, WORKER_ARCH
+    WORKER_ARGS = args
+    WORKER_ARCH = args.arch() if arch is None else arch
+
+def allocate_in_worker(task):
+    """ allocate task (input name, output path) with the architecture object
+        of the current process, returns the exit status of the allocation
+        (failures do not stop the other inputs) """
+    input_name, output = task
+    # each program starts from an architecture without virtual registers
+    WORKER_ARCH.reset_virtual_registers()
+    try:
+        allocate(get_input_args(WORKER_ARGS, input_name, output), WORKER_ARCH)
+    except SystemExit as exit_exception:
+        return 0 if exit_exception.code in [None, 0] else 1
+    except Exception:
+        print("error while allocating {}".format(input_name))
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def allocate(args, arch=None):
+    """ allocate the registers of program args.input and dump the result,
+        @p arch is the architecture instance to use (a new instance of
+        args.arch by default) """
+    pass_timer = PassTimer(enabled=args.time_passes)
+    try:
+        allocate_timed(args, arch, pass_timer)
+    except AllocationFailure as error:
+        print("register allocation failed: {}".format(error))
+        sys.exit(1)
+    finally:
+        # memory tracing must not outlive the run (e.g. in server workers)
+        pass_timer.close()
+
+def allocate_timed(args, arch, pass_timer):
+    """ allocate, measuring each pass with @p pass_timer """
+    verbose = args.verbose
+    # instantiating architecture
+    if arch is None:
+        arch = args.arch()
+
+    program = Program()
+    asm_parser = AsmParser(arch, program, args.parser_verbose)
+
+    if verbose: print("parsing input program")
+    with reader.open_input(args.input) as input_stream:
+        lexed_lines = reader.generate_lexed_lines(reader.generate_lines(input_stream))
+        for line_no, line, lexem_list in pass_timer.timed_iterator("lexing", lexed_lines):
+            if args.lexer_verbose:
+                print(lexem_list)
+            dbg_object = DebugObject(line_no)
+            with pass_timer.timed_pass("parsing"):
+                asm_parser.parse_asm_line(lexem_list, dbg_object=dbg_object, src_line=line)
+        # finish program (e.g. connecting last BB to sink)
+        with pass_timer.timed_pass("parsing"):
+            asm_parser.program.end_program()
+        if verbose:
+            print(asm_parser.program.bb_list)
+            for label in asm_parser.program.bb_label_map:
+                print("label: {}".format(label))
+                print(asm_parser.program.bb_label_map[label].bundle_list)
+    # manage file I/O exception
+
+    if verbose: print("Register Assignation")
+    reg_assignator = RegisterAssignator(arch, spill_offset=args.spill_offset)
+
+    empty_liverange_map = arch.get_empty_liverange_map()
+
+    with pass_timer.timed_pass("generate_use_def_lists"):
+        var_ins, var_out = reg_assignator.generate_use_def_lists(asm_parser.program, verbose=args.usedef_verbose)
+    with pass_timer.timed_pass("generate_liverange_map"):
+        liverange_map = reg_assignator.generate_liverange_map(asm_parser.program, empty_liverange_map, var_ins, var_out)
+
+    if verbose: print("Checking pre-defined register consistency")
+    for reg in program.pre_defined_list:
+        if not reg in var_out[program.source_bb]:
+            print("{} is declared in pre-defined list but not alive at program source".format(reg))
+            sys.exit(1)
+    for reg in var_out[program.source_bb]:
+        if not reg in program.pre_defined_list and not reg.const:
+            print("{} is alive at program source but not declared in pre-defined list".format(reg))
+            sys.exit(1)
+    if verbose:
+        print("Variable alive at source BB: {}".format([reg for reg in var_out[program.source_bb]]))
+        print("Variable alive at sink BB: {}".format([reg for reg in var_ins[program.sink_bb]]))
+
+    if verbose: print("Checking liveranges")
+    with pass_timer.timed_pass("check_liverange_map"):
+        liverange_status = reg_assignator.check_liverange_map(liverange_map)
+    if verbose: print(liverange_status)
+    if not liverange_status:
+        pass
+
+    while True:
+        # registers which could not be colored (only collected if spilling is enabled)
+        failure_list = [] if args.spill else None
+        if args.allocator == "linear-scan":
+            if verbose: print("Linear scan")
+            conflict_map = None
+            with pass_timer.timed_pass("create_linear_scan_color_map"):
+                color_map = reg_assignator.create_linear_scan_color_map(liverange_map, verbose=verbose, spill_list=failure_list)
+        else:
+            if verbose: print("Graph coloring")
+            with pass_timer.timed_pass("create_conflict_map"):
+                conflict_map = reg_assignator.create_conflict_map(liverange_map)
+            color_map = None
+            if args.coalesce:
+                with pass_timer.timed_pass("coalesce_moves"):
+                    coalesced_map, alias_map = reg_assignator.coalesce_moves(program, conflict_map, verbose=verbose)
+                coalesced_failure_list = []
+                with pass_timer.timed_pass("create_color_map"):
+                    color_map = reg_assignator.create_color_map(coalesced_map, coloring_order=args.coloring_order, spill_list=coalesced_failure_list)
+                if len(coalesced_failure_list):
+                    # coalesced graph could not be colored, falling back to the original one
+                    color_map = None
+                else:
+                    reg_assignator.expand_coalesced_color_map(color_map, alias_map)
+            if color_map is None:
+                with pass_timer.timed_pass("create_color_map"):
+                    color_map = reg_assignator.create_color_map(conflict_map, coloring_order=args.coloring_order, spill_list=failure_list)
+        if not failure_list:
+            break
+        # spilling registers and re-running allocation
+        with pass_timer.timed_pass("spilling"):
+            spill_list = reg_assignator.select_spilled_registers(program, liverange_map, failure_list, conflict_map=conflict_map)
+            if verbose: print("spilling registers {}".format(spill_list))
+            reg_assignator.insert_spill_code(program, spill_list, liverange_map)
+        with pass_timer.timed_pass("generate_use_def_lists"):
+            var_ins, var_out = reg_assignator.generate_use_def_lists(program, verbose=args.usedef_verbose)
+        with pass_timer.timed_pass("generate_liverange_map"):
+            liverange_map = reg_assignator.generate_liverange_map(program, arch.get_empty_liverange_map(), var_ins, var_out)
+    if reg_assignator.spill_area_size:
+        print("[WARNING] registers have been spilled: {} byte(s) must be reserved at offset {} from the stack pointer".format(reg_assignator.spill_area_size, reg_assignator.spill_offset), file=sys.stderr)
+
+    if args.allocator == "linear-scan":
+        with pass_timer.timed_pass("check_liverange_color_map"):
+            check_status = reg_assignator.check_liverange_color_map(liverange_map, color_map)
+        if not check_status:
+            print("register assignation is not valid")
+            sys.exit(1)
+    else:
+        for reg_class in conflict_map:
+            conflict_graph = conflict_map[reg_class]
+            class_color_map = color_map[reg_class]
+            with pass_timer.timed_pass("check_color_map"):
+                check_status = reg_assignator.check_color_map(conflict_graph, class_color_map)
+            if not check_status:
+                print("register assignation for class {} does is not valid")
+                sys.exit(1)
+
+    def dump_allocation(program, arch, color_map, output_callback):
+        """ dump virtual register allocation mapping """
+        if verbose: print("dumping allocation")
+        for reg_class in color_map:
+            for reg in color_map[reg_class]:
+                # spill temporaries only appear in the assembly output
+                if reg.is_virtual() and not reg in reg_assignator.spill_temp_set:
+                    output_callback("#define {} {}\n".format(reg.name, color_map[reg_class][reg]))
+
+    def dump_program(program, arch, color_map, dumpFunction):
+        """ dump whole program with assigned registers """
+        if verbose: print("dumping program")
+        for elt in program.program_seq:
+            dumpFunction(elt.dump(arch, color_map) + "\n")
+
+    # selection of the output generation function
+    if args.asm_dump:
+        outGen = dump_program
+    else:
+        outGen = dump_allocation
+
+    # setting dump function
+    with pass_timer.timed_pass("dump"):
+        if args.output is None:
+            # defaulting to stdout
+            dumpFunction = lambda s: print(s, end="")
+            outGen(program, arch, color_map, dumpFunction)
+        else:
+            with open(args.output, "w") as output_stream:
+                outGen(program, arch, color_map, lambda s: output_stream.write(s))
+
+    if args.time_passes:
+        pass_timer.report(print_callback=lambda s: print(s, file=sys.stderr))
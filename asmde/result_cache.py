@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+""" Persistent (on-disk) cache of asm_stats per-file results.
+
+    Each entry is a JSON file named after a key hashing the content of the
+    input file with every option the result depends on (architecture,
+    parsing mode, ...) and the asmde version. The cache directory size is
+    bounded: least recently used entries (by modification time, refreshed
+    on each load) are evicted first. """
+
+import hashlib
+import json
+import os
+import tempfile
+
+import asmde
+
+
+# size of the blocks read when hashing input files
+HASH_BLOCK_SIZE = 1 << 20
+
+def get_file_digest(filename):
+    """ return the sha256 hex digest of the content of file @p filename """
+    file_hash = hashlib.sha256()
+    with open(filename, "rb") as raw_stream:
+        for block in iter(lambda: raw_stream.read(HASH_BLOCK_SIZE), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+class ResultCache:
+    """ cache directory @p cache_dir holding up to @p max_size bytes of
+        results """
+    ENTRY_SUFFIX = ".json"
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_key(self, filename, *option_list):
+        """ return the cache key of file @p filename processed with options
+            @p option_list (which must be JSON-serializable) """
+        key_desc = [get_file_digest(filename), asmde.__version__] + list(option_list)
+        return hashlib.sha256(json.dumps(key_desc).encode("utf-8")).hexdigest()
+
+    def get_entry_path(self, key):
+        return os.path.join(self.cache_dir, key + self.ENTRY_SUFFIX)
+
+    def load(self, key):
+        """ return the result stored for @p key, or None if there is not any """
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(entry_path, "r") as entry_stream:
+                result = json.load(entry_stream)
+            # refreshing entry for LRU eviction
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            # missing, evicted (possibly concurrently) or corrupted entry
+            return None
+        return result
+
+    def store(self, key, result):
+        """ store JSON-serializable @p result for @p key """
+        # the entry is written to a temporary file first so that concurrent
+        # runs never load partially written entries
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as tmp_stream:
+            json.dump(result, tmp_stream)
+        os.replace(tmp_path, self.get_entry_path(key))
+
+    def evict(self):
+        """ remove least recently used entries until the cache directory
+            holds at most max_size bytes, returns the number of removed
+            entries """
+        entry_list = []
+        for dir_entry in os.scandir(self.cache_dir):
+            if dir_entry.name.endswith(self.ENTRY_SUFFIX):
+                entry_stat = dir_entry.stat()
+                entry_list.append((entry_stat.st_mtime, entry_stat.st_size, dir_entry.path))
+        total_size = sum(size for _, size, _ in entry_list)
+        removed_count = 0
+        for _, size, path in sorted(entry_list):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+            removed_count += 1
+        return removed_count
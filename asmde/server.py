@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+""" Server mode (asmde.py serve): listen on a Unix domain socket and run
+    allocation (asmde.py options) and statistics (asm_stats options)
+    requests on a pool of worker processes. Each worker builds one
+    architecture object per architecture, on first use (or at start-up with
+    --preload), and reuses it for the following requests.
+
+    Each connection carries one JSON object each way:
+    - request {"command": "allocate" or "stats", "argv": [options],
+      "cwd": directory relative paths are resolved from}
+    - response {"status": exit status, "stdout": output, "stderr": errors} """
+import io
+import os
+import sys
+import json
+import signal
+import socket
+import argparse
+import traceback
+import contextlib
+import socketserver
+import multiprocessing
+
+import asmde.regalloc as regalloc
+import asmde.asm_stats as asm_stats
+from asmde.arch_list import parse_architecture, ARCH_CTOR_MAP
+
+
+# architecture class -> architecture object of the worker process
+WORKER_ARCH_MAP = {}
+
+def get_warm_architecture(arch_ctor):
+    """ return the architecture object of class @p arch_ctor of the current
+        worker, ready for a new program """
+    if not arch_ctor in WORKER_ARCH_MAP:
+        WORKER_ARCH_MAP[arch_ctor] = arch_ctor()
+    arch = WORKER_ARCH_MAP[arch_ctor]
+    arch.reset_virtual_registers()
+    return arch
+
+def init_worker(preload_list):
+    # interruption is managed by the server process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for arch_name in preload_list:
+        get_warm_architecture(parse_architecture(arch_name))
+
+def run_command(command, argv):
+    if command == "allocate":
+        args = regalloc.build_arg_parser().parse_args(argv)
+        if not args.profile is None:
+            print("--profile is not supported in server mode")
+            sys.exit(1)
+        # worker processes can not start their own pool: the inputs of a
+        # batch request are allocated sequentially
+        args.jobs = 1
+        regalloc.run(args, get_warm_architecture(args.arch))
+    elif command == "stats":
+        args = asm_stats.build_arg_parser().parse_args(argv)
+        # worker processes can not start their own pool: the inputs of a
+        # request are analysed sequentially (requests run in parallel)
+        args.jobs = 1
+        args.chunk_size = 0
+        asm_stats.run(args, get_warm_architecture(args.arch))
+    else:
+        print("unknown command {}".format(command))
+        sys.exit(1)
+
+def get_exit_status(exit_code):
+    """ translate a SystemExit code into a process exit status """
+    if exit_code is None:
+        return 0
+    elif isinstance(exit_code, int):
+        return exit_code
+    print(exit_code, file=sys.stderr)
+    return 1
+
+def handle_request(request):
+    """ run @p request in the current worker and return its response """
+    stdout_stream, stderr_stream = io.StringIO(), io.StringIO()
+    status = 0
+    with contextlib.redirect_stdout(stdout_stream), contextlib.redirect_stderr(stderr_stream):
+        try:
+            os.chdir(request["cwd"])
+            run_command(request["command"], request["argv"])
+        except SystemExit as exit_exception:
+            status = get_exit_status(exit_exception.code)
+        except Exception:
+            traceback.print_exc()
+            status = 1
+    return {"status": status, "stdout": stdout_stream.getvalue(), "stderr": stderr_stream.getvalue()}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """ read a request from the connection, run it on the worker pool and
+        write back the response """
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            response = {"status": 1, "stdout": "", "stderr": "invalid request\n"}
+        else:
+            response = self.server.worker_pool.apply(handle_request, (request,))
+        self.wfile.write((json.dumps(response) + "\n").encode())
+
+class AsmdeServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ one thread per connection, waiting for a worker of worker_pool """
+    daemon_threads = True
+
+    def __init__(self, socket_path, worker_pool):
+        socketserver.UnixStreamServer.__init__(self, socket_path, RequestHandler)
+        self.worker_pool = worker_pool
+
+
+def remove_stale_socket(socket_path):
+    """ remove @p socket_path if it is left by a server which is not running
+        anymore, fails if a server is still listening on it """
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe_socket:
+        try:
+            probe_socket.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)
+            return
+    print("a server is already listening on {}".format(socket_path))
+    sys.exit(1)
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="asmde.py serve")
+    parser.add_argument("--socket", action="store", required=True, help="path of the Unix domain socket to listen on")
+    parser.add_argument("--jobs", action="store", default=os.cpu_count(), type=int,
+                        help="number of worker processes (maximal number of requests run concurrently)")
+    parser.add_argument("--preload", action="store", default=[], type=lambda s: s.split(","),
+                        help="comma separated list of architectures built by each worker at start-up (among {})".format(", ".join(ARCH_CTOR_MAP)))
+    return parser
+
+def main(argv=None):
+    """ run the server until it is interrupted (SIGINT or SIGTERM) """
+    args = build_arg_parser().parse_args(argv)
+    remove_stale_socket(args.socket)
+    with multiprocessing.Pool(args.jobs, initializer=init_worker, initargs=(args.preload,)) as worker_pool:
+        server = AsmdeServer(args.socket, worker_pool)
+        # SIGTERM is handled as an interruption so that the socket is removed
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        print("asmde server listening on {} with {} worker(s)".format(args.socket, args.jobs), flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.remove(args.socket)
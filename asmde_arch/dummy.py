@@ -72,10 +72,10 @@ INSN_PATTERN_MATCH = {
 class DummyArchitecture(Architecture):
     def __init__(self, std_reg_num=16, acc_reg_num=16):
         Architecture.__init__(self,
-            set([
+            [
                 RegFileDescription(Register.Std, std_reg_num, PhysicalRegister, VirtualRegister),
                 RegFileDescription(Register.Acc, acc_reg_num, PhysicalRegister, VirtualRegister)
-            ]),
+            ],
             INSN_PATTERN_MATCH
         )
 
@@ -1,4 +1,4 @@
-from asmde.lexer import SpecialRegisterLexem, Lexem
+from asmde.lexer import SpecialRegisterLexem, Lexem, OperatorLexem
 
 from asmde.parser import (
     SequentialPattern, RegisterPattern_Std,
@@ -6,6 +6,12 @@ from asmde.parser import (
     OpcodePattern,
     RegisterPattern_DualStd,
     RegisterPattern_Acc,
+    PhysicalRegisterPattern_Std,
+    PhysicalRegisterPattern_DualStd,
+    PhysicalRegisterPattern_Acc,
+    VirtualRegisterPattern_Std,
+    VirtualRegisterPattern_Acc,
+    VirtualRegisterPattern_DualStd,
     LabelPattern,
     PhysicalRegisterPattern,
     ImmediatePattern,
@@ -34,10 +40,11 @@ class VirtualRegisterPattern_QuadReg(VirtualRegisterPattern):
             reg = arch.get_unique_virt_reg_object(reg_name_list[i], reg_class=VRP_Class.VIRT_REG_CLASS, reg_constraint=modulo_indexed_register(4, i))
             reg_list.append(reg)
         for i in range(4):
-            for j in range(3):
-                linked_reg_id = (i + j) % 4
-                delta_id = i - linked_reg_id
-                reg_list[i].add_linked_register(reg_list[linked_reg_id], lambda color_map: [color_map[linked_reg_id] + delta_id])
+            for j in range(1, 4):
+                linked_reg = reg_list[(i + j) % 4]
+                delta_id = i - (i + j) % 4
+                # default arguments bind the current linked register and delta
+                reg_list[i].add_linked_register(linked_reg, lambda color_map, linked_reg=linked_reg, delta_id=delta_id: [color_map[linked_reg] + delta_id])
         return reg_list
 class VirtualRegisterPattern_QuadStd(VirtualRegisterPattern_QuadReg):
     VIRT_REG_CLASS = Register.Std
@@ -45,10 +52,8 @@ class VirtualRegisterPattern_QuadStd(VirtualRegisterPattern_QuadReg):
 
 class PhysicalRegisterPattern_QuadStd(PhysicalRegisterPattern):
     REG_PATTERN = "\$([r][0-9]+){4}"
-
-    @staticmethod
-    def get_unique_reg_obj(arch, index):
-        return arch.get_unique_phys_reg_object(index, PhysicalRegister.Std)
+    SUB_REG_PATTERN = "([r][0-9]+)"
+    REG_CLASS = PhysicalRegister.Std
 
 class RegisterPattern_QuadStd(RegisterPattern):
     VIRTUAL_PATTERN_CLASS = VirtualRegisterPattern_QuadStd
@@ -56,14 +61,21 @@ class RegisterPattern_QuadStd(RegisterPattern):
 
 class RegisterPattern_SubAcc(RegisterPattern_Acc):
     @classmethod
-    def parse(PRP_Class, arch, lexem_list):
-        acc_reg, lexem_list = RegisterPattern_Acc.parse(arch, lexem_list)
-        if len(lexem_list) and isinstance(lexem_list[0], Lexem) and lexem_list[0].value in ["_lo", "_hi"]:
+    def parse(PRP_Class, arch, lexem_list, index=0):
+        acc_match = RegisterPattern_Acc.parse(arch, lexem_list, index)
+        if acc_match is None:
+            return None
+        acc_reg, index = acc_match
+        if index < len(lexem_list) and isinstance(lexem_list[index], Lexem) and lexem_list[index].value in ["_lo", "_hi"]:
             # TODO/FIXME: wrongly generating a full acc register when only a sub-part
             # should be considered
-            return acc_reg, lexem_list[1:]
+            return acc_reg, index + 1
         return None
 
+    @classmethod
+    def compile(PRP_Class, arch):
+        return PRP_Class.parse
+
 class SpecialRegisterPattern(PhysicalRegisterPattern):
     REG_PATTERN = "\$([\w\d_]+)"
     REG_LEXEM = SpecialRegisterLexem
@@ -79,12 +91,18 @@ class Predicate:
 class PredicatePattern(Pattern):
     """ pattern for address offset """
     @staticmethod
-    def parse(arch, lexem_list):
-        lexem_list = MetaPopOperatorPredicate(".")(lexem_list)
-        if isinstance(lexem_list[0], Lexem):
-            return Predicate(lexem_list[0].value), lexem_list[1:]
+    def parse(arch, lexem_list, index=0):
+        index = MetaPopOperatorPredicate(".")(lexem_list, index)
+        if index is None:
+            return None
+        if isinstance(lexem_list[index], Lexem):
+            return Predicate(lexem_list[index].value), index + 1
         return None
 
+    @staticmethod
+    def get_first_lexem_classes(arch):
+        return (OperatorLexem,)
+
 
 class KV3_MatchPattern:
     def __init__(self, tag):
@@ -157,6 +175,19 @@ CMOVE_IMM_PATTERN = SequentialPattern(
                             use_list[0].instanciate(color_map),
                             def_list[0].instanciate(color_map),
                             result["imm"])))
+def instanciate_dual_reg(color_map, reg_class, reg_list):
+    """ Instanciate a pair of registers formed by the registers in reg_list """
+    instanciated_list = [reg.instanciate(color_map) for reg in reg_list]
+    return reg_class.build_multi_reg(instanciated_list)
+
+def instanciate_multi_reg(color_map, reg_list):
+    """ Instanciate a single, dual or quad register formed by the registers
+        in reg_list """
+    instanciated_list = [reg.instanciate(color_map) for reg in reg_list]
+    if len(instanciated_list) == 1:
+        return instanciated_list[0]
+    return instanciated_list[0].reg_class.build_multi_reg(instanciated_list)
+
 def LOAD_PATTERN_TEMPLATE(DstRegClass=RegisterPattern_Std):
     return SequentialPattern(
         [OpcodePattern("opc", match_predicate=True), DstRegClass("dst"), AddressPattern_Std("addr")],
@@ -167,7 +198,7 @@ def LOAD_PATTERN_TEMPLATE(DstRegClass=RegisterPattern_Std):
                         dump_pattern=lambda color_map, use_list, def_list:
                             "{} {} = {}[{}]".format(
                                 result["opc"],
-                                def_list[0].instanciate(color_map),
+                                instanciate_multi_reg(color_map, def_list),
                                 use_list[1].instanciate(color_map),
                                 use_list[0].instanciate(color_map))))
 
@@ -187,7 +218,7 @@ def LOAD_COND_PATTERN_TEMPLATE(DstRegClass=RegisterPattern_Std):
                             "{} {} ? {} = {}[{}]".format(
                                 result["opc"],
                                 use_list[0].instanciate(color_map),
-                                def_list[0].instanciate(color_map),
+                                instanciate_multi_reg(color_map, def_list),
                                 use_list[2].instanciate(color_map),
                                 use_list[1].instanciate(color_map))))
 
@@ -209,14 +240,14 @@ def STORE_PATTERN_TEMPLATE(SrcRegClass=RegisterPattern_Std):
         [OpcodePattern("opc", match_predicate=True), AddressPattern_Std("dst_addr"), SrcRegClass("src")],
         lambda result:
             Instruction(result["opc"],
-                        use_list=result["src"],
-                        def_list=(result["dst_addr"].base + result["dst_addr"].offset),
+                        # address base register is used (not defined) by the store
+                        use_list=(result["src"] + result["dst_addr"].base + result["dst_addr"].offset),
                         dump_pattern=lambda color_map, use_list, def_list:
                             "{} {}[{}] = {}".format(
                                 result["opc"],
-                                def_list[1].instanciate(color_map),
-                                def_list[0].instanciate(color_map),
-                                use_list[0].instanciate(color_map)
+                                use_list[-1].instanciate(color_map),
+                                use_list[-2].instanciate(color_map),
+                                instanciate_multi_reg(color_map, use_list[:-2])
                                 )))
 
 STORE_PATTERN = STORE_PATTERN_TEMPLATE(RegisterPattern_Std)
@@ -229,15 +260,14 @@ def STORE_COND_PATTERN_TEMPLATE(SrcRegClass=RegisterPattern_Std):
         [OpcodePattern("opc", match_predicate=True), RegisterPattern_Std("cond"), AddressPattern_Std("dst_addr"), SrcRegClass("src")],
         lambda result:
             Instruction(result["opc"],
-                        use_list=(result["cond"] + result["src"]),
-                        def_list=(result["dst_addr"].base + result["dst_addr"].offset),
+                        use_list=(result["cond"] + result["src"] + result["dst_addr"].base + result["dst_addr"].offset),
                         dump_pattern=lambda color_map, use_list, def_list:
                             "{} {} ? {}[{}] = {}".format(
                                 result["opc"],
                                 use_list[0].instanciate(color_map),
-                                def_list[1].instanciate(color_map),
-                                def_list[0].instanciate(color_map),
-                                use_list[1].instanciate(color_map)
+                                use_list[-1].instanciate(color_map),
+                                use_list[-2].instanciate(color_map),
+                                instanciate_multi_reg(color_map, use_list[1:-2])
                                 )))
 
 STORE_COND_PATTERN = STORE_COND_PATTERN_TEMPLATE(RegisterPattern_Std)
@@ -251,7 +281,16 @@ STD_1OP_PATTERN = SequentialPattern(
             Instruction(result["opc"],
                         use_list=(result["op"]),
                         def_list=result["dst"],
-                        dump_pattern=lambda color_map, use_list, def_list: "{} {} = {}, {}".format(result["opc"], def_list[0].instanciate(color_map), use_list[0].instanciate(color_map)))
+                        dump_pattern=lambda color_map, use_list, def_list: "{} {} = {}".format(result["opc"], def_list[0].instanciate(color_map), use_list[0].instanciate(color_map)))
+    )
+MOVE_PATTERN = SequentialPattern(
+        [OpcodePattern("opc"), RegisterPattern_Std("dst"), RegisterPattern_Std("src")],
+        lambda result:
+            Instruction(result["opc"],
+                        use_list=(result["src"]),
+                        def_list=result["dst"],
+                        is_move=True,
+                        dump_pattern=lambda color_map, use_list, def_list: "{} {} = {}".format(result["opc"], def_list[0].instanciate(color_map), use_list[0].instanciate(color_map)))
     )
 CALL_1OP_PATTERN = SequentialPattern(
         [OpcodePattern("opc"), RegisterPattern_Std("op")],
@@ -695,7 +734,7 @@ KV3_INSN_PATTERN_MATCH = {
     "sxwd": STD_1OP_PATTERN,
 
     "notd": STD_1OP_PATTERN,
-    "copyd": STD_1OP_PATTERN,
+    "copyd": MOVE_PATTERN,
 
     "notw": STD_1OP_PATTERN,
     "copyw": STD_1OP_PATTERN,
@@ -755,13 +794,20 @@ KV3_INSN_PATTERN_MATCH = {
 }
 
 class KV3Architecture(Architecture):
+    # spill slots are addressed from the stack pointer ($r12)
+    SPILL_DESCRIPTION_MAP = {
+        Register.Std: ("sd {offset}[$r12] = R({reg})", "ld R({reg}) = {offset}[$r12]", 8),
+        Register.Acc: ("sv {offset}[$r12] = A({reg})", "lv A({reg}) = {offset}[$r12]", 32),
+        (Register.Std, 2): ("sq {offset}[$r12] = D({reg})", "lq D({reg}) = {offset}[$r12]", 16),
+        (Register.Std, 4): ("so {offset}[$r12] = Q({reg})", "lo Q({reg}) = {offset}[$r12]", 32),
+    }
     def __init__(self, std_reg_num=64, acc_reg_num=48):
         Architecture.__init__(self,
-            set([
+            [
                 RegFileDescription(Register.Std, std_reg_num, PhysicalRegister, VirtualRegister),
                 RegFileDescription(Register.Acc, acc_reg_num, PhysicalRegister, VirtualRegister),
                 RegFileDescription(Register.Special, 0, PhysicalRegister, SpecialRegister, reg_file_class=SpecialRegFile)
-            ]),
+            ],
             KV3_INSN_PATTERN_MATCH
         )
 
@@ -778,3 +824,14 @@ class KV3Architecture(Architecture):
     def hasBundle(self):
         return True
 
+    def getPhyRegPatternList(self):
+        return [PhysicalRegisterPattern_Std, PhysicalRegisterPattern_DualStd, PhysicalRegisterPattern_QuadStd, PhysicalRegisterPattern_Acc]
+
+    def getVirtualRegClassPatternMap(self):
+       REG_CLASS_PATTERN_MAP = {
+           "R": VirtualRegisterPattern_Std,
+           "A": VirtualRegisterPattern_Acc,
+           "D": VirtualRegisterPattern_DualStd,
+           "Q": VirtualRegisterPattern_QuadStd,
+       }
+       return REG_CLASS_PATTERN_MAP
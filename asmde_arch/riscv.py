@@ -11,12 +11,59 @@ from asmde.parser import (
     OpcodePattern,
     VirtualRegisterPattern_SingleReg, ImmediatePattern,
     PhysicalRegisterPattern, RegisterPattern, GenericOffsetPattern, Pattern,
-    MetaPopOperatorPredicate, AddrValue,
+    MetaPopOperatorPredicate, AddrValue, compile_address_matcher,
     OptionalPattern,
     LabelPattern
 )
 
 
+# ABI register name resolution: spec -> (index -> physical index)
+# (None is the default spec)
+S_REG_INDEX_MAP = dict([(0, 8), (1, 9)] + [(i, i+16) for i in range(2, 12)])
+INT_ALIAS_RESOLUTION_MAP = {
+    None: lambda xi: xi,
+    "x": lambda xi: xi,
+    "ra": lambda _: 1,
+    "sp": lambda _: 2,
+    "gp": lambda _: 3,
+    "tp": lambda _: 4,
+    "t": lambda ti: ti + 5 if ti <= 2 else ti + 25,
+    "fp": lambda _: 8,
+    "zero": lambda _: 0,
+    "s": lambda si: S_REG_INDEX_MAP[si],
+    "a": lambda ai: ai + 10,
+}
+FP_ALIAS_RESOLUTION_MAP = {
+    None: lambda fi: fi,
+    "f": lambda fi: fi,
+    "ft": lambda fti: fti if fti <= 7 else (fti + 20),
+    "fs": lambda fsi: (fsi + 8) if fsi <= 1 else (fsi + 16),
+    "fa": lambda fai: (fai + 10),
+}
+
+def build_alias_table(alias_resolution_map, base_spec, spec_index_range_map):
+    """ precompute the (spec, index) -> (isAlias, physical index) table of
+        the register names listed in @p spec_index_range_map (spec -> list
+        of indexes) """
+    alias_table = {}
+    for spec, index_range in spec_index_range_map.items():
+        for index in index_range:
+            isAlias = spec != base_spec and spec != None
+            alias_table[(spec, index)] = isAlias, alias_resolution_map[spec](index)
+    return alias_table
+
+# register files contain up to 64 registers (RV64)
+INT_ALIAS_TABLE = build_alias_table(INT_ALIAS_RESOLUTION_MAP, "x", {
+    None: range(64), "x": range(64),
+    "zero": [None], "ra": [None], "sp": [None], "gp": [None], "tp": [None], "fp": [None],
+    "t": range(7), "s": range(12), "a": range(10),
+})
+FP_ALIAS_TABLE = build_alias_table(FP_ALIAS_RESOLUTION_MAP, "f", {
+    None: range(64), "f": range(64),
+    "ft": range(12), "fs": range(12), "fa": range(8),
+})
+
+
 class RVRegister(Register):
     """ RISC-V Register family """
     class IntReg(Register.RegClass):
@@ -26,22 +73,11 @@ class RVRegister(Register):
         reg_prefix = "x"
         @classmethod
         def aliasResolution(cls, spec, index):
-            # None is the default spec
+            if (spec, index) in INT_ALIAS_TABLE:
+                return INT_ALIAS_TABLE[(spec, index)]
+            # name out of the ABI ranges (e.g. t7)
             isAlias = spec != "x" and spec != None
-            ALIAS_RESOLUTION_MAP = {
-                None: lambda xi: xi,
-                "x": lambda xi: xi,
-                "ra": lambda _: 1,
-                "sp": lambda _: 2,
-                "gp": lambda _: 3,
-                "tp": lambda _: 4,
-                "t": lambda ti: ti + 5 if ti <= 2 else ti + 25,
-                "fp": lambda _: 8,
-                "zero": lambda _: 0,
-                "s": lambda si: dict([(0, 8), (1, 9)] + [(i, i+16) for i in range(2, 12)])[si],
-                "a": lambda ai: ai + 10,
-            }
-            return isAlias, ALIAS_RESOLUTION_MAP[spec](index)
+            return isAlias, INT_ALIAS_RESOLUTION_MAP[spec](index)
     class FPReg(Register.RegClass):
         """ Floating-point register """
         name = "Fp"
@@ -49,21 +85,19 @@ class RVRegister(Register):
         reg_prefix = "f"
         @classmethod
         def aliasResolution(cls, spec, index):
+            if (spec, index) in FP_ALIAS_TABLE:
+                return FP_ALIAS_TABLE[(spec, index)]
             isAlias = spec != "f" and spec != None
-            ALIAS_RESOLUTION_MAP = {
-                None: lambda fi: fi,
-                "f": lambda fi: fi,
-                "ft": lambda fti: fti if fti <= 7 else (fti + 20),
-                "fs": lambda fsi: (fsi + 8) if fsi <= 1 else (fsi + 16),
-                "fa": lambda fai: (fai + 10),
-            }
-            return isAlias, ALIAS_RESOLUTION_MAP[spec](index)
+            return isAlias, FP_ALIAS_RESOLUTION_MAP[spec](index)
 
 
 class VirtualRegisterPattern_Int(VirtualRegisterPattern_SingleReg):
     """ RISC-V Integer Virtual register """
     VIRT_REG_CLASS = RVRegister.IntReg
     VIRT_REG_DESCRIPTOR = "XAI"
+# integer register names with a specifier and an index, e.g. "a0", "x31"
+INT_REG_SPLIT_REGEX = re.compile("(?P<spec>a|s|t|x)(?P<index>[0-9]+)")
+
 class PhysicalRegisterPattern_Int(PhysicalRegisterPattern):
     """ RISC-V Integer Physical register """
     REG_PATTERN = "a[0-9]|zero|ra|sp|gp|tp|t[0-9]+|fp|s[0-9]+|x[0-9]+"
@@ -78,8 +112,8 @@ class PhysicalRegisterPattern_Int(PhysicalRegisterPattern):
     def splitSpecIndex(cls, s):
         """ split string @p s into specifier and index
             return a 3-uple (isAlias, spec, index) """
-        if re.match(cls.SPLITABLE_PATTERN, s):
-            match = re.match(cls.REG_SPLIT_PATTERN, s)
+        match = INT_REG_SPLIT_REGEX.fullmatch(s)
+        if match:
             spec = match.group("spec")
             idxStr = match.group("index")
             index = int(idxStr)
@@ -116,22 +150,25 @@ class RVRegisterPattern_FP(RegisterPattern):
 
 class RVAddressPattern_Std(Pattern):
     @staticmethod
-    def parse(arch, lexem_list):
-        offset_match = RVOffsetPattern_Std.parse(arch, lexem_list)
+    def parse(arch, lexem_list, index=0):
+        offset_match = RVOffsetPattern_Std.parse(arch, lexem_list, index)
         if offset_match is None: return None
-        offset_value, lexem_list = offset_match
-        lexem_list = MetaPopOperatorPredicate("(")(lexem_list)
-        if lexem_list is None:
+        offset_value, index = offset_match
+        index = MetaPopOperatorPredicate("(")(lexem_list, index)
+        if index is None:
             # match failed
             return None
-        base_match = RVRegisterPattern_Int.parse(arch, lexem_list)
+        base_match = RVRegisterPattern_Int.parse(arch, lexem_list, index)
         if base_match is None: return None
-        base_value, lexem_list = base_match
-        lexem_list = MetaPopOperatorPredicate(")")(lexem_list)
-        if lexem_list is None:
+        base_value, index = base_match
+        index = MetaPopOperatorPredicate(")")(lexem_list, index)
+        if index is None:
             # match failed
             return None
-        return AddrValue(base=base_value, offset=offset_value), lexem_list
+        return AddrValue(base=base_value, offset=offset_value), index
+
+    def compile(self, arch):
+        return compile_address_matcher(arch, RVOffsetPattern_Std, RVRegisterPattern_Int, "(", ")")
 
 
 def loadDumpPattern(parseResult):
@@ -217,6 +254,18 @@ STD_1OP_PATTERN = SequentialPattern(
                         def_list=result["dst"],
                         dump_pattern=std1opDumpPattern(result)))
 
+def MOVE_PATTERN(RegPattern):
+    """ register copy pattern (candidate for move coalescing) """
+    return SequentialPattern(
+        [OpcodePattern("opc", match_predicate=True), RegPattern("dst"),
+         RegPattern("src")],
+        lambda result:
+            Instruction(result["opc"],
+                        use_list=(result["src"]),
+                        def_list=result["dst"],
+                        is_move=True,
+                        dump_pattern=std1opDumpPattern(result)))
+
 STD_2OP_PATTERN = SequentialPattern(
         [OpcodePattern("opc"), RVRegisterPattern_Int("dst"),
          RVRegisterPattern_Int("lhs"), RVRegisterPattern_Int("rhs")],
@@ -266,16 +315,16 @@ class FenceSpecifierPattern(Pattern):
     def __init__(self, tag="spec"):
         Pattern.__init__(self, tag)
 
-    def parse(self, arch, lexem_list):
-        if len(lexem_list) == 0:
+    def parse(self, arch, lexem_list, index=0):
+        if index >= len(lexem_list):
             return None
         else:
-            head, lexem_list = lexem_list[0], lexem_list[1:]
+            head, index = lexem_list[index], index + 1
             if (not isinstance(head, Lexem)):
                 return None
             opcode = head.value
             if re.fullmatch("[iorw]+", opcode):
-                return opcode, lexem_list
+                return opcode, index
             return None
 
 FENCE_PATTERN = SequentialPattern([OpcodePattern("opc"),
@@ -355,6 +404,7 @@ RV32I_INSN_PATTERN_MATCH = {
     "sltiu":  STD_1OP_1IMM_PATTERN,
     # alias
     "snez": STD_1OP_PATTERN,
+    "mv": MOVE_PATTERN(RVRegisterPattern_Int),
 
     # logic instructions
     "and":  STD_2OP_PATTERN,
@@ -457,7 +507,7 @@ RV32F_INSN_PATTERN_MATCH = {
 
     "fmv.x.s": FP_OP_PATTERN(RVRegisterPattern_Int, [RVRegisterPattern_FP]),
     "fmv.s.x": FP_OP_PATTERN(RVRegisterPattern_FP, [RVRegisterPattern_Int]),
-    "fmv.s": FP_1OP_PATTERN,
+    "fmv.s": MOVE_PATTERN(RVRegisterPattern_FP),
 
     "feq.s": FP_OP_PATTERN(RVRegisterPattern_Int, [RVRegisterPattern_FP]*2),
     "flt.s": FP_OP_PATTERN(RVRegisterPattern_Int, [RVRegisterPattern_FP]*2),
@@ -497,7 +547,7 @@ RV32D_INSN_PATTERN_MATCH = {
     "fcvt.w.d": FP_OP_PATTERN(RVRegisterPattern_Int, [RVRegisterPattern_FP], optRounding=True),
     "fcvt.wu.d": FP_OP_PATTERN(RVRegisterPattern_Int, [RVRegisterPattern_FP], optRounding=True),
 
-    "fmv.d": FP_1OP_PATTERN,
+    "fmv.d": MOVE_PATTERN(RVRegisterPattern_FP),
 
     "feq.d": FP_OP_PATTERN(RVRegisterPattern_Int, [RVRegisterPattern_Int]*2),
     "flt.d": FP_OP_PATTERN(RVRegisterPattern_Int, [RVRegisterPattern_Int]*2),
@@ -510,6 +560,15 @@ RV32D_INSN_PATTERN_MATCH = {
     "fclass.d": FP_OP_PATTERN(RVRegisterPattern_Int, [RVRegisterPattern_FP]),
 }
 
+# complete instruction tables, merged once (when the module is loaded)
+# rather than each time an architecture object is built
+RV32_INSN_PATTERN_MATCH = dict(
+    list(RV32I_INSN_PATTERN_MATCH.items()) +
+    list(RV32M_INSN_PATTERN_MATCH.items()) +
+    list(RV32F_INSN_PATTERN_MATCH.items()) +
+    list(RV32D_INSN_PATTERN_MATCH.items())
+)
+
 def isRV32IRegAllocatable(regFile, index):
     """ default allocatable list for RV32 integer registers """
     return index in [6, 7, 10, 11, 12, 13, 14, 15, 16, 17, 28, 29, 30, 31]
@@ -541,17 +600,18 @@ class RV_Common(Architecture):
        return REG_CLASS_PATTERN_MAP
 
 class RV32(RV_Common):
+    # spill slots are addressed from the stack pointer
+    SPILL_DESCRIPTION_MAP = {
+        RVRegister.IntReg: ("sw X({reg}), {offset}(sp)", "lw X({reg}), {offset}(sp)", 4),
+        RVRegister.FPReg: ("fsd F({reg}), {offset}(sp)", "fld F({reg}), {offset}(sp)", 8),
+    }
     def __init__(self):
         Architecture.__init__(self,
-            set([
+            [
                 RegFileDescription(RVRegister.IntReg, 32, PhysicalRegister, VirtualRegister, isAllocatable=isRV32IRegAllocatable),
                 RegFileDescription(RVRegister.FPReg, 32, PhysicalRegister, VirtualRegister, isAllocatable=isRV32FRegAllocatable)
-            ]),
-            dict(list(RV32I_INSN_PATTERN_MATCH.items()) +
-                 list(RV32M_INSN_PATTERN_MATCH.items()) +
-                 list(RV32F_INSN_PATTERN_MATCH.items()) +
-                 list(RV32D_INSN_PATTERN_MATCH.items())
-                 )
+            ],
+            RV32_INSN_PATTERN_MATCH
         )
         # declaring x0 as constant (=0)
         zeroReg = self.get_unique_phys_reg_object(0, RVRegister.IntReg)
@@ -584,20 +644,25 @@ RV64D_EXTRA_INSN_PATTERN_MATCH = {
     "fmv.w.x": FP_OP_PATTERN(RVRegisterPattern_FP, [RVRegisterPattern_Int]),
 }
 
+RV64_INSN_PATTERN_MATCH = dict(
+    list(RV32_INSN_PATTERN_MATCH.items()) +
+    list(RV64I_EXTRA_INSN_PATTERN_MATCH.items()) +
+    list(RV64D_EXTRA_INSN_PATTERN_MATCH.items())
+)
+
 class RV64(RV_Common):
+    # spill slots are addressed from the stack pointer
+    SPILL_DESCRIPTION_MAP = {
+        RVRegister.IntReg: ("sd X({reg}), {offset}(sp)", "ld X({reg}), {offset}(sp)", 8),
+        RVRegister.FPReg: ("fsd F({reg}), {offset}(sp)", "fld F({reg}), {offset}(sp)", 8),
+    }
     def __init__(self):
         Architecture.__init__(self,
-            set([
+            [
                 RegFileDescription(RVRegister.IntReg, 64, PhysicalRegister, VirtualRegister, isAllocatable=isRV64IRegAllocatable),
                 RegFileDescription(RVRegister.FPReg, 64, PhysicalRegister, VirtualRegister, isAllocatable=isRV64FRegAllocatable)
-            ]),
-            dict(list(RV32I_INSN_PATTERN_MATCH.items()) +
-                 list(RV32M_INSN_PATTERN_MATCH.items()) +
-                 list(RV32F_INSN_PATTERN_MATCH.items()) +
-                 list(RV32D_INSN_PATTERN_MATCH.items()) +
-                 list(RV64I_EXTRA_INSN_PATTERN_MATCH.items()) +
-                 list(RV64D_EXTRA_INSN_PATTERN_MATCH.items())
-                 )
+            ],
+            RV64_INSN_PATTERN_MATCH
         )
         # declaring x0 as constant (=0)
         zeroReg = self.get_unique_phys_reg_object(0, RVRegister.IntReg)
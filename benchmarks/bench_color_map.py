@@ -0,0 +1,131 @@
+""" Graph coloring benchmark: time RegisterAssignator.create_color_map on
+    synthetic KV3 programs using dense quad registers (four linked registers)
+    and check it builds the same color map as the former implementation
+    (copying backtracking, max-degree node selection by full scan) """
+import time
+import random
+import argparse
+
+from asmde.allocator import Program, RegisterAssignator, PhysicalRegister, DebugObject, COLORING_ORDER_LIST
+from asmde.parser import AsmParser
+from asmde_arch.kv3 import KV3Architecture
+import asmde.lexer as lexer
+
+
+def reference_create_color_map(reg_assignator, conflict_map):
+    """ former implementation of create_color_map (copying the color map for
+        each candidate color), kept as a reference """
+    general_color_map = {}
+    for reg_class in conflict_map:
+        graph = conflict_map[reg_class]
+        color_map = {}
+        general_color_map[reg_class] = color_map
+        for reg in graph:
+            if isinstance(reg, PhysicalRegister):
+                color_map[reg] = reg.index
+
+        while len(color_map) != len(graph):
+            max_reg = max([node for node in graph if not node in color_map], key=(lambda reg: len(list(node for node in graph[reg] if not node in color_map))))
+
+            def allocate_reg_list(reg_list, graph, color_map):
+                if len(reg_list) == 0:
+                    return {}
+                head_reg = reg_list[0]
+                remaining_reg_list = reg_list[1:]
+                unavailable_color_set = set([color_map[neighbour] for neighbour in graph[head_reg] if neighbour in color_map])
+                valid_color_set = [color for color in reg_assignator.arch.reg_pool[reg_class].get_allocatable_range() if head_reg.constraint(color)]
+                available_color_set = set(valid_color_set).difference(set(unavailable_color_set))
+                linked_map = head_reg.get_linked_map()
+                for linked_reg in linked_map:
+                    if linked_reg in color_map:
+                        available_color_set.intersection_update(set(linked_map[linked_reg](color_map)))
+                for possible_color in sorted(available_color_set):
+                    local_color_map = {head_reg: possible_color}
+                    local_color_map.update(color_map)
+                    sub_allocation = allocate_reg_list(remaining_reg_list, graph, local_color_map)
+                    if sub_allocation != None:
+                        sub_allocation.update({head_reg: possible_color})
+                        return sub_allocation
+                return None
+
+            linked_allocation = allocate_reg_list([max_reg] + [reg for reg in max_reg.get_linked_map() if not reg in color_map], graph, color_map)
+            if linked_allocation is None:
+                print("no feasible allocation for {}".format(max_reg))
+                raise Exception()
+            color_map.update(linked_allocation)
+    return general_color_map
+
+
+def generate_quad_program(quad_num, live_num=8, scalar_live_num=8, seed=17):
+    """ generate a KV3 program loading @p quad_num quad registers, keeping
+        up to @p live_num of them (and up to @p scalar_live_num scalar
+        registers fragmenting the register file) alive at the same time """
+    rng = random.Random(seed)
+    line_list = ["//#PREDEFINED($r12)"]
+    live_list = []
+    scalar_live_list = []
+    for quad_index in range(quad_num):
+        names = ",".join("q{}_{}".format(quad_index, i) for i in range(4))
+        line_list += ["lo Q({}) = {}[$r12]".format(names, 32 * quad_index), ";;"]
+        live_list.append(names)
+        line_list += ["ld R(s{}) = {}[$r12]".format(quad_index, 8 * quad_index), ";;"]
+        scalar_live_list.append("s{}".format(quad_index))
+        if len(live_list) >= live_num:
+            names = live_list.pop(rng.randrange(len(live_list)))
+            line_list += ["so {}[$r12] = Q({})".format(32 * quad_index, names), ";;"]
+        if len(scalar_live_list) >= scalar_live_num:
+            name = scalar_live_list.pop(rng.randrange(len(scalar_live_list)))
+            line_list += ["sd {}[$r12] = R({})".format(8 * quad_index, name), ";;"]
+    for names in live_list:
+        line_list += ["so 0[$r12] = Q({})".format(names), ";;"]
+    for name in scalar_live_list:
+        line_list += ["sd 0[$r12] = R({})".format(name), ";;"]
+    return line_list
+
+
+def build_conflict_map(line_list):
+    arch = KV3Architecture()
+    program = Program()
+    asm_parser = AsmParser(arch, program)
+    for line_no, line in enumerate(line_list):
+        asm_parser.parse_asm_line(lexer.generate_line_lexems(line), dbg_object=DebugObject(line_no), src_line=line)
+    program.end_program()
+    reg_assignator = RegisterAssignator(arch)
+    var_ins, var_out = reg_assignator.generate_use_def_lists(program)
+    liverange_map = reg_assignator.generate_liverange_map(program, arch.get_empty_liverange_map(), var_ins, var_out)
+    return reg_assignator, reg_assignator.create_conflict_map(liverange_map)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", action="store", default="100,200,400,800,1600,3200",
+                        type=lambda s: [int(v) for v in s.split(",")], help="comma separated list of quad register counts")
+    parser.add_argument("--live", action="store", default=8, type=int,
+                        help="maximal number of simultaneously alive quad registers")
+    parser.add_argument("--scalar-live", action="store", default=8, type=int,
+                        help="maximal number of simultaneously alive scalar registers")
+    parser.add_argument("--coloring-order", action="store", default="max-degree", choices=COLORING_ORDER_LIST,
+                        help="select the node selection policy (the reference is only checked for max-degree)")
+    parser.add_argument("--reference-limit", action="store", default=400, type=int,
+                        help="largest quad register count for which the reference implementation is timed")
+    args = parser.parse_args()
+
+    print("{:>8} {:>10} {:>12} {:>14}".format("quads", "regs", "color (s)", "reference (s)"))
+    for quad_num in args.sizes:
+        reg_assignator, conflict_map = build_conflict_map(generate_quad_program(quad_num, live_num=args.live, scalar_live_num=args.scalar_live))
+        color_map, color_time = timed(lambda: reg_assignator.create_color_map(conflict_map, coloring_order=args.coloring_order))
+        reg_num = sum(len(graph) for graph in conflict_map.values())
+        reference_time = "-"
+        if quad_num <= args.reference_limit:
+            reference_map, reference_duration = timed(reference_create_color_map, reg_assignator, conflict_map)
+            if args.coloring_order == "max-degree" and reference_map != color_map:
+                print("color map mismatch for {} quad registers".format(quad_num))
+                raise Exception()
+            reference_time = "{:.3f}".format(reference_duration)
+        print("{:>8} {:>10} {:>12.3f} {:>14}".format(quad_num, reg_num, color_time, reference_time))
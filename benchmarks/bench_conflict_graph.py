@@ -0,0 +1,70 @@
+""" Conflict graph benchmark: time RegisterAssignator.create_conflict_map
+    on synthetic liverange maps of increasing size and check it builds the
+    same conflict sets as the former pairwise construction """
+import time
+import random
+import argparse
+
+from asmde.allocator import (
+    Register, VirtualRegister, LiveRange, LiveRangeMap, RegisterAssignator
+)
+
+
+def reference_create_conflict_map(liverange_map):
+    """ former pairwise implementation of create_conflict_map, kept as a reference """
+    conflict_map = {}
+    for reg_class in liverange_map.get_class_list():
+        sub_liverange_map = liverange_map.get_class_map(reg_class)
+        conflict_map[reg_class] = {}
+        for reg in sub_liverange_map:
+            conflict_map[reg_class][reg] = set()
+            for reg2 in sub_liverange_map:
+                if reg2 != reg and LiveRange.intersect_list(sub_liverange_map[reg], sub_liverange_map[reg2]):
+                    conflict_map[reg_class][reg].add(reg2)
+    return conflict_map
+
+
+def generate_liverange_map(reg_num, bb_size=32, max_range_length=24, max_range_per_reg=3, seed=17):
+    """ generate a LiveRangeMap with @p reg_num virtual registers whose
+        liveranges are spread over a program with 4 * reg_num bundles """
+    rng = random.Random(seed)
+    program_length = 4 * reg_num
+    liverange_map = LiveRangeMap([Register.Std])
+    for reg_index in range(reg_num):
+        reg = VirtualRegister("v{}".format(reg_index), Register.Std)
+        for _ in range(rng.randint(1, max_range_per_reg)):
+            start = rng.randrange(program_length)
+            stop = start + rng.randint(1, max_range_length)
+            liverange_map[reg].append(LiveRange(start=(start // bb_size, start % bb_size),
+                                                 stop=(stop // bb_size, stop % bb_size)))
+    return liverange_map
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", action="store", default="250,500,1000,2000,4000,8000,16000",
+                        type=lambda s: [int(v) for v in s.split(",")], help="comma separated list of register counts")
+    parser.add_argument("--reference-limit", action="store", default=2000, type=int,
+                        help="largest register count for which the reference construction is timed")
+    args = parser.parse_args()
+
+    reg_assignator = RegisterAssignator(None)
+    print("{:>8} {:>10} {:>12} {:>12} {:>12}".format("regs", "edges", "sweep (s)", "us/reg", "pairwise (s)"))
+    for reg_num in args.sizes:
+        liverange_map = generate_liverange_map(reg_num)
+        conflict_map, sweep_time = timed(reg_assignator.create_conflict_map, liverange_map)
+        edge_num = sum(len(neighbours) for neighbours in conflict_map[Register.Std].values()) // 2
+        reference_time = "-"
+        if reg_num <= args.reference_limit:
+            reference_map, reference_duration = timed(reference_create_conflict_map, liverange_map)
+            if reference_map != conflict_map:
+                print("conflict map mismatch for {} registers".format(reg_num))
+                raise Exception()
+            reference_time = "{:.3f}".format(reference_duration)
+        print("{:>8} {:>10} {:>12.3f} {:>12.2f} {:>12}".format(reg_num, edge_num, sweep_time, sweep_time / reg_num * 1e6, reference_time))
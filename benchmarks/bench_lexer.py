@@ -0,0 +1,76 @@
+""" Lexer benchmark: compare asmde.lexer.generate_line_lexems against the
+    former split-based lexer on a scaled-up input file """
+import re
+import time
+import argparse
+
+import asmde.lexer as lexer
+from asmde.lexer import (
+    LEXEM_CLASS_LIST, SEP_PATTERN, DUMMY_SEP_PATTERN,
+    DiscardedSymbol, UnmatchedLexem
+)
+
+
+def reference_generate_line_lexems(s, verbose=False):
+    """ former implementation of generate_line_lexems (split based,
+        one regex match per lexem class), kept as a reference """
+    lexem_list = []
+    for sub_word in re.split(SEP_PATTERN, s):
+        if sub_word in ['', ' ', '\t']: continue
+        lexem_match = None
+        for lexem_class in LEXEM_CLASS_LIST:
+            lexem_match = lexem_class.match(sub_word)
+            if lexem_match is None:
+                continue
+            else:
+                lexem_match_string = lexem_match.group(0)
+                if not re.match(DUMMY_SEP_PATTERN, lexem_match_string) and lexem_match_string != "":
+                    lexem_list.append(lexem_class(lexem_match_string))
+                remainder = sub_word[lexem_match.end(0):]
+                if remainder != "":
+                    lexem_list = lexem_list + reference_generate_line_lexems(remainder, verbose=verbose)
+                break
+        if lexem_match is None:
+            if DiscardedSymbol.match(sub_word):
+                pass
+            else:
+                lexem_list.append(UnmatchedLexem(sub_word))
+    return lexem_list
+
+
+def lexem_signature(lexem_list):
+    return [(lexem.__class__, lexem.value) for lexem in lexem_list]
+
+
+def time_lexer(lex_function, line_list):
+    start = time.perf_counter()
+    for line in line_list:
+        lex_function(line)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", action="store", default="tests/rv64-asm.s", help="input file")
+    parser.add_argument("--scale", action="store", default=1000, type=int, help="number of times the input is replicated")
+    parser.add_argument("--no-reference", action="store_const", default=False, const=True, help="do not time the reference lexer")
+    args = parser.parse_args()
+
+    with open(args.input, "r") as input_stream:
+        base_line_list = input_stream.read().split("\n")
+
+    # checking that both lexers agree before timing them
+    for line in base_line_list:
+        if lexem_signature(lexer.generate_line_lexems(line)) != lexem_signature(reference_generate_line_lexems(line)):
+            print("lexem mismatch on line {}".format(line))
+            raise Exception()
+
+    line_list = base_line_list * args.scale
+    print("lexing {} line(s) ({} x {})".format(len(line_list), args.input, args.scale))
+
+    scanner_time = time_lexer(lexer.generate_line_lexems, line_list)
+    print("master scanner:    {:.3f}s ({:.0f} lines/s)".format(scanner_time, len(line_list) / scanner_time))
+    if not args.no_reference:
+        reference_time = time_lexer(reference_generate_line_lexems, line_list)
+        print("reference lexer:   {:.3f}s ({:.0f} lines/s)".format(reference_time, len(line_list) / reference_time))
+        print("speedup:           {:.2f}x".format(reference_time / scanner_time))
@@ -0,0 +1,60 @@
+""" Memory benchmark: parse a synthetic RV64 assembly program (built by
+    repeating the instructions of tests/rv64-asm.s) and report the memory
+    (traced by tracemalloc) kept alive by the parsed Program, per instruction """
+import tracemalloc
+import argparse
+
+from asmde.allocator import Program, DebugObject
+from asmde.parser import AsmParser
+from asmde.lexer import Lexem, LabelEndLexem, OperatorLexem
+from asmde_arch.riscv import RV64
+import asmde.reader as reader
+
+
+def get_instruction_lines(filename):
+    """ return the instruction lines of @p filename (labels and directives
+        are discarded so that the lines can be repeated) """
+    line_list = []
+    with reader.open_input(filename) as input_stream:
+        for _, line, lexem_list in reader.generate_lexed_lines(reader.generate_lines(input_stream)):
+            if not len(lexem_list) or not isinstance(lexem_list[0], Lexem):
+                continue
+            if isinstance(lexem_list[0], OperatorLexem) or (len(lexem_list) > 1 and isinstance(lexem_list[1], LabelEndLexem)):
+                continue
+            # discarding end of line comments
+            line_list.append(line.split("#")[0])
+    return line_list
+
+
+def parse_program(arch, line_list, scale):
+    program = Program()
+    asm_parser = AsmParser(arch, program)
+    line_no = 0
+    for _ in range(scale):
+        for _, line, lexem_list in reader.generate_lexed_lines(line_list):
+            asm_parser.parse_asm_line(lexem_list, dbg_object=DebugObject(line_no), src_line=line)
+            line_no += 1
+    program.end_program()
+    return program
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", action="store", default="tests/rv64-asm.s", help="source of instruction lines")
+    parser.add_argument("--scale", action="store", default=200, type=int, help="number of repetitions of the input instructions")
+    args = parser.parse_args()
+
+    arch = RV64()
+    line_list = get_instruction_lines(args.input)
+    # warming up (architecture and pattern lazy initializations)
+    parse_program(arch, line_list, 1)
+
+    tracemalloc.start()
+    program = parse_program(arch, line_list, args.scale)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    insn_num = sum(len(bundle.insn_list) for bb in program.bb_list for bundle in bb.bundle_list)
+    print("instructions:          {}".format(insn_num))
+    print("retained memory:       {:.1f} MB ({:.0f} bytes/insn)".format(current / 2**20, current / insn_num))
+    print("peak memory:           {:.1f} MB ({:.0f} bytes/insn)".format(peak / 2**20, peak / insn_num))
@@ -0,0 +1,76 @@
+""" Parser micro-benchmark: time the instruction pattern matching on
+    pre-lexed instruction lines, leaving out lexing and program construction,
+    with compiled matchers (arch.insn_matchers) and with the interpreted
+    patterns (arch.insn_patterns[mnemonic].match) as a reference """
+import time
+import argparse
+
+from asmde.lexer import OperatorLexem
+import asmde.arch_list as arch_list
+import asmde.reader as reader
+
+from bench_memory import get_instruction_lines
+
+
+def get_mnemonic(arch, lexem_list):
+    """ return the mnemonic of @p lexem_list (assembling "<lexem0>.<lexem1>"
+        compound mnemonics as AsmParser does) """
+    mnemonic = lexem_list[0].value
+    index = 1
+    while not mnemonic in arch.insn_patterns and isinstance(lexem_list[index], OperatorLexem) and lexem_list[index].value == ".":
+        mnemonic = "{}.{}".format(mnemonic, lexem_list[index + 1].value)
+        index += 2
+    return mnemonic
+
+
+def operand_signature(operand):
+    return tuple(getattr(operand, field, None) for field in ["value", "index", "name", "aliasSpec", "reg_class"])
+
+def insn_signature(insn_match):
+    insn, index = insn_match
+    return (insn.insn_object, [operand_signature(op) for op in insn.def_list],
+            [operand_signature(op) for op in insn.use_list], insn.jump_label, index)
+
+
+def time_matching(arch, match_list, scale, repeat=1):
+    """ return the best time out of @p repeat runs """
+    time_list = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(scale):
+            for match_function, lexem_list in match_list:
+                match_function(arch, lexem_list)
+        time_list.append(time.perf_counter() - start)
+    return min(time_list)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--arch", action="store", default="rv64", choices=arch_list.ARCH_CTOR_MAP.keys(), help="target architecture")
+    parser.add_argument("--input", action="store", default="tests/rv64-asm.s", help="source of instruction lines")
+    parser.add_argument("--scale", action="store", default=50, type=int, help="number of repetitions of the input instructions")
+    parser.add_argument("--repeat", action="store", default=5, type=int, help="number of timed runs (the best one is reported)")
+    parser.add_argument("--no-reference", action="store_const", default=False, const=True, help="do not time the interpreted patterns")
+    args = parser.parse_args()
+
+    arch = arch_list.parse_architecture(args.arch)()
+    line_list = get_instruction_lines(args.input)
+    lexem_list_list = [lexem_list for _, _, lexem_list in reader.generate_lexed_lines(line_list)]
+    mnemonic_list = [get_mnemonic(arch, lexem_list) for lexem_list in lexem_list_list]
+    matcher_list = [(arch.insn_matchers[mnemonic], lexem_list) for mnemonic, lexem_list in zip(mnemonic_list, lexem_list_list)]
+    reference_list = [(arch.insn_patterns[mnemonic].match, lexem_list) for mnemonic, lexem_list in zip(mnemonic_list, lexem_list_list)]
+
+    # checking that compiled and interpreted patterns agree before timing them
+    for (matcher, lexem_list), (reference, _) in zip(matcher_list, reference_list):
+        if insn_signature(matcher(arch, lexem_list)) != insn_signature(reference(arch, lexem_list)):
+            print("match mismatch on {}".format(lexem_list))
+            raise Exception()
+
+    insn_num = len(matcher_list) * args.scale
+    print("matching {} instruction(s) ({} x {})".format(insn_num, args.input, args.scale))
+    match_time = time_matching(arch, matcher_list, args.scale, args.repeat)
+    print("compiled matchers:    {:.3f}s ({:.2f} us/insn)".format(match_time, 1e6 * match_time / insn_num))
+    if not args.no_reference:
+        reference_time = time_matching(arch, reference_list, args.scale, args.repeat)
+        print("interpreted patterns: {:.3f}s ({:.2f} us/insn)".format(reference_time, 1e6 * reference_time / insn_num))
+        print("speedup:              {:.2f}x".format(reference_time / match_time))
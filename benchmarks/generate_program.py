@@ -0,0 +1,308 @@
+""" Synthetic program generator for benchmarks: build reproducible (seeded)
+    RV32/RV64/KV3 programs with a configurable number of virtual registers,
+    basic blocks, loop nesting depth, register pressure and share of wide
+    registers, dumped as extended assembly (virtual registers, for asmde.py)
+    or with physical registers as objdump or execution trace (for
+    asm_stats.py).
+
+    Wide registers are dual/quad register tuples on KV3 and floating-point
+    registers on RISC-V (which has no register tuples); wide values are
+    only loaded and stored (dotted mnemonics such as fadd.s are not parsed
+    in objdump and trace modes). Loops are only
+    generated on RISC-V: KV3 branches are not supported by the parser. """
+import random
+import argparse
+
+
+class GenInsn:
+    """ generated instruction: @p kind selects the arch template, operands
+        are (register kind, value name) pairs """
+    def __init__(self, kind, def_list=None, use_list=None, imm=None, label=None):
+        self.kind = kind
+        self.def_list = def_list or []
+        self.use_list = use_list or []
+        self.imm = imm
+        self.label = label
+
+class GenLabel:
+    def __init__(self, name):
+        self.name = name
+
+class GenBranch:
+    """ loop back branch: jump to @p label while counter @p counter is not
+        zero (@p trip_count iterations) """
+    def __init__(self, counter, label, trip_count):
+        self.counter = counter
+        self.label = label
+        self.trip_count = trip_count
+
+
+# register kinds
+STD, WIDE, DUAL, QUAD = "std", "wide", "dual", "quad"
+
+class ArchTemplate:
+    """ instruction syntax of a target architecture """
+    # name of the base pointer register (pre-defined)
+    BASE_REG = None
+    # physical registers used to map generated values (objdump/trace)
+    PHYS_REG_MAP = {}
+    HAS_BUNDLE = False
+    HAS_BRANCH = True
+    WIDE_KIND_LIST = [WIDE]
+
+    def __init__(self, arch_name):
+        self.arch_name = arch_name
+
+    def virtual_reg(self, kind, name):
+        raise NotImplementedError
+
+    def physical_reg(self, kind, name):
+        """ map value @p name to a physical register (allocation is not
+            correct, only syntax matters for statistics) """
+        reg_list = self.PHYS_REG_MAP[kind]
+        return reg_list[hash_name(name) % len(reg_list)]
+
+    def format_insn(self, insn, reg):
+        raise NotImplementedError
+
+    def format_branch(self, branch, reg, label):
+        raise NotImplementedError
+
+def hash_name(name):
+    """ deterministic (unlike hash) value name hash """
+    value = 0
+    for c in name:
+        value = (value * 31 + ord(c)) % 1000003
+    return value
+
+
+class RVTemplate(ArchTemplate):
+    BASE_REG = "a0"
+    PHYS_REG_MAP = {
+        STD: ["a1", "a2", "a3", "a4", "a5", "a6", "a7", "t0", "t1", "t2", "t3", "t4", "t5", "t6",
+              "s1", "s2", "s3", "s4", "s5", "s6", "s7", "s8", "s9", "s10", "s11"],
+        WIDE: ["f{}".format(i) for i in range(32)],
+    }
+
+    def virtual_reg(self, kind, name):
+        return "{}({})".format("F" if kind == WIDE else "X", name)
+
+    def format_insn(self, insn, reg):
+        size_suffix = "d" if self.arch_name == "rv64" else "w"
+        if insn.kind == "load":
+            opc = "flw" if insn.def_list[0][0] == WIDE else "l" + size_suffix
+            return "{} {}, {}({})".format(opc, reg(*insn.def_list[0]), insn.imm, self.BASE_REG)
+        elif insn.kind == "store":
+            opc = "fsw" if insn.use_list[0][0] == WIDE else "s" + size_suffix
+            return "{} {}, {}({})".format(opc, reg(*insn.use_list[0]), insn.imm, self.BASE_REG)
+        elif insn.kind == "op":
+            return "add {}, {}, {}".format(reg(*insn.def_list[0]), reg(*insn.use_list[0]), reg(*insn.use_list[1]))
+        elif insn.kind == "li":
+            return "li {}, {}".format(reg(*insn.def_list[0]), insn.imm)
+        elif insn.kind == "addi":
+            return "addi {}, {}, {}".format(reg(*insn.def_list[0]), reg(*insn.use_list[0]), insn.imm)
+        raise NotImplementedError
+
+    def format_branch(self, branch, reg, label):
+        return "bnez {}, {}".format(reg(STD, branch.counter), label)
+
+
+class KV3Template(ArchTemplate):
+    BASE_REG = "$r12"
+    PHYS_REG_MAP = {
+        STD: ["$r{}".format(i) for i in range(32) if i not in [12, 13, 14]],
+        DUAL: ["$r{}r{}".format(2 * i, 2 * i + 1) for i in range(16) if i != 6],
+        QUAD: ["$r{}r{}r{}r{}".format(4 * i, 4 * i + 1, 4 * i + 2, 4 * i + 3) for i in range(8) if i != 3],
+    }
+    HAS_BUNDLE = True
+    HAS_BRANCH = False
+    WIDE_KIND_LIST = [DUAL, QUAD]
+
+    def virtual_reg(self, kind, name):
+        if kind == DUAL:
+            return "D({0}_lo,{0}_hi)".format(name)
+        elif kind == QUAD:
+            return "Q({0}_0,{0}_1,{0}_2,{0}_3)".format(name)
+        return "R({})".format(name)
+
+    def format_insn(self, insn, reg):
+        if insn.kind == "load":
+            opc = {STD: "ld", DUAL: "lq", QUAD: "lo"}[insn.def_list[0][0]]
+            return "{} {} = {}[{}]".format(opc, reg(*insn.def_list[0]), insn.imm, self.BASE_REG)
+        elif insn.kind == "store":
+            opc = {STD: "sd", DUAL: "sq", QUAD: "so"}[insn.use_list[0][0]]
+            return "{} {}[{}] = {}".format(opc, insn.imm, self.BASE_REG, reg(*insn.use_list[0]))
+        elif insn.kind == "op":
+            return "addd {} = {}, {}".format(reg(*insn.def_list[0]), reg(*insn.use_list[0]), reg(*insn.use_list[1]))
+        elif insn.kind == "li":
+            return "make {} = {}".format(reg(*insn.def_list[0]), insn.imm)
+        elif insn.kind == "addi":
+            return "addd {} = {}, {}".format(reg(*insn.def_list[0]), reg(*insn.use_list[0]), insn.imm)
+        raise NotImplementedError
+
+
+ARCH_TEMPLATE_MAP = {
+    "rv32": RVTemplate,
+    "rv64": RVTemplate,
+    "kv3": KV3Template,
+}
+
+def get_arch_template(arch_name):
+    return ARCH_TEMPLATE_MAP[arch_name](arch_name)
+
+
+def generate_program(arch_name="rv64", reg_num=256, bb_num=8, loop_depth=1, pressure=12, wide_ratio=0.0, trip_count=4, seed=17):
+    """ generate the list of program elements (GenLabel, GenInsn, GenBranch)
+        defining @p reg_num values spread over @p bb_num basic blocks, with
+        at most @p pressure values alive at the same time (beside loop
+        counters and the base pointer). Each value is stored (its last use)
+        when it is evicted from the live set. Loop level d spans basic
+        blocks [d, bb_num - 1 - d] and iterates @p trip_count times """
+    template = get_arch_template(arch_name)
+    rng = random.Random(seed)
+    if not template.HAS_BRANCH:
+        loop_depth = 0
+    loop_depth = min(loop_depth, bb_num // 2)
+    element_list = []
+    # list of live (kind, name)
+    live_list = []
+    offset = [0]
+
+    def next_offset():
+        offset[0] = (offset[0] + 8) % 2048
+        return offset[0]
+
+    def evict(index):
+        element_list.append(GenInsn("store", use_list=[live_list.pop(index)], imm=next_offset()))
+
+    value_index = 0
+    for bb_index in range(bb_num):
+        if bb_index < loop_depth:
+            # loop counter initialized before the loop header
+            element_list.append(GenInsn("li", def_list=[(STD, "c{}".format(bb_index))], imm=trip_count))
+        element_list.append(GenLabel("bb{}".format(bb_index)))
+        bb_reg_num = reg_num // bb_num + (1 if bb_index < reg_num % bb_num else 0)
+        for _ in range(bb_reg_num):
+            kind = STD
+            if rng.random() < wide_ratio:
+                kind = rng.choice(template.WIDE_KIND_LIST)
+            value = (kind, "v{}".format(value_index))
+            value_index += 1
+            operand_list = [live for live in live_list if live[0] == kind]
+            if len(operand_list) >= 2 and kind == STD and rng.random() < 0.7:
+                use_list = rng.sample(operand_list, 2)
+                element_list.append(GenInsn("op", def_list=[value], use_list=use_list))
+            else:
+                element_list.append(GenInsn("load", def_list=[value], imm=next_offset()))
+            live_list.append(value)
+            if len(live_list) > pressure:
+                evict(rng.randrange(len(live_list)))
+        loop_level = bb_num - 1 - bb_index
+        if loop_level < loop_depth:
+            counter = "c{}".format(loop_level)
+            element_list.append(GenInsn("addi", def_list=[(STD, counter)], use_list=[(STD, counter)], imm=-1))
+            element_list.append(GenBranch(counter, "bb{}".format(loop_level), trip_count))
+    while live_list:
+        evict(0)
+    return element_list
+
+
+def dump_asm(arch_name, element_list):
+    """ extended assembly (virtual registers) lines """
+    template = get_arch_template(arch_name)
+    line_list = ["//#PREDEFINED({})".format(template.BASE_REG)]
+    for element in element_list:
+        if isinstance(element, GenLabel):
+            line_list.append(".{}:".format(element.name))
+        elif isinstance(element, GenBranch):
+            line_list.append(template.format_branch(element, template.virtual_reg, "." + element.label))
+        else:
+            line_list.append(template.format_insn(element, template.virtual_reg))
+            if template.HAS_BUNDLE:
+                line_list.append(";;")
+    return line_list
+
+def dump_objdump(arch_name, element_list):
+    """ objdump-like lines (physical registers) """
+    template = get_arch_template(arch_name)
+    line_list = ["program.o:     file format elf64-{}".format(arch_name), ""]
+    bundle_end = ";;" if template.HAS_BUNDLE else ""
+    for element in element_list:
+        if isinstance(element, GenLabel):
+            line_list.append("<{}>:".format(element.name))
+        elif isinstance(element, GenBranch):
+            line_list.append("\t" + template.format_branch(element, template.physical_reg, "<{}>".format(element.label)))
+        else:
+            line_list.append("\t" + template.format_insn(element, template.physical_reg) + bundle_end)
+    return line_list
+
+def dump_trace(arch_name, element_list):
+    """ execution trace lines (physical registers): loops are unrolled
+        trip_count times """
+    template = get_arch_template(arch_name)
+    line_list = ["# synthetic {} trace".format(arch_name)]
+    label_index_map = {element.name: index for index, element in enumerate(element_list) if isinstance(element, GenLabel)}
+    # remaining iterations of each loop (by branch index)
+    remaining_map = {}
+    timestamp = 100
+    index = 0
+    while index < len(element_list):
+        element = element_list[index]
+        pc = 0x10000 + 4 * index
+        next_index = index + 1
+        if isinstance(element, GenBranch):
+            text = template.format_branch(element, template.physical_reg, "<{}>".format(element.label))
+            remaining = remaining_map.get(index, element.trip_count) - 1
+            if remaining > 0:
+                remaining_map[index] = remaining
+                next_index = label_index_map[element.label]
+            else:
+                remaining_map.pop(index, None)
+        elif isinstance(element, GenInsn):
+            text = template.format_insn(element, template.physical_reg)
+        else:
+            text = None
+        if not text is None:
+            line_list.append("{}: 0x{:x}: {}".format(timestamp, pc, text))
+            timestamp += 1
+        index = next_index
+    return line_list
+
+
+DUMP_FUNCTION_MAP = {
+    "asm": dump_asm,
+    "objdump": dump_objdump,
+    "trace": dump_trace,
+}
+
+def add_generator_arguments(parser):
+    """ add generator options to argparse @p parser """
+    parser.add_argument("--virtual-regs", action="store", default=256, type=int, help="number of generated values (virtual registers)")
+    parser.add_argument("--basic-blocks", action="store", default=8, type=int, help="number of basic blocks")
+    parser.add_argument("--loop-depth", action="store", default=1, type=int, help="loop nesting depth (RISC-V only)")
+    parser.add_argument("--pressure", action="store", default=12, type=int, help="maximal number of simultaneously alive values")
+    parser.add_argument("--wide-ratio", action="store", default=0.0, type=float,
+                        help="share of wide values (dual/quad registers on KV3, floating-point registers on RISC-V)")
+    parser.add_argument("--trip-count", action="store", default=4, type=int, help="iterations of each loop (trace)")
+    parser.add_argument("--seed", action="store", default=17, type=int, help="random generator seed")
+
+def generate_from_args(arch_name, args):
+    return generate_program(arch_name, reg_num=args.virtual_regs, bb_num=args.basic_blocks, loop_depth=args.loop_depth,
+                            pressure=args.pressure, wide_ratio=args.wide_ratio, trip_count=args.trip_count, seed=args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--arch", action="store", default="rv64", choices=ARCH_TEMPLATE_MAP.keys(), help="target architecture")
+    parser.add_argument("--format", action="store", default="asm", choices=DUMP_FUNCTION_MAP.keys(),
+                        help="asm (virtual registers, for asmde.py), objdump or trace (for asm_stats.py)")
+    parser.add_argument("--output", action="store", default=None, help="output file (default stdout)")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    line_list = DUMP_FUNCTION_MAP[args.format](args.arch, generate_from_args(args.arch, args))
+    if args.output is None:
+        print("\n".join(line_list))
+    else:
+        with open(args.output, "w") as out_stream:
+            out_stream.write("\n".join(line_list) + "\n")
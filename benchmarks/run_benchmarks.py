@@ -0,0 +1,217 @@
+""" Benchmark suite: time the asmde pipeline stages (lexing, parsing,
+    objdump/trace statistics, liveness, conflict graph build, coloring,
+    linear scan) and the cold start of asmde.py on programs built by
+    generate_program, for each selected architecture, and write the results
+    as JSON so that runs can be compared across commits (--compare) """
+import os
+import sys
+import json
+import atexit
+import time
+import tempfile
+import platform
+import datetime
+import argparse
+import subprocess
+
+from asmde.allocator import Program, RegisterAssignator, DebugObject
+from asmde.parser import AsmParser
+from asmde.asm_stats import StreamingProgramStatistics
+import asmde.arch_list as arch_list
+import asmde.reader as reader
+
+from generate_program import DUMP_FUNCTION_MAP, add_generator_arguments, generate_from_args, generate_program
+
+
+ASMDE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "asmde.py")
+
+
+def skip_header(line):
+    return "file format" in line
+
+def lex_lines(line_list):
+    return [lexem_list for _, _, lexem_list in reader.generate_lexed_lines(line_list, skip_line=skip_header)]
+
+def parse_program(arch, lexed_line_list):
+    program = Program()
+    asm_parser = AsmParser(arch, program)
+    for line_no, lexem_list in enumerate(lexed_line_list):
+        asm_parser.parse_asm_line(lexem_list, dbg_object=DebugObject(line_no))
+    program.end_program()
+    return program
+
+def parse_stats(arch, lexed_line_list, mode):
+    """ count opcodes of objdump/trace @p lexed_line_list as asm_stats does """
+    program_stats = StreamingProgramStatistics(arch, "benchmark")
+    asm_parser = AsmParser(arch, program_stats)
+    parse_line = asm_parser.parse_objdump_line if mode == "objdump" else asm_parser.parse_trace_line
+    for line_no, lexem_list in enumerate(lexed_line_list):
+        parse_line(lexem_list, dbg_object=DebugObject(line_no))
+    return program_stats
+
+def compute_liveness(arch, program):
+    reg_assignator = RegisterAssignator(arch)
+    var_ins, var_out = reg_assignator.generate_use_def_lists(program)
+    return reg_assignator.generate_liverange_map(program, arch.get_empty_liverange_map(), var_ins, var_out)
+
+
+# Each scenario gets the architecture instance and the generated program
+# element list, prepares its input (untimed) and returns the timed callable
+# and the number of processed items (lines or registers)
+
+def scenario_lexing(arch, arch_name, element_list):
+    line_list = DUMP_FUNCTION_MAP["asm"](arch_name, element_list)
+    return (lambda: lex_lines(line_list)), len(line_list)
+
+def scenario_parsing(arch, arch_name, element_list):
+    lexed_line_list = lex_lines(DUMP_FUNCTION_MAP["asm"](arch_name, element_list))
+    return (lambda: parse_program(arch, lexed_line_list)), len(lexed_line_list)
+
+def scenario_objdump_stats(arch, arch_name, element_list):
+    line_list = DUMP_FUNCTION_MAP["objdump"](arch_name, element_list)
+    return (lambda: parse_stats(arch, lex_lines(line_list), "objdump")), len(line_list)
+
+def scenario_trace_stats(arch, arch_name, element_list):
+    line_list = DUMP_FUNCTION_MAP["trace"](arch_name, element_list)
+    return (lambda: parse_stats(arch, lex_lines(line_list), "trace")), len(line_list)
+
+def scenario_liveness(arch, arch_name, element_list):
+    program = parse_program(arch, lex_lines(DUMP_FUNCTION_MAP["asm"](arch_name, element_list)))
+    return (lambda: compute_liveness(arch, program)), len(element_list)
+
+def get_liverange_map(arch, arch_name, element_list):
+    program = parse_program(arch, lex_lines(DUMP_FUNCTION_MAP["asm"](arch_name, element_list)))
+    return compute_liveness(arch, program)
+
+def get_reg_num(liverange_map):
+    return sum(len(liverange_map.get_class_map(reg_class)) for reg_class in liverange_map.get_class_list())
+
+def scenario_conflict_graph(arch, arch_name, element_list):
+    liverange_map = get_liverange_map(arch, arch_name, element_list)
+    reg_assignator = RegisterAssignator(arch)
+    return (lambda: reg_assignator.create_conflict_map(liverange_map)), get_reg_num(liverange_map)
+
+def scenario_coloring(arch, arch_name, element_list):
+    liverange_map = get_liverange_map(arch, arch_name, element_list)
+    reg_assignator = RegisterAssignator(arch)
+    conflict_map = reg_assignator.create_conflict_map(liverange_map)
+    # registers which can not be colored are collected instead of failing
+    return (lambda: reg_assignator.create_color_map(conflict_map, spill_list=[])), get_reg_num(liverange_map)
+
+def scenario_linear_scan(arch, arch_name, element_list):
+    liverange_map = get_liverange_map(arch, arch_name, element_list)
+    reg_assignator = RegisterAssignator(arch)
+    return (lambda: reg_assignator.create_linear_scan_color_map(liverange_map, spill_list=[])), get_reg_num(liverange_map)
+
+def scenario_cold_start(arch, arch_name, element_list):
+    """ run "asmde.py --arch <arch_name> -S" in a new interpreter on a small
+        program (a few registers, so that start-up time dominates) """
+    line_list = DUMP_FUNCTION_MAP["asm"](arch_name, generate_program(arch_name, reg_num=4, bb_num=1, loop_depth=0, pressure=4))
+    input_file = tempfile.NamedTemporaryFile("w", suffix=".S", delete=False)
+    with input_file:
+        input_file.write("\n".join(line_list) + "\n")
+    atexit.register(os.remove, input_file.name)
+    def run():
+        subprocess.check_call([sys.executable, ASMDE_SCRIPT, "--arch", arch_name, "-S", input_file.name], stdout=subprocess.DEVNULL)
+    return run, 1
+
+SCENARIO_MAP = {
+    "lexing": scenario_lexing,
+    "parsing": scenario_parsing,
+    "objdump_stats": scenario_objdump_stats,
+    "trace_stats": scenario_trace_stats,
+    "liveness": scenario_liveness,
+    "conflict_graph": scenario_conflict_graph,
+    "coloring": scenario_coloring,
+    "linear_scan": scenario_linear_scan,
+    "cold_start": scenario_cold_start,
+}
+
+
+def best_time(function, repeat):
+    """ return the best wall time of @p repeat calls to @p function """
+    time_list = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        time_list.append(time.perf_counter() - start)
+    return min(time_list)
+
+def get_git_commit():
+    """ return the current commit hash (None if unavailable) """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def get_result_key(result):
+    return "{}/{}".format(result["arch"], result["scenario"])
+
+def compare_results(result_list, baseline_filename):
+    """ print the time ratio of each result over its @p baseline_filename
+        counterpart (> 1.0 means slower than the baseline) """
+    with open(baseline_filename, "r") as baseline_stream:
+        baseline = json.load(baseline_stream)
+    baseline_map = {get_result_key(result): result for result in baseline["results"]}
+    print("comparison with {} (commit {})".format(baseline_filename, baseline["metadata"]["commit"]))
+    print("{:24} {:>12} {:>12} {:>8}".format("benchmark", "base (s)", "new (s)", "ratio"))
+    for result in result_list:
+        key = get_result_key(result)
+        if not key in baseline_map:
+            print("{:24} {:>12} {:12.6f} {:>8}".format(key, "-", result["time"], "-"))
+            continue
+        base_time = baseline_map[key]["time"]
+        print("{:24} {:12.6f} {:12.6f} {:8.3f}".format(key, base_time, result["time"], result["time"] / base_time))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--arch", action="store", default=["rv32", "rv64", "kv3"],
+                        type=lambda s: s.split(","), help="comma separated list of architectures")
+    parser.add_argument("--scenarios", action="store", default=list(SCENARIO_MAP.keys()),
+                        type=lambda s: s.split(","), help="comma separated list of scenarios among {}".format(", ".join(SCENARIO_MAP)))
+    parser.add_argument("--repeat", action="store", default=3, type=int, help="number of runs per benchmark (the best time is kept)")
+    parser.add_argument("--output", action="store", default=None, help="JSON result file")
+    parser.add_argument("--compare", action="store", default=None, help="JSON result file of a baseline run to compare with")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    for scenario in args.scenarios:
+        if not scenario in SCENARIO_MAP:
+            print("unknown scenario {}".format(scenario))
+            sys.exit(1)
+
+    result_list = []
+    print("{:24} {:>10} {:>12} {:>12}".format("benchmark", "items", "time (s)", "us/item"))
+    for arch_name in args.arch:
+        arch = arch_list.parse_architecture(arch_name)()
+        element_list = generate_from_args(arch_name, args)
+        for scenario in args.scenarios:
+            function, item_num = SCENARIO_MAP[scenario](arch, arch_name, element_list)
+            run_time = best_time(function, args.repeat)
+            result = {"arch": arch_name, "scenario": scenario, "items": item_num, "time": run_time}
+            result_list.append(result)
+            print("{:24} {:10} {:12.6f} {:12.3f}".format(get_result_key(result), item_num, run_time, 1e6 * run_time / max(1, item_num)))
+
+    if not args.output is None:
+        metadata = {
+            "commit": get_git_commit(),
+            "date": datetime.datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": {
+                "virtual_regs": args.virtual_regs,
+                "basic_blocks": args.basic_blocks,
+                "loop_depth": args.loop_depth,
+                "pressure": args.pressure,
+                "wide_ratio": args.wide_ratio,
+                "trip_count": args.trip_count,
+                "seed": args.seed,
+                "repeat": args.repeat,
+            },
+        }
+        with open(args.output, "w") as output_stream:
+            json.dump({"metadata": metadata, "results": result_list}, output_stream, indent=2)
+
+    if not args.compare is None:
+        compare_results(result_list, args.compare)
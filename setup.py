@@ -1,8 +1,16 @@
+import os
+import re
 import setuptools
 
+def read_version():
+    """ extract __version__ from asmde/__init__.py (without importing asmde) """
+    init_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "asmde", "__init__.py")
+    with open(init_path) as init_file:
+        return re.search(r"^__version__ = \"([^\"]+)\"", init_file.read(), re.MULTILINE).group(1)
+
 setuptools.setup(
     name="asmde",
-    version="0.1.0",
+    version=read_version(),
     author="Nicolas Brunie",
     author_email="nibrunie@gmail.com",
     description="a small toolset for assembly-level development",
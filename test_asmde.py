@@ -1,5 +1,20 @@
+import re
+import gzip
+import lzma
+import os
+import time
+import shutil
 import subprocess
 
+import asmde.lexer as lexer
+from asmde.allocator import (
+    Register, VirtualRegister, LiveRange, LiveRangeMap, RegisterAssignator,
+    Program, DebugObject, COLORING_ORDER_LIST
+)
+from asmde.parser import AsmParser, DisjonctivePattern
+from asmde_arch.kv3 import KV3Architecture
+from asmde_arch.riscv import RV32, RVRegister, PhysicalRegisterPattern_Int, FP_1OP_PATTERN_RND, FP_2OP_PATTERN_RND
+
 
 def test_basic():
     test_list = [
@@ -23,6 +38,187 @@ def test_basic():
         outFile="test_basic_2.regalloc.h").split(" "))
     assert test_ret == 0
 
+def test_allocation_output():
+    """ checking raw (unsorted) allocation output against golden files, the
+        #define order must not change from one run to another """
+    test_list = [
+        ("dummy", "examples/test_basic.S", "tests/expected/test_basic.S.regalloc.h"),
+        ("dummy", "examples/test_basic_2.S", "tests/expected/test_basic_2.S.regalloc.h"),
+        ("kv3", "examples/test_kv3_quad.S", "tests/expected/test_kv3_quad.S.regalloc.h"),
+    ]
+    for arch, test, golden in test_list:
+        with open(golden) as golden_stream:
+            expected = golden_stream.read()
+        for _ in range(5):
+            result = subprocess.check_output(f"python3 asmde.py --arch {arch} {test}".split(" "), universal_newlines=True)
+            assert result == expected
+
+def test_time_passes():
+    """ checking asmde.py pass timing report and profiling output """
+    report = subprocess.check_output("python3 asmde.py --arch rv32 --time-passes examples/riscv/test_rv32_spill.S".split(" "),
+                                     stderr=subprocess.STDOUT, universal_newlines=True)
+    for pass_name in ["lexing", "parsing", "generate_use_def_lists", "create_color_map", "spilling", "dump"]:
+        assert pass_name in report
+    # without tracemalloc.reset_peak (python < 3.9), timings are reported without peak memory
+    report = subprocess.check_output(["python3", "-c", "import sys, tracemalloc; del tracemalloc.reset_peak; import asmde.regalloc as regalloc; "
+                                      "regalloc.main('--arch rv32 --time-passes examples/riscv/test_rv32_0.S'.split(' '))"],
+                                     stderr=subprocess.STDOUT, universal_newlines=True)
+    assert "create_color_map" in report
+    # memory tracing must be stopped after the run (server workers run
+    # the following requests in the same process)
+    traced = subprocess.check_output(["python3", "-c", "import tracemalloc, asmde.server as server; "
+                                      "server.handle_request({'command': 'allocate', 'cwd': '.', 'argv': '--arch rv32 --time-passes examples/riscv/test_rv32_0.S'.split(' ')}); "
+                                      "print(tracemalloc.is_tracing())"],
+                                     universal_newlines=True)
+    assert traced.strip() == "False"
+    for profile_mode in ["cprofile", "tracemalloc"]:
+        if os.path.exists("/tmp/asmde_test.prof"):
+            os.remove("/tmp/asmde_test.prof")
+        test_ret = subprocess.check_call(f"python3 asmde.py --profile /tmp/asmde_test.prof --profile-mode {profile_mode} examples/test_basic.S".split(" "))
+        assert test_ret == 0
+        assert os.path.exists("/tmp/asmde_test.prof")
+
+def test_linear_scan():
+    """ checking linear scan allocation on examples """
+    test_list = [
+        ("dummy", "examples/test_basic.S"),
+        ("dummy", "examples/test_dual_split_regs.S"),
+        ("dummy", "examples/test_extended.S"),
+        ("rv32", "examples/riscv/test_rv32_0.S"),
+        ("rv32", "examples/riscv/test_rv32_f.S"),
+        ("rv32", "examples/riscv/test_rv32_vadd.S"),
+    ]
+    for arch, test in test_list:
+        test_ret = subprocess.check_call(f"python3 asmde.py --arch {arch} --allocator linear-scan -S {test}".split(" "))
+        assert test_ret == 0
+
+def test_coloring_order():
+    """ checking graph coloring with every node selection policy """
+    test_list = [
+        ("dummy", "examples/test_basic.S"),
+        ("dummy", "examples/test_dual_split_regs.S"),
+        ("kv3", "examples/test_kv3_quad.S"),
+        ("rv32", "examples/riscv/test_rv32_vadd.S"),
+    ]
+    for coloring_order in COLORING_ORDER_LIST:
+        for arch, test in test_list:
+            test_ret = subprocess.check_call(f"python3 asmde.py --arch {arch} --coloring-order {coloring_order} {test}".split(" "))
+            assert test_ret == 0
+
+def test_spill():
+    """ checking register spilling when live values exceed allocatable registers """
+    for allocator in ["graph-coloring", "linear-scan"]:
+        output = subprocess.check_output(f"python3 asmde.py --arch rv32 --allocator {allocator} -S examples/riscv/test_rv32_spill.S".split(" "), universal_newlines=True)
+        assert "(sp)" in output
+    # allocation failures are reported without traceback
+    failure = subprocess.run("python3 asmde.py --arch rv32 --no-spill examples/riscv/test_rv32_spill.S".split(" "),
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    assert failure.returncode == 1
+    assert failure.stdout.startswith("register allocation failed:") and not "Traceback" in failure.stdout
+
+def test_spill_register_tuples():
+    """ checking that dual and quad registers are spilled as a whole on KV3 """
+    for allocator in ["graph-coloring", "linear-scan"]:
+        output = subprocess.check_output(f"python3 asmde.py --arch kv3 --allocator {allocator} --spill-offset 4096 -S examples/test_kv3_spill.S".split(" "),
+                                         universal_newlines=True)
+        spill_opc_set = set(line.split()[0] for line in output.split("\n") if re.search(r"[0-9]{4}\[\$r12\]", line))
+        assert {"lq", "sq", "lo", "so"} <= spill_opc_set
+
+def test_spill_temporaries():
+    """ checking that spill temporaries are distinct from program registers
+        (even with the same name) """
+    arch = RV32()
+    program = Program()
+    asm_parser = AsmParser(arch, program)
+    for line_no, line in enumerate(["lw X(v0), 0(a0)", "addi X(v0_spill0), X(v0), 1", "sw X(v0_spill0), 4(a0)"]):
+        asm_parser.parse_asm_line(lexer.generate_line_lexems(line), dbg_object=DebugObject(line_no))
+    program.end_program()
+    reg_assignator = RegisterAssignator(arch)
+    program_reg = arch.get_unique_virt_reg_object("v0_spill0", RVRegister.IntReg)
+    reg_assignator.insert_spill_code(program, [arch.get_unique_virt_reg_object("v0", RVRegister.IntReg)])
+    assert len(reg_assignator.spill_temp_set) == 2
+    assert not program_reg in reg_assignator.spill_temp_set
+
+def test_spill_slot_sharing():
+    """ checking that spilled registers share a stack slot when their liveranges do not intersect """
+    arch = RV32()
+    liverange_map = arch.get_empty_liverange_map()
+    reg_list = [VirtualRegister("v{}".format(i), RVRegister.IntReg) for i in range(3)]
+    for reg, (start, stop) in zip(reg_list, [((0, 0), (0, 3)), ((0, 2), (0, 5)), ((0, 4), (0, 6))]):
+        liverange_map[reg].append(LiveRange(start=start, stop=stop))
+    reg_assignator = RegisterAssignator(arch)
+    slot_map = reg_assignator.allocate_spill_slots([(reg,) for reg in reg_list], liverange_map)
+    assert slot_map[(reg_list[0],)] == slot_map[(reg_list[2],)] != slot_map[(reg_list[1],)]
+    assert reg_assignator.spill_area_size == 8
+
+def test_coalesce():
+    """ checking coalesced moves are removed from the allocated program """
+    output = subprocess.check_output("python3 asmde.py --arch rv32 -S examples/riscv/test_rv32_mv.S".split(" "), universal_newlines=True)
+    assert not "mv" in output
+    output = subprocess.check_output("python3 asmde.py --arch rv32 --no-coalesce -S examples/riscv/test_rv32_mv.S".split(" "), universal_newlines=True)
+    assert "mv a0" in output
+
+def test_kv3_quad():
+    """ checking quad registers are allocated to aligned consecutive registers """
+    for allocator in ["graph-coloring", "linear-scan"]:
+        output = subprocess.check_output(f"python3 asmde.py --arch kv3 --allocator {allocator} examples/test_kv3_quad.S".split(" "), universal_newlines=True)
+        color_map = dict((name, int(color)) for _, name, color in (line.split(" ") for line in output.splitlines()))
+        for quad in ["a", "b"]:
+            assert color_map[quad + "0"] % 4 == 0
+            assert [color_map[quad + str(i)] for i in range(4)] == list(range(color_map[quad + "0"], color_map[quad + "0"] + 4))
+
+def test_lexer():
+    """ checking lexem sequences generated for a few corner-case lines """
+    test_list = [
+        ("addi a0, a1, -0x10", ["Lexem(addi)", "Lexem(a0)", "Lexem(a1)", "HexImmediateLexem(-0x10)"]),
+        ("add R(p) = $r5, $r5", ["Lexem(add)", "Lexem(R)", "OperatorLexem(()", "Lexem(p)", "OperatorLexem())", "RegisterLexem($r5)", "RegisterLexem($r5)"]),
+        ("lui a0, %hi(table)", ["Lexem(lui)", "Lexem(a0)", "SymbolLexem(%hi(table))"]),
+        ("x =y ?z", ["Lexem(x)", "UnmatchedLexem(=)", "Lexem(y)", "UnmatchedLexem(?)", "Lexem(z)"]),
+        ("<main+0x12>: ;;", ["ObjdumpLabel(<main+0x12>)", "LabelEndLexem(:)", "BundleSeparatorLexem(;;)"]),
+        ("//#PREDEFINED($r0r1)", ["MacroLexem(//#)", "Lexem(PREDEFINED)", "OperatorLexem(()", "RegisterLexem($r0r1)", "OperatorLexem())"]),
+        ("", []),
+    ]
+    for line, expected in test_list:
+        assert [repr(lexem) for lexem in lexer.generate_line_lexems(line)] == expected
+
+def test_conflict_map():
+    """ checking conflict map against pairwise liverange intersection """
+    liverange_map = LiveRangeMap([Register.Std])
+    reg_list = [VirtualRegister("v{}".format(i), Register.Std) for i in range(6)]
+    bounds = [[(0, 0), (0, 3)], [(0, 3), (0, 5)], [(0, 1), (1, 0)], [(0, 4), (0, 4)], [(1, 0), (1, 2)], [(0, 2), (0, 2)]]
+    for reg, (start, stop) in zip(reg_list, bounds):
+        liverange_map[reg].append(LiveRange(start=start, stop=stop))
+    liverange_map[reg_list[0]].append(LiveRange(start=(1, 1), stop=(1, 4)))
+    conflict_map = RegisterAssignator(None).create_conflict_map(liverange_map)[Register.Std]
+    for reg in reg_list:
+        expected = set(reg2 for reg2 in reg_list if reg2 is not reg and LiveRange.intersect_list(liverange_map[reg], liverange_map[reg2]))
+        assert conflict_map[reg] == expected
+
+def test_phys_index():
+    """ checking physical index resolution of register aliases """
+    int_reg_file = RV32().reg_pool[RVRegister.IntReg]
+    for spec, index, phys_index in [("x", 7, 7), ("t", 0, 5), ("a", 2, 12), ("s", 1, 9), ("sp", None, 2)]:
+        assert int_reg_file.get_phys_index(index, spec=spec) == phys_index
+    fp_reg_file = RV32().reg_pool[RVRegister.FPReg]
+    assert fp_reg_file.get_phys_index(0, spec="fa") == 10
+    assert KV3Architecture().reg_pool[Register.Std].get_phys_index(12) == 12
+
+def test_phys_reg_name_table():
+    """ checking least recently used eviction of register name tables """
+    arch = RV32()
+    arch.PHYS_REG_NAME_TABLE_SIZE = 3
+    pattern_class = PhysicalRegisterPattern_Int
+    name_table = arch.get_phys_reg_name_table(pattern_class)
+    for reg_name in ["a0", "a1", "a2"]:
+        pattern_class.resolve_register_list(arch, reg_name)
+    # hitting a0 (through the compiled matcher) makes a1 the oldest name
+    matcher = pattern_class.compile(arch)
+    assert matcher(arch, [pattern_class.REG_LEXEM("a0")]) is not None
+    pattern_class.resolve_register_list(arch, "t0")
+    assert list(name_table) == ["a2", "a0", "t0"]
+    assert pattern_class.resolve_register_list(arch, "a1") == [pattern_class.get_unique_reg_obj(arch, 1, "a")]
+    assert list(name_table) == ["a0", "t0", "a1"]
+
 def test_trace_parsing():
     # broken because asmde module is not available in default PYTHONPATH
     return
@@ -64,8 +260,170 @@ def test_asm_stats():
         print("{} test_ret={}".format(test.inFile, test_ret))
         assert test_ret == 0
 
+def test_compressed_input():
+    """ checking asm_stats on gzip and xz compressed inputs """
+    for compressed_open, ext in [(gzip.open, "gz"), (lzma.open, "xz")]:
+        compressed_file = f"/tmp/rv64-asm.s.{ext}"
+        with open("tests/rv64-asm.s", "rb") as in_stream, compressed_open(compressed_file, "wb") as out_stream:
+            shutil.copyfileobj(in_stream, out_stream)
+        test_ret = subprocess.check_call(f"python3 asmde/asm_stats.py --arch rv64 {compressed_file} --mode asm --output /tmp/asm_test.count".split(" "))
+        assert test_ret == 0
+        with open("/tmp/asm_test.count") as result, open("tests/expected/rv64.asm.s.count") as golden:
+            # first line is the list of input names
+            assert result.readlines()[1:] == golden.readlines()[1:]
+
+def test_line_cache():
+    """ checking that asm_stats --line-cache does not change the statistics """
+    for capacity in [0, 4, 1024]:
+        summary = subprocess.check_output(f"python3 asmde/asm_stats.py --arch rv64 tests/rv64-trace.trc --mode trace --line-cache {capacity} --output /tmp/trace_test.count".split(" "),
+                                          universal_newlines=True)
+        with open("/tmp/trace_test.count") as result, open("tests/expected/rv64-trace.trc.count") as golden:
+            # first line is the list of input names
+            assert result.readlines()[1:] == golden.readlines()[1:]
+        if capacity == 1024:
+            # trace lines only differing by their timestamp, PC and register
+            # value dump share an entry: one miss per distinct instruction
+            # (and comment line)
+            assert "line cache: 138 hit(s), 12 miss(es)" in summary
+
+def test_parallel_jobs():
+    """ checking that asm_stats --jobs produces the same output as a sequential run """
+    input_list = ["examples/riscv/test_rv32_0.S", "examples/riscv/test_rv32_1.S", "examples/riscv/test_rv32_m.S",
+                  "examples/riscv/test_rv32_f.S", "examples/riscv/test_rv32_vadd.S"]
+    for jobs in [1, 3]:
+        test_ret = subprocess.check_call(f"python3 asmde/asm_stats.py --arch rv32 --mode asm --jobs {jobs} --output /tmp/jobs_{jobs}.count".split(" ") + input_list)
+        assert test_ret == 0
+    with open("/tmp/jobs_1.count") as sequential, open("/tmp/jobs_3.count") as parallel:
+        assert sequential.read() == parallel.read()
+
+def test_parallel_jobs_failure():
+    """ checking that a parse error in an asm_stats worker fails the run (instead of hanging it) """
+    with open("/tmp/jobs_bad.trc", "w") as bad_trace:
+        bad_trace.write("100: 0x10000: add a2, a2\n")
+    for options in ["--jobs 2", "--chunk-size 200"]:
+        test_ret = subprocess.call(f"python3 asmde/asm_stats.py --arch rv64 --mode trace {options} tests/rv64-trace.trc /tmp/jobs_bad.trc".split(" "), timeout=60)
+        assert test_ret == 1
+
+def test_chunked_input():
+    """ checking asm_stats on inputs split in line-aligned chunks """
+    for chunk_size in [1, 100, 1000]:
+        test_ret = subprocess.check_call(f"python3 asmde/asm_stats.py --arch rv64 tests/rv64-trace.trc --mode trace --jobs 2 --chunk-size {chunk_size} --output /tmp/chunk_test.count".split(" "))
+        assert test_ret == 0
+        with open("/tmp/chunk_test.count") as result, open("tests/expected/rv64-trace.trc.count") as golden:
+            # first line is the list of input names
+            assert result.readlines()[1:] == golden.readlines()[1:]
+
+def test_result_cache():
+    """ checking that asm_stats statistics loaded from --cache-dir match parsed ones """
+    shutil.rmtree("/tmp/asmde_test_cache", ignore_errors=True)
+    for jobs in [1, 1, 2]:
+        test_ret = subprocess.check_call(f"python3 asmde/asm_stats.py --arch rv64 tests/rv64-asm.s --mode asm --jobs {jobs} --cache-dir /tmp/asmde_test_cache --output /tmp/cache_test.count".split(" "))
+        assert test_ret == 0
+        with open("/tmp/cache_test.count") as result, open("tests/expected/rv64.asm.s.count") as golden:
+            # first line is the list of input names
+            assert result.readlines()[1:] == golden.readlines()[1:]
+    assert len(os.listdir("/tmp/asmde_test_cache")) == 1
+
+def test_disjonctive_dispatch():
+    """ checking that compiled disjonctive patterns select the same alternative
+        as the interpreted ones """
+    arch = KV3Architecture()
+    for line in ["andd $r0 = $r1, $r2", "andd $r0 = $r1, 255", "compd.lt $r0 = $r1, $r2", "compd.lt $r0 = $r1, 12",
+                 "cmoved.dnez $r0? $r1 = $r2", "cmoved.dnez $r0? $r1 = 4", "ld $r2 = 8[$r12]", "ld.dnez $r1? $r2 = 16[$r12]",
+                 "sd 0[$r12] = $r3", "sd.dnez $r1? 8[$r12] = $r3", "scall $r3", "scall 12"]:
+        lexem_list = lexer.generate_line_lexems(line)
+        mnemonic = lexem_list[0].value
+        insn, index = arch.insn_matchers[mnemonic](arch, lexem_list)
+        ref_insn, ref_index = arch.insn_patterns[mnemonic].match(arch, lexem_list)
+        assert index == ref_index
+        assert type(insn.match_pattern) == type(ref_insn.match_pattern)
+        assert [reg.index for reg in insn.def_list] == [reg.index for reg in ref_insn.def_list]
+        assert [getattr(op, "index", None) for op in insn.use_list] == [getattr(op, "index", None) for op in ref_insn.use_list]
+
+def test_disjonctive_optional_dispatch():
+    """ checking compiled disjonctive patterns whose alternatives differ from
+        an optional pattern on """
+    arch = RV32()
+    # alternatives only differ after their second operand: third operand or
+    # optional rounding mode
+    pattern = DisjonctivePattern([FP_2OP_PATTERN_RND, FP_1OP_PATTERN_RND])
+    matcher = pattern.compile(arch)
+    for line in ["fop ft0, ft1, ft2", "fop ft0, ft1, ft2, rne", "fop ft0, ft1", "fop ft0, ft1, rne"]:
+        lexem_list = lexer.generate_line_lexems(line)
+        insn, index = matcher(arch, lexem_list)
+        ref_insn, ref_index = pattern.match(arch, lexem_list)
+        assert index == ref_index == len(lexem_list)
+        assert [reg.index for reg in insn.use_list] == [reg.index for reg in ref_insn.use_list]
+
+def test_lazy_arch_loading():
+    """ checking that selecting an architecture only imports its module """
+    loaded_modules = subprocess.check_output(["python3", "-c",
+        "import sys; import asmde.arch_list as arch_list; arch_list.parse_architecture('rv32')(); "
+        "print(sorted(name for name in sys.modules if name.startswith('asmde_arch.')))"], universal_newlines=True)
+    assert loaded_modules.strip() == "['asmde_arch.riscv']"
+
+def test_server():
+    """ checking that requests forwarded to asmde.py serve give the same output as local runs """
+    socket_path = "/tmp/asmde_test.sock"
+    server = subprocess.Popen(f"python3 asmde.py serve --socket {socket_path} --jobs 2 --preload rv32".split(" "))
+    try:
+        for _ in range(100):
+            if os.path.exists(socket_path):
+                break
+            time.sleep(0.1)
+        # (command, options)
+        for command, options in [("", "--arch rv32 -S examples/riscv/test_rv32_0.S"), ("", "--arch kv3 examples/test_kv3_quad.S"),
+                                 ("stats ", "--arch rv64 --mode trace tests/rv64-trace.trc")]:
+            local_output = subprocess.check_output(f"python3 asmde.py {command}{options}".split(" "), universal_newlines=True)
+            # the second request reuses the architecture of the first one
+            for _ in range(2):
+                server_output = subprocess.check_output(f"python3 asmde.py {command}--server {socket_path} {options}".split(" "), universal_newlines=True)
+                assert server_output == local_output
+        # errors are reported through the exit status
+        assert subprocess.call(f"python3 asmde.py --server {socket_path} --arch rv32 --no-such-option examples/riscv/test_rv32_0.S".split(" ")) != 0
+    finally:
+        server.terminate()
+        server.wait()
+    assert not os.path.exists(socket_path)
+
+def test_batch_allocation():
+    """ checking that inputs allocated in a single (parallel) batch get the same output as separate runs """
+    input_list = ["examples/riscv/test_rv32_0.S", "examples/riscv/test_rv32_mv.S", "examples/riscv/test_rv32_spill.S"]
+    shutil.rmtree("/tmp/asmde_test_batch", ignore_errors=True)
+    test_ret = subprocess.check_call("python3 asmde.py --arch rv32 -S --jobs 2 --output-dir /tmp/asmde_test_batch {}".format(" ".join(input_list)).split(" "))
+    assert test_ret == 0
+    for input_name in input_list:
+        single_output = subprocess.check_output(f"python3 asmde.py --arch rv32 -S {input_name}".split(" "), universal_newlines=True)
+        with open(os.path.join("/tmp/asmde_test_batch", os.path.basename(input_name))) as batch_output:
+            assert batch_output.read() == single_output
+
 if __name__ == "__main__":
+    test_lexer()
+    test_conflict_map()
+    test_phys_index()
+    test_phys_reg_name_table()
     test_basic()
+    test_allocation_output()
+    test_time_passes()
+    test_linear_scan()
+    test_coloring_order()
+    test_spill()
+    test_spill_register_tuples()
+    test_spill_temporaries()
+    test_spill_slot_sharing()
+    test_coalesce()
+    test_kv3_quad()
     # broken because asmde module is not available in default PYTHONPATH
     # test_trace_parsing()
     test_asm_stats()
+    test_compressed_input()
+    test_line_cache()
+    test_parallel_jobs()
+    test_parallel_jobs_failure()
+    test_chunked_input()
+    test_result_cache()
+    test_disjonctive_dispatch()
+    test_disjonctive_optional_dispatch()
+    test_lazy_arch_loading()
+    test_server()
+    test_batch_allocation()
@@ -0,0 +1,6 @@
+#define add 0
+#define d_hi 3
+#define d_lo 2
+#define p 4
+#define beta 1
+#define acc 0
@@ -0,0 +1,5 @@
+#define add 0
+#define d_hi 3
+#define d_lo 2
+#define p 4
+#define beta 1
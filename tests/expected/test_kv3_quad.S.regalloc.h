@@ -0,0 +1,9 @@
+#define a3 3
+#define a2 2
+#define a1 1
+#define a0 0
+#define b3 7
+#define b2 6
+#define b1 5
+#define b0 4
+#define s 8